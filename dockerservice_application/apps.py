@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class DockerserviceApplicationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dockerservice_application'
+
+    def ready(self):
+        from .services.database_service import configure_sqlite_connection
+        connection_created.connect(configure_sqlite_connection, dispatch_uid="configure_sqlite_connection")
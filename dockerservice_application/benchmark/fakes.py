@@ -0,0 +1,319 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+import hashlib
+import io
+import json
+import random
+import re
+import tarfile
+import threading
+import time
+
+API_VERSION_PREFIX = re.compile(r"^/v[0-9.]+")
+
+
+class FakeServer:
+    """
+    Runs a request handler on a local port in a background thread.
+    """
+    handler_class = None
+
+    def __init__(self):
+        self.server = None
+        self.url = None
+
+    def start(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler_class)
+        self.server.daemon_threads = True
+        self.server.fake = self
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class FakeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    def read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def send_json(self, code, body):
+        self.send_content(code, json.dumps(body).encode(), "application/json")
+
+    def send_json_stream(self, lines):
+        # Progress streams are chunked like those of the Docker daemon, one JSON object per chunk
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for line in lines:
+            content = (json.dumps(line) + "\r\n").encode()
+            self.wfile.write(f"{len(content):x}\r\n".encode() + content + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def send_content(self, code, content, content_type):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeRegistryHandler(FakeRequestHandler):
+    """
+    Serves image manifests through the Registry HTTP API V2, without authentication.
+    """
+    def do_GET(self):
+        match = re.match(r"^/v2/(.+)/manifests/([^/]+)$", urlparse(self.path).path)
+        if match is None:
+            return self.send_json(404, {"errors": [{"code": "NAME_UNKNOWN"}]})
+
+        digest = self.fake.get_manifest(match.group(1), match.group(2))
+        if digest is None:
+            return self.send_json(404, {"errors": [{"code": "MANIFEST_UNKNOWN"}]})
+
+        return self.send_json(200, {
+            "schemaVersion": 2,
+            "mediaType": "application/vnd.docker.distribution.manifest.v2+json",
+            "config": {"mediaType": "application/vnd.docker.container.image.v1+json", "digest": digest},
+            "layers": [],
+        })
+
+
+class FakeRegistry(FakeServer):
+    """
+    In-process stand-in for an image registry, filled by the pushes of a FakeDockerEngine.
+    """
+    handler_class = FakeRegistryHandler
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.manifests = dict()
+
+    def put_manifest(self, repository, tag, digest):
+        with self.lock:
+            self.manifests[(repository, tag)] = digest
+
+    def get_manifest(self, repository, tag):
+        with self.lock:
+            return self.manifests.get((repository, tag))
+
+
+class FakeDockerEngineHandler(FakeRequestHandler):
+    """
+    Implements the part of the Docker Engine API used by the build and push stages.
+    """
+    def route(self, method):
+        url = urlparse(self.path)
+        path = API_VERSION_PREFIX.sub("", url.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        body = self.read_body()
+
+        if path == "/_ping":
+            return self.send_content(200, b"OK", "text/plain")
+        if path == "/version":
+            return self.send_json(200, {"Version": "fake", "ApiVersion": "1.41"})
+        if method == "POST" and path == "/auth":
+            return self.send_json(200, {"Status": "Login Succeeded", "IdentityToken": ""})
+        if method == "POST" and path == "/build":
+            return self.send_json_stream(self.fake.build(body, params.get("t"), params.get("dockerfile")))
+        if method == "POST" and path == "/images/create":
+            return self.send_json_stream(self.fake.pull(params.get("fromImage"), params.get("tag") or "latest"))
+        if method == "POST" and path in ("/images/prune", "/build/prune"):
+            return self.send_json(200, {"ImagesDeleted": [], "CachesDeleted": [], "SpaceReclaimed": 0})
+        if method == "GET" and path == "/system/df":
+            return self.send_json(200, self.fake.disk_usage())
+
+        match = re.match(r"^/images/(.+?)(/json|/push|/tag)?$", path)
+        if match is not None:
+            name = unquote(match.group(1))
+            if method == "GET" and match.group(2) == "/json":
+                image_id = self.fake.get_image(name)
+                if image_id is None:
+                    return self.send_json(404, {"message": f"No such image: {name}"})
+                return self.send_json(200, {"Id": image_id, "RepoTags": [name], "Size": self.fake.layer_size})
+            if method == "POST" and match.group(2) == "/push":
+                return self.send_json_stream(self.fake.push(name, params.get("tag") or "latest"))
+            if method == "POST" and match.group(2) == "/tag":
+                if not self.fake.tag_image(name, f"{params.get('repo')}:{params.get('tag') or 'latest'}"):
+                    return self.send_json(404, {"message": f"No such image: {name}"})
+                return self.send_content(201, b"", "text/plain")
+            if method == "DELETE" and match.group(2) is None:
+                if not self.fake.remove_image(name):
+                    return self.send_json(404, {"message": f"No such image: {name}"})
+                return self.send_json(200, [{"Untagged": name}])
+
+        return self.send_json(404, {"message": f"page not found: {method} {path}"})
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_HEAD(self):
+        self.route("HEAD")
+
+    def do_POST(self):
+        self.route("POST")
+
+    def do_DELETE(self):
+        self.route("DELETE")
+
+
+class FakeDockerEngine(FakeServer):
+    """
+    In-process stand-in for a Docker daemon with configurable build and push latencies and failure rates.
+
+    Images are kept in memory, pulled base images included, and every push stores the manifest of the image in
+    the fake registry.
+
+    Parameters:
+    - registry: FakeRegistry the images are pushed to.
+    - build_latency: Seconds every build takes.
+    - push_latency: Seconds every push takes.
+    - build_failure_rate: Fraction of builds that fail, between 0 and 1.
+    - push_failure_rate: Fraction of pushes that fail, between 0 and 1.
+    - layer_size: Size in bytes reported for the single layer of every image.
+    - seed: Seed of the failure draws, so a benchmark run can be repeated.
+    """
+    handler_class = FakeDockerEngineHandler
+
+    def __init__(self, registry, build_latency=0.0, push_latency=0.0, build_failure_rate=0.0,
+                 push_failure_rate=0.0, layer_size=1024 * 1024, seed=None):
+        super().__init__()
+        self.registry = registry
+        self.build_latency = build_latency
+        self.push_latency = push_latency
+        self.build_failure_rate = build_failure_rate
+        self.push_failure_rate = push_failure_rate
+        self.layer_size = layer_size
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.images = dict()
+
+    def start(self):
+        super().start()
+        self.url = self.url.replace("http://", "tcp://")
+        return self.url
+
+    def build(self, context, tag, dockerfile):
+        time.sleep(self.build_latency)
+        lines = [{"stream": f"Step 1/1 : fake build of {dockerfile or 'Dockerfile'}\n"}]
+
+        if self.__fails(self.build_failure_rate):
+            lines.append({"errorDetail": {"message": "fake build failure"}, "error": "fake build failure"})
+            return lines
+
+        image_id = "sha256:" + self.__content_digest(context)
+        if tag:
+            with self.lock:
+                self.images[self.__normalize(tag)] = image_id
+
+        lines.append({"aux": {"ID": image_id}})
+        lines.append({"stream": f"Successfully built {image_id[7:19]}\n"})
+        if tag:
+            lines.append({"stream": f"Successfully tagged {tag}\n"})
+        return lines
+
+    def push(self, repository, tag):
+        time.sleep(self.push_latency)
+        image_id = self.get_image(f"{repository}:{tag}")
+
+        if image_id is None:
+            return [{"errorDetail": {"message": "An image does not exist locally with the tag"}}]
+
+        layer_id = image_id[7:19]
+        lines = [
+            {"status": f"The push refers to repository [{repository}]"},
+            {"status": "Preparing", "progressDetail": {}, "id": layer_id},
+            {"status": "Pushing", "progressDetail": {"current": self.layer_size, "total": self.layer_size}, "id": layer_id},
+        ]
+
+        if self.__fails(self.push_failure_rate):
+            lines.append({"errorDetail": {"message": "fake push failure"}, "error": "fake push failure"})
+            return lines
+
+        lines.append({"status": "Pushed", "progressDetail": {}, "id": layer_id})
+        lines.append({"status": f"{tag}: digest: {image_id} size: {self.layer_size}"})
+        self.registry.put_manifest(repository, tag, image_id)
+        return lines
+
+    def pull(self, repository, tag):
+        """
+        Pulls a base image, which always succeeds and gives an image ID derived from the reference.
+        """
+        reference = f"{repository}@{tag}" if tag.startswith("sha256:") else f"{repository}:{tag}"
+        image_id = "sha256:" + hashlib.sha256(reference.encode()).hexdigest()
+        with self.lock:
+            self.images[self.__normalize(reference)] = image_id
+
+        return [
+            {"status": f"Pulling from {repository}", "id": tag},
+            {"status": "Pull complete", "progressDetail": {}, "id": image_id[7:19]},
+            {"status": f"Digest: {image_id}"},
+            {"status": f"Status: Downloaded newer image for {reference}"},
+        ]
+
+    def get_image(self, name):
+        with self.lock:
+            return self.images.get(self.__normalize(name))
+
+    def tag_image(self, name, target):
+        with self.lock:
+            image_id = self.images.get(self.__normalize(name))
+            if image_id is not None:
+                self.images[self.__normalize(target)] = image_id
+            return image_id is not None
+
+    def remove_image(self, name):
+        with self.lock:
+            return self.images.pop(self.__normalize(name), None) is not None
+
+    def disk_usage(self):
+        with self.lock:
+            return {"LayersSize": len(set(self.images.values())) * self.layer_size, "Images": [], "Containers": [],
+                    "Volumes": [], "BuildCache": []}
+
+    def __fails(self, rate):
+        with self.lock:
+            return self.random.random() < rate
+
+    @staticmethod
+    def __content_digest(context):
+        """
+        Hashes the files of a build context, so the same files always give the same image ID like a cached build.
+        """
+        digest = hashlib.sha256()
+        try:
+            with tarfile.open(fileobj=io.BytesIO(context), mode="r:*") as archive:
+                for member in sorted(archive.getmembers(), key=lambda member: member.name):
+                    if member.isfile():
+                        digest.update(member.name.encode() + b"\0" + archive.extractfile(member).read())
+        except tarfile.TarError:
+            digest.update(context)
+        return digest.hexdigest()
+
+    @staticmethod
+    def __normalize(name):
+        return name if ":" in name.rsplit("/", 1)[-1] else name + ":latest"
@@ -0,0 +1,256 @@
+from ..models import build, push
+from ..services import docker_service
+from ..services.docker_client_service import reset_docker_client
+from ..services.docker_service import get_stage_broker
+from ..services.redis_service import get_redis_connection
+from .fakes import FakeDockerEngine, FakeRegistry
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from django_q.cluster import Cluster
+from django_q.models import Schedule
+import math
+import os
+import random
+import shutil
+import tempfile
+import time
+import uuid
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+FINAL_PUSH_STATUSES = [push.ProcessStatus.COMPLETED, push.ProcessStatus.FAILED]
+
+def run_benchmark(builds=50, concurrency=8, status_duration=10.0, timeout=600, build_latency=0.5, push_latency=0.5,
+                  build_failure_rate=0.0, push_failure_rate=0.0, seed=None):
+    """
+    Runs builds through the real views and Django-Q workers against a fake Docker daemon and registry.
+
+    A throwaway database and separate Django-Q queues are used, so the benchmark never touches the
+    builds, files or queues of a running service. A Redis server is required, as for the service itself.
+
+    Parameters:
+    - builds: Number of Dockerfiles submitted to the build-push endpoint.
+    - concurrency: Number of clients submitting builds and polling the status endpoint at the same time.
+    - status_duration: Seconds the status endpoint is polled for after all builds finished.
+    - timeout: Seconds to wait for all builds and pushes to finish.
+    - build_latency: Seconds every build takes in the fake Docker daemon.
+    - push_latency: Seconds every push takes in the fake Docker daemon.
+    - build_failure_rate: Fraction of builds that fail in the fake Docker daemon.
+    - push_failure_rate: Fraction of pushes that fail in the fake Docker daemon.
+    - seed: Seed of the failure draws.
+
+    Returns:
+    - dict: Benchmark report with the throughput, queue wait and end to end percentiles and status endpoint QPS.
+    """
+    try:
+        get_redis_connection().ping()
+    except Exception as e:
+        raise RuntimeError(f"Redis is required to run the benchmark: {e}")
+
+    registry = FakeRegistry()
+    engine = FakeDockerEngine(registry, build_latency=build_latency, push_latency=push_latency,
+                              build_failure_rate=build_failure_rate, push_failure_rate=push_failure_rate, seed=seed)
+    registry.start()
+    engine.start()
+
+    workdir = tempfile.mkdtemp(prefix="dockerservice-benchmark-")
+    run_id = uuid.uuid4().hex[:8]
+    benchmark_settings = override_settings(
+        UPLOADED_FILES_DIR=os.path.join(workdir, "uploaded_files"),
+        BUILD_LOG_DIR=os.path.join(workdir, "build_logs"),
+        DOCKER_BUILD={**settings.DOCKER_BUILD, 'builder': 'classic'},
+        PIPELINE_STAGES={stage: {**options, 'name': f"{options['name']}Benchmark{run_id}"}
+                         for stage, options in settings.PIPELINE_STAGES.items()},
+    )
+    previous_docker_host = os.environ.get('DOCKER_HOST')
+    previous_registry_api_url = docker_service.registry_api_url
+    connection = connections['default']
+    old_database_name = None
+    previous_test_database_name = connection.settings_dict['TEST'].get('NAME')
+    clusters = []
+
+    try:
+        benchmark_settings.enable()
+        setup_test_environment()
+        os.environ['DOCKER_HOST'] = engine.url
+        docker_service.registry_api_url = registry.url
+        reset_docker_client()
+
+        if connection.vendor == 'sqlite':
+            # The default in-memory test database can not be shared with the worker processes
+            connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, "benchmark.sqlite3")
+        old_database_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        Schedule.objects.all().delete()
+        connections.close_all()
+
+        for stage in settings.PIPELINE_STAGES:
+            broker = get_stage_broker(stage)
+            broker.purge_queue()
+            cluster = Cluster(broker)
+            cluster.start()
+            clusters.append(cluster)
+
+        return __run(builds, concurrency, status_duration, timeout, run_id)
+
+    finally:
+        for cluster in clusters:
+            cluster.stop()
+            cluster.broker.purge_queue()
+        connections.close_all()
+        if old_database_name is not None:
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+        connection.settings_dict['TEST']['NAME'] = previous_test_database_name
+        if previous_docker_host is None:
+            os.environ.pop('DOCKER_HOST', None)
+        else:
+            os.environ['DOCKER_HOST'] = previous_docker_host
+        docker_service.registry_api_url = previous_registry_api_url
+        reset_docker_client()
+        teardown_test_environment()
+        benchmark_settings.disable()
+        engine.stop()
+        registry.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def __run(builds, concurrency, status_duration, timeout, run_id):
+    """
+    Submits the builds, waits for them to finish and polls the status endpoint.
+    """
+    started = timezone.now()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        submissions = list(executor.map(lambda i: __submit_build(run_id, i), range(builds)))
+
+    build_ids = [build_id for build_id, _ in submissions if build_id is not None]
+    deadline = time.monotonic() + timeout
+    while push.objects.filter(build_id__in=build_ids).exclude(status__in=FINAL_PUSH_STATUSES).exists():
+        if time.monotonic() > deadline:
+            logger.warning(f"Benchmark timed out after {timeout} seconds")
+            break
+        time.sleep(0.2)
+
+    builds_done = list(build.objects.filter(build_id__in=build_ids)
+                       .values('build_id', 'status', 'enqueued_at', 'started_at', 'finished_at'))
+    pushes_done = list(push.objects.filter(build_id__in=build_ids)
+                       .values('build_id', 'status', 'enqueued_at', 'started_at', 'finished_at'))
+    build_enqueued = {row['build_id']: row['enqueued_at'] for row in builds_done}
+    failed_builds = {row['build_id'] for row in builds_done if row['status'] == build.ProcessStatus.FAILED}
+
+    finished = [row['finished_at'] for row in pushes_done
+                if row['status'] in FINAL_PUSH_STATUSES and row['finished_at'] is not None]
+    elapsed = ((max(finished) - started).total_seconds() if finished else (timezone.now() - started).total_seconds())
+    succeeded = sum(1 for row in pushes_done if row['status'] == push.ProcessStatus.COMPLETED)
+
+    status_report = __poll_status(build_ids, concurrency, status_duration)
+    connections.close_all()
+
+    return {
+        'builds': builds,
+        'accepted': len(build_ids),
+        'succeeded': succeeded,
+        'build_failed': len(failed_builds),
+        'push_failed': sum(1 for row in pushes_done
+                           if row['status'] == push.ProcessStatus.FAILED and row['build_id'] not in failed_builds),
+        'unfinished': sum(1 for row in pushes_done if row['status'] not in FINAL_PUSH_STATUSES),
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_per_second': round(succeeded / elapsed, 3) if elapsed > 0 else 0.0,
+        'submit_seconds': summarize([duration for _, duration in submissions]),
+        'queue_wait_seconds': {
+            'build': summarize(__durations(builds_done, 'enqueued_at', 'started_at')),
+            'push': summarize(__durations(pushes_done, 'enqueued_at', 'started_at')),
+        },
+        'end_to_end_seconds': summarize([(row['finished_at'] - build_enqueued[row['build_id']]).total_seconds()
+                                         for row in pushes_done
+                                         if row['status'] == push.ProcessStatus.COMPLETED
+                                         and build_enqueued.get(row['build_id']) is not None]),
+        'status_endpoint': status_report,
+    }
+
+def __submit_build(run_id, index):
+    """
+    Uploads a unique Dockerfile to the build-push endpoint.
+
+    Returns:
+    - Tuple: The build id, or None if the upload was rejected, and the response time in seconds.
+    """
+    dockerfile = SimpleUploadedFile("Dockerfile", f"FROM busybox:latest\nRUN echo {run_id}-{index}\n".encode())
+    start = time.perf_counter()
+    try:
+        response = Client().post('/build-push', {'file': dockerfile, 'image_name': "benchmark",
+                                                 'image_tag': f"{run_id}-{index}"})
+        body = response.json()
+    finally:
+        connections.close_all()
+    duration = time.perf_counter() - start
+
+    if body.get('status') != 200:
+        logger.warning(f"Benchmark build {index} was rejected: {body.get('message')}")
+        return None, duration
+    return body['build_id'], duration
+
+def __poll_status(build_ids, concurrency, duration):
+    """
+    Requests the status of random builds from several clients at once for the given number of seconds.
+    """
+    def poll(worker):
+        client = Client()
+        randomizer = random.Random(worker)
+        latencies, errors = [], 0
+        deadline = time.monotonic() + duration
+        try:
+            while build_ids and time.monotonic() < deadline:
+                start = time.perf_counter()
+                response = client.get('/build-push-status', {'build_id': randomizer.choice(build_ids)})
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200 or response.json().get('status') != 200:
+                    errors += 1
+        finally:
+            connections.close_all()
+        return latencies, errors
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(poll, range(concurrency)))
+    elapsed = time.monotonic() - start
+
+    latencies = [latency for worker_latencies, _ in results for latency in worker_latencies]
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in results),
+        'qps': round(len(latencies) / elapsed, 3) if elapsed > 0 else 0.0,
+        'latency_seconds': summarize(latencies),
+    }
+
+def __durations(rows, start_field, end_field):
+    return [(row[end_field] - row[start_field]).total_seconds() for row in rows
+            if row[start_field] is not None and row[end_field] is not None]
+
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of a list of numbers, or None for an empty list.
+
+    Parameters:
+    - values: Numbers to take the percentile of.
+    - fraction: Percentile between 0 and 1, e.g. 0.95
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def summarize(values):
+    """
+    Returns the count, p50, p90, p99 and maximum of a list of durations in seconds.
+    """
+    summary = {'count': len(values)}
+    for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0)):
+        value = percentile(values, fraction)
+        summary[name] = round(value, 4) if value is not None else None
+    return summary
@@ -1,10 +1,85 @@
 from rest_framework import serializers
+from docker.auth import resolve_repository_name
+from docker.errors import InvalidRepository
+from docker.utils import parse_repository_tag
+from django.conf import settings
+from .services.dockerfile_service import read_dockerfile, parse_dockerfile
+from .services.errors import DockerfileError
 import os
+import re
+
+BUILD_CONTEXT_EXTENSIONS = ('.tar', '.tar.gz', '.tgz')
+
+# Maximum number of additional targets an image is pushed to
+MAX_TARGETS = 10
+
+REPOSITORY_PATTERN = re.compile(r"^[a-z0-9]+(?:(?:[._]|__|-+)[a-z0-9]+)*(?:/[a-z0-9]+(?:(?:[._]|__|-+)[a-z0-9]+)*)*$")
+TAG_PATTERN = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9_.-]{0,127}$")
+REGISTRY_PATTERN = re.compile(r"^[A-Za-z0-9](?:[A-Za-z0-9.-]*[A-Za-z0-9])?(?::[0-9]+)?$")
+
+def validate_target(reference):
+    """
+    Validates an image reference like my_image:1.4, namespace/my_image or registry.example.com/namespace/my_image:1.4
+
+    Returns:
+    - str: The reference with the tag, which is latest if none is given.
+
+    Raises:
+    - serializers.ValidationError: If the reference is invalid or uses a digest.
+    """
+    repository, tag = parse_repository_tag(reference.strip())
+
+    try:
+        index_name, remote_name = resolve_repository_name(repository)
+    except InvalidRepository:
+        raise serializers.ValidationError(f"Invalid target {reference}.")
+
+    if "@" in reference or len(repository) > 100 or not REPOSITORY_PATTERN.match(remote_name) \
+            or not REGISTRY_PATTERN.match(index_name):
+        raise serializers.ValidationError(f"Invalid target {reference}.")
+    if tag is not None and not TAG_PATTERN.match(tag):
+        raise serializers.ValidationError(f"Invalid tag in target {reference}.")
+
+    return f"{repository}:{tag or 'latest'}"
+
+def validate_dockerfile(file, dockerfile_path=''):
+    """
+    Parses the Dockerfile of an upload, so invalid Dockerfiles are rejected before a build is queued.
+
+    Returns:
+    - dict: Summary of the Dockerfile, see parse_dockerfile.
+
+    Raises:
+    - serializers.ValidationError: If the build context or the Dockerfile is invalid.
+    """
+    try:
+        return parse_dockerfile(read_dockerfile(file, dockerfile_path))
+    except DockerfileError as e:
+        raise serializers.ValidationError(f"Invalid Dockerfile: {e}")
+
+def validate_timeout(stage, timeout):
+    """
+    Validates the timeout of the build or push stage of a build, which may not exceed the configured timeout of the stage.
+
+    Returns:
+    - int: The timeout in seconds, None to use the configured timeout.
+
+    Raises:
+    - serializers.ValidationError: If the timeout is longer than the configured timeout of the stage.
+    """
+    limit = settings.PIPELINE_STAGES[stage]['timeout']
+    if timeout is not None and timeout > limit:
+        raise serializers.ValidationError(f"The {stage} timeout must be at most {limit} seconds.")
+    return timeout
 
 class FileUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
     image_name = serializers.CharField()
     image_tag = serializers.CharField()
+    dockerfile = serializers.CharField(required=False, allow_blank=True, default='')
+    targets = serializers.ListField(child=serializers.CharField(), required=False, default=list, max_length=MAX_TARGETS)
+    build_timeout = serializers.IntegerField(required=False, allow_null=True, default=None, min_value=1)
+    push_timeout = serializers.IntegerField(required=False, allow_null=True, default=None, min_value=1)
 
     def validate(self, data):
         
@@ -17,8 +92,30 @@ class FileUploadSerializer(serializers.Serializer):
         if not data['image_tag']:
             raise serializers.ValidationError("Image tag cannot be empty.")
 
+        # Additional references the built image is tagged and pushed as
+        targets = [validate_target(target) for target in data.get("targets", [])]
+        data["targets"] = list(dict.fromkeys(targets))
+
+        # Timeouts in seconds after which the build or the push is aborted
+        data["timeouts"] = {
+            "build": validate_timeout("build", data.pop("build_timeout", None)),
+            "push": validate_timeout("push", data.pop("push_timeout", None)),
+        }
+
+        if data["file"].name.lower().endswith(BUILD_CONTEXT_EXTENSIONS):
+            # Build context archive, the Dockerfile is a path inside the archive
+            data["dockerfile"] = data["dockerfile"] or "Dockerfile"
+            dockerfile_path = os.path.normpath(data["dockerfile"])
+            if os.path.isabs(dockerfile_path) or dockerfile_path.startswith(".."):
+                raise serializers.ValidationError("Dockerfile must be a relative path inside the build context.")
+            data["dockerfile_summary"] = validate_dockerfile(data["file"], dockerfile_path)
+            return data
+
         name, ext = os.path.splitext(data["file"].name)
         if ext:
-            raise serializers.ValidationError("File must not have any extension.")
+            raise serializers.ValidationError("File must not have any extension, or be a .tar, .tar.gz or .tgz build context.")
+
+        data["dockerfile"] = ''
+        data["dockerfile_summary"] = validate_dockerfile(data["file"])
         
-        return data
\ No newline at end of file
+        return data
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+from ...benchmark.harness import run_benchmark
+import json
+
+
+class Command(BaseCommand):
+    help = ("Runs builds through the views and Django-Q workers against a fake Docker daemon and registry, "
+            "and reports the throughput, queue wait percentiles and status endpoint QPS.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--builds', type=int, default=50, help="Number of builds to submit.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Number of concurrent clients.")
+        parser.add_argument('--status-duration', type=float, default=10.0,
+                            help="Seconds to poll the status endpoint for.")
+        parser.add_argument('--timeout', type=float, default=600, help="Seconds to wait for all builds to finish.")
+        parser.add_argument('--build-latency', type=float, default=0.5, help="Seconds every fake build takes.")
+        parser.add_argument('--push-latency', type=float, default=0.5, help="Seconds every fake push takes.")
+        parser.add_argument('--build-failure-rate', type=float, default=0.0, help="Fraction of fake builds that fail.")
+        parser.add_argument('--push-failure-rate', type=float, default=0.0, help="Fraction of fake pushes that fail.")
+        parser.add_argument('--seed', type=int, default=None, help="Seed of the fake failures.")
+        parser.add_argument('--output', help="File to write the JSON report to, in addition to stdout.")
+        parser.add_argument('--min-throughput', type=float,
+                            help="Fail if fewer builds per second are built and pushed.")
+        parser.add_argument('--max-queue-wait-p90', type=float,
+                            help="Fail if the p90 queue wait of the build or push stage is longer, in seconds.")
+        parser.add_argument('--min-status-qps', type=float,
+                            help="Fail if the status endpoint serves fewer requests per second.")
+
+    def handle(self, *args, **options):
+        try:
+            report = run_benchmark(builds=options['builds'], concurrency=options['concurrency'],
+                                   status_duration=options['status_duration'], timeout=options['timeout'],
+                                   build_latency=options['build_latency'], push_latency=options['push_latency'],
+                                   build_failure_rate=options['build_failure_rate'],
+                                   push_failure_rate=options['push_failure_rate'], seed=options['seed'])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        content = json.dumps(report, indent=2)
+        self.stdout.write(content)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(content + "\n")
+
+        failures = check_thresholds(report, options)
+        if failures:
+            raise CommandError("Benchmark regression: " + "; ".join(failures))
+
+
+def check_thresholds(report, options):
+    """
+    Compares a benchmark report with the thresholds given on the command line.
+
+    Returns:
+    - list: Description of every threshold that was not met.
+    """
+    failures = []
+
+    if report['unfinished']:
+        failures.append(f"{report['unfinished']} builds did not finish")
+
+    if options.get('min_throughput') is not None and report['throughput_per_second'] < options['min_throughput']:
+        failures.append(f"throughput {report['throughput_per_second']}/s is below {options['min_throughput']}/s")
+
+    if options.get('max_queue_wait_p90') is not None:
+        for stage, summary in report['queue_wait_seconds'].items():
+            if summary['p90'] is not None and summary['p90'] > options['max_queue_wait_p90']:
+                failures.append(f"{stage} queue wait p90 {summary['p90']}s is above {options['max_queue_wait_p90']}s")
+
+    if options.get('min_status_qps') is not None and report['status_endpoint']['qps'] < options['min_status_qps']:
+        failures.append(f"status endpoint {report['status_endpoint']['qps']} QPS is below {options['min_status_qps']}")
+
+    return failures
@@ -0,0 +1,22 @@
+# Generated by Django 4.0.2 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dockerservice_application', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='build',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='build',
+            index=models.Index(fields=['content_hash', 'image_name', 'image_tag'], name='build_content_idx'),
+        ),
+    ]
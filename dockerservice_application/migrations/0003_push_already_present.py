@@ -0,0 +1,18 @@
+# Generated by Django 4.0.2 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dockerservice_application', '0002_build_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='push',
+            name='already_present',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.2 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dockerservice_application', '0003_push_already_present'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='build',
+            name='dockerfile_path',
+            field=models.CharField(blank=True, default='', max_length=1000),
+        ),
+    ]
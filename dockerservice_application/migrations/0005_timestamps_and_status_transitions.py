@@ -0,0 +1,102 @@
+# Generated by Django 4.0.2 on 2026-10-18 14:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import dockerservice_application.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dockerservice_application', '0004_build_dockerfile_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='status_transition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('build', 'Build'), ('push', 'Push')], max_length=10)),
+                ('from_status', models.CharField(max_length=20)),
+                ('to_status', models.CharField(max_length=20)),
+                ('reason', models.CharField(blank=True, default='', max_length=500)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'status_transition',
+            },
+        ),
+        migrations.AddField(
+            model_name='build',
+            name='enqueued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='build',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='build',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='push',
+            name='enqueued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='push',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='push',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='build',
+            name='build_time',
+            field=models.DateField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='build',
+            name='expiration_time',
+            field=models.DateField(db_index=True, default=dockerservice_application.models.default_expiration_time),
+        ),
+        migrations.AlterField(
+            model_name='push',
+            name='expiration_time',
+            field=models.DateField(db_index=True, default=dockerservice_application.models.default_expiration_time),
+        ),
+        migrations.AlterField(
+            model_name='push',
+            name='push_time',
+            field=models.DateField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='build',
+            index=models.Index(fields=['status', 'enqueued_at'], name='build_status_enqueued_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='push',
+            index=models.Index(fields=['status', 'enqueued_at'], name='push_status_enqueued_idx'),
+        ),
+        migrations.AddField(
+            model_name='status_transition',
+            name='build',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dockerservice_application.build'),
+        ),
+        migrations.AddField(
+            model_name='status_transition',
+            name='push',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='dockerservice_application.push'),
+        ),
+        migrations.AddIndex(
+            model_name='status_transition',
+            index=models.Index(fields=['to_status', 'created_at'], name='transition_status_created_idx'),
+        ),
+    ]
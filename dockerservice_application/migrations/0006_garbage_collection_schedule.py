@@ -0,0 +1,34 @@
+# Generated by Django 4.0.2 on 2026-10-18 15:02
+
+from django.conf import settings
+from django.db import migrations
+
+
+def create_schedule(apps, schema_editor):
+    Schedule = apps.get_model('django_q', 'Schedule')
+    Schedule.objects.get_or_create(
+        name='dockerservice-garbage-collection',
+        defaults={
+            'func': 'dockerservice_application.services.cleanup_service.collect_garbage',
+            'schedule_type': 'H',
+            'repeats': -1,
+            'cluster': settings.PIPELINE_STAGES['build']['name'],
+        },
+    )
+
+
+def delete_schedule(apps, schema_editor):
+    Schedule = apps.get_model('django_q', 'Schedule')
+    Schedule.objects.filter(name='dockerservice-garbage-collection').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dockerservice_application', '0005_timestamps_and_status_transitions'),
+        ('django_q', '0014_schedule_cluster'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_schedule, delete_schedule),
+    ]
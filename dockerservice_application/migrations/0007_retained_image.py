@@ -0,0 +1,27 @@
+# Generated by Django 4.0.2 on 2026-10-18 15:41
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dockerservice_application', '0006_garbage_collection_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='retained_image',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('repository_name', models.CharField(max_length=300, unique=True)),
+                ('image_name', models.CharField(max_length=100)),
+                ('image_tag', models.CharField(max_length=100)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'retained_image',
+            },
+        ),
+    ]
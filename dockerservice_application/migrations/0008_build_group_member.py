@@ -0,0 +1,29 @@
+# Generated by Django 4.0.2 on 2026-10-18 16:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dockerservice_application', '0007_retained_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='build_group_member',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group_id', models.UUIDField(db_index=True)),
+                ('build', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dockerservice_application.build')),
+            ],
+            options={
+                'db_table': 'build_group_member',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='build_group_member',
+            constraint=models.UniqueConstraint(fields=('group_id', 'build'), name='build_group_member_unique'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.2 on 2026-10-18 16:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dockerservice_application', '0008_build_group_member'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='push',
+            name='repository_name',
+            field=models.CharField(blank=True, default='', max_length=300),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.0.2 on 2026-10-18 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dockerservice_application', '0009_push_repository_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='build',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='build',
+            name='image_id',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='push',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.0.2 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dockerservice_application', '0010_stage_retries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='build',
+            name='builder_host',
+            field=models.CharField(blank=True, default='', max_length=300),
+        ),
+        migrations.AddField(
+            model_name='retained_image',
+            name='builder_host',
+            field=models.CharField(blank=True, default='', max_length=300),
+        ),
+        migrations.AlterField(
+            model_name='retained_image',
+            name='repository_name',
+            field=models.CharField(max_length=300),
+        ),
+        migrations.AddConstraint(
+            model_name='retained_image',
+            constraint=models.UniqueConstraint(fields=('builder_host', 'repository_name'), name='retained_image_unique'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.2 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dockerservice_application', '0011_builder_fleet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='build',
+            name='dockerfile_summary',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
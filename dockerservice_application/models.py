@@ -3,22 +3,28 @@ import uuid
 from datetime import timedelta
 from django.utils import timezone
 
+def default_expiration_time():
+    return timezone.now() + timedelta(days=10)
+
 class build(models.Model):
 
     class Meta:
         db_table = "build"
+        indexes = [
+            models.Index(fields=['content_hash', 'image_name', 'image_tag'], name='build_content_idx'),
+            models.Index(fields=['status', 'enqueued_at'], name='build_status_enqueued_idx'),
+        ]
 
     class ProcessStatus(models.TextChoices):
         PENDING = 'Pending'
         IN_PROGRESS = 'In Progress'
         COMPLETED = 'Completed'
         FAILED = 'Failed'
-
-    current_time = timezone.now()
+        CANCELLED = 'Cancelled'
 
     build_id =  models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    build_time =  models.DateField(default=timezone.now()) 
-    expiration_time = models.DateField(default=timezone.now() + timedelta(days=10))
+    build_time =  models.DateField(default=timezone.now) 
+    expiration_time = models.DateField(default=default_expiration_time, db_index=True)
     status = models.CharField(max_length=20, choices=ProcessStatus.choices, default=ProcessStatus.PENDING)
     file_loc = models.CharField(max_length=1000)
     file_name = models.CharField(max_length=100)
@@ -26,29 +32,104 @@ class build(models.Model):
     failed_reason = models.CharField(max_length=500)
     image_name = models.CharField(max_length=100)
     image_tag = models.CharField(max_length=100)
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    dockerfile_path = models.CharField(max_length=1000, blank=True, default='')
+    # Stages and base images of the Dockerfile, parsed when it is uploaded
+    dockerfile_summary = models.JSONField(default=dict, blank=True)
+    image_id = models.CharField(max_length=100, blank=True, default='')
+    builder_host = models.CharField(max_length=300, blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    # Seconds after which the build is aborted, PIPELINE_STAGES['build']['timeout'] if not set
+    timeout = models.PositiveIntegerField(null=True, blank=True)
+    enqueued_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
 class push(models.Model):
 
     class Meta:
         db_table = "push"
+        indexes = [
+            models.Index(fields=['status', 'enqueued_at'], name='push_status_enqueued_idx'),
+        ]
 
     class ProcessStatus(models.TextChoices):
         PENDING = 'Pending'
         IN_PROGRESS = 'In Progress'
         COMPLETED = 'Completed'
         FAILED = 'Failed'
-
-
-    current_time = timezone.now()
+        CANCELLED = 'Cancelled'
 
     push_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     build = models.ForeignKey(to=build, null=True, blank=True, on_delete=models.CASCADE)
     
-    push_time =  models.DateField(default=current_time) 
-    expiration_time = models.DateField(default=current_time + timedelta(days=10))
+    push_time =  models.DateField(default=timezone.now) 
+    expiration_time = models.DateField(default=default_expiration_time, db_index=True)
     status = models.CharField(max_length=20, choices=ProcessStatus.choices, default=ProcessStatus.PENDING)
     image_loc = models.CharField(max_length=1000)
     failed_reason = models.CharField(max_length=500)
     image_name = models.CharField(max_length=100)
     image_tag = models.CharField(max_length=100)
+    already_present = models.BooleanField(default=False)
+    # Full reference the image is pushed to, including the registry host for other registries than Docker Hub
+    repository_name = models.CharField(max_length=300, blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    # Seconds after which the push is aborted, PIPELINE_STAGES['push']['timeout'] if not set
+    timeout = models.PositiveIntegerField(null=True, blank=True)
+    enqueued_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+class status_transition(models.Model):
+    """
+    Append-only history of the status changes of builds and pushes.
+    """
+
+    class Meta:
+        db_table = "status_transition"
+        indexes = [
+            models.Index(fields=['to_status', 'created_at'], name='transition_status_created_idx'),
+        ]
+
+    class Stage(models.TextChoices):
+        BUILD = 'build'
+        PUSH = 'push'
+
+    build = models.ForeignKey(to=build, on_delete=models.CASCADE)
+    push = models.ForeignKey(to=push, null=True, blank=True, on_delete=models.CASCADE)
+    stage = models.CharField(max_length=10, choices=Stage.choices)
+    from_status = models.CharField(max_length=20)
+    to_status = models.CharField(max_length=20)
+    reason = models.CharField(max_length=500, blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+
+class retained_image(models.Model):
+    """
+    Image kept in a Docker daemon after its push, so later builds can reuse its layers.
+    """
+
+    class Meta:
+        db_table = "retained_image"
+        constraints = [
+            models.UniqueConstraint(fields=['builder_host', 'repository_name'], name='retained_image_unique'),
+        ]
+
+    builder_host = models.CharField(max_length=300, blank=True, default='')
+    repository_name = models.CharField(max_length=300)
+    image_name = models.CharField(max_length=100)
+    image_tag = models.CharField(max_length=100)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+class build_group_member(models.Model):
+    """
+    Build submitted as part of a bulk submission, so the progress of the whole group can be queried at once.
+    """
+
+    class Meta:
+        db_table = "build_group_member"
+        constraints = [
+            models.UniqueConstraint(fields=['group_id', 'build'], name='build_group_member_unique'),
+        ]
 
+    group_id = models.UUIDField(db_index=True)
+    build = models.ForeignKey(to=build, on_delete=models.CASCADE)
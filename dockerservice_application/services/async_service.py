@@ -0,0 +1,27 @@
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+import functools
+
+def database_sync_to_async(func):
+    """
+    Wraps a blocking function, so async views can await it without blocking the event loop.
+
+    The function runs in a thread of the executor instead of the single thread shared by all
+    thread sensitive calls, so slow queries, file writes and Redis calls of different requests run
+    in parallel. Database connections of the thread are closed like at the end of a request.
+
+    Parameters:
+    - func: Function doing database queries or other blocking work.
+
+    Returns:
+    - Coroutine function calling func with the same arguments.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(wrapper, thread_sensitive=False)
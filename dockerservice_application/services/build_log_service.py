@@ -0,0 +1,84 @@
+from django.conf import settings
+import os
+import time
+import uuid
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+def build_log_path(build_id):
+    """
+    Returns the path of the log file for a given build_id.
+
+    The build_id is parsed as a UUID so that it can never be used to escape the log directory.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+
+    Returns:
+    - str: Path of the log file.
+    """
+    return os.path.join(settings.BUILD_LOG_DIR, str(uuid.UUID(str(build_id))) + ".log")
+
+def open_build_log(build_id):
+    """
+    Opens the log file of a build for appending.
+
+    Every write goes straight to the file, so readers following the log see the output as soon as
+    it is received from the Docker daemon.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+
+    Returns:
+    - file: Unbuffered binary file object opened in append mode.
+    """
+    os.makedirs(settings.BUILD_LOG_DIR, exist_ok=True)
+    return open(build_log_path(build_id), 'ab', buffering=0)
+
+def read_build_log(build_id, offset=0, length=None):
+    """
+    Reads a byte range from the log of a build.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    - offset: Byte offset to start reading from.
+    - length: Maximum number of bytes to read. Reads till the end of the log if None.
+
+    Returns:
+    - bytes: Log content in the requested range. Empty if the log does not exist yet.
+    """
+    try:
+        with open(build_log_path(build_id), 'rb') as log_file:
+            log_file.seek(offset)
+            return log_file.read(-1 if length is None else length)
+    except FileNotFoundError:
+        return b""
+
+def follow_build_log(build_id, is_running, offset=0, poll_interval=0.5, timeout=600):
+    """
+    Yields the log of a build as it grows, like `tail -f`.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    - is_running: Callable returning True while the build can still write to its log.
+    - offset: Byte offset to start reading from.
+    - poll_interval: Seconds to wait between checks for new output.
+    - timeout: Seconds after which following stops even if the build is still running.
+
+    Yields:
+    - bytes: New log content.
+    """
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        running = is_running()
+        chunk = read_build_log(build_id, offset)
+        if chunk:
+            offset += len(chunk)
+            yield chunk
+        elif not running:
+            return
+        else:
+            time.sleep(poll_interval)
@@ -0,0 +1,163 @@
+from .docker_client_service import get_docker_client
+from .redis_service import get_redis_connection, redis_lock
+from .errors import BuilderUnavailableError
+from django.conf import settings
+import time
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+def get_builder_hosts():
+    """
+    Returns the Docker daemons builds run on, with the number of builds each of them runs at the same time.
+
+    Returns:
+    - list: Dictionaries with the url and max_builds of every daemon in DOCKER_HOSTS, or a single entry
+      with an empty url for the daemon configured in the environment.
+    """
+    default_max_builds = settings.PIPELINE_STAGES['build']['workers']
+    if not settings.DOCKER_HOSTS:
+        return [{'url': '', 'max_builds': default_max_builds}]
+    return [{'url': entry['url'], 'max_builds': int(entry.get('max_builds', default_max_builds))} for entry in settings.DOCKER_HOSTS]
+
+def acquire_builder(build_id, image_name, preferred_host=None, abort=None):
+    """
+    Reserves a Docker daemon for a build, waiting up to BUILDER_SCHEDULER['acquire_timeout'] seconds for a free one.
+
+    Daemons which are unhealthy or already run max_builds builds are skipped. Of the remaining daemons the
+    preferred daemon is chosen first, then daemons which built the same image name within
+    BUILDER_SCHEDULER['affinity_ttl'] seconds, so their layer cache is reused, and then the least loaded daemon.
+    The reservations are kept in Redis, so they are shared by the build workers of all hosts, and expire after
+    BUILDER_SCHEDULER['lease_timeout'] seconds in case a worker dies during a build.
+
+    Without DOCKER_HOSTS every build runs on the daemon configured in the environment and nothing is reserved.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    - image_name: Name of the built image.
+    - preferred_host: URL of a daemon to use if it is available, e.g. the daemon which holds the image of an earlier attempt.
+    - abort: Optional StageAbort of the build, which stops waiting for a daemon once the build is aborted.
+
+    Returns:
+    - str: URL of the reserved Docker daemon.
+
+    Raises:
+    - BuilderUnavailableError: If no daemon became available in time.
+    - StageAbortedError: If the build was aborted while waiting.
+    """
+    if not settings.DOCKER_HOSTS:
+        return ''
+
+    options = settings.BUILDER_SCHEDULER
+    deadline = time.monotonic() + options['acquire_timeout']
+
+    while True:
+        with redis_lock("builder-scheduler"):
+            host = __select_host(image_name, preferred_host)
+            if host is not None:
+                get_redis_connection().zadd(__lease_key(host), {str(build_id): time.time() + options['lease_timeout']})
+
+        if host is not None:
+            if __is_healthy(host):
+                __record_affinity(image_name, host)
+                logger.info(f"Build {build_id} of {image_name} scheduled on {host}")
+                return host
+            release_builder(build_id, host)
+            continue
+
+        if time.monotonic() >= deadline:
+            raise BuilderUnavailableError("All builder hosts are busy or temporarily unavailable")
+        if abort is not None:
+            abort.wait(options['poll_interval'])
+        else:
+            time.sleep(options['poll_interval'])
+
+def release_builder(build_id, host):
+    """
+    Releases the reservation of a Docker daemon made by acquire_builder.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    - host: URL of the reserved Docker daemon.
+    """
+    if settings.DOCKER_HOSTS:
+        get_redis_connection().zrem(__lease_key(host), str(build_id))
+
+def get_prefetch_hosts(image_name):
+    """
+    Returns the Docker daemons the base images of a queued build are pulled on before it starts.
+
+    The build will most likely run on a daemon which recently built the same image name, see acquire_builder,
+    so those daemons are returned if there are any healthy ones. Otherwise the build may run on any daemon,
+    and all healthy daemons are returned.
+
+    Parameters:
+    - image_name: Name of the image the build builds.
+
+    Returns:
+    - list: URLs of the Docker daemons, a single empty URL for the daemon configured in the environment.
+    """
+    if not settings.DOCKER_HOSTS:
+        return ['']
+
+    connection = get_redis_connection()
+    recent_hosts = __recent_hosts(connection, image_name)
+    healthy_hosts = [host['url'] for host in get_builder_hosts() if not connection.exists(__unhealthy_key(host['url']))]
+    return [host for host in healthy_hosts if host in recent_hosts] or healthy_hosts
+
+def __select_host(image_name, preferred_host):
+    """
+    Returns the URL of the daemon a build should run on, or None if every healthy daemon is fully loaded.
+    """
+    connection = get_redis_connection()
+    now = time.time()
+    recent_hosts = __recent_hosts(connection, image_name)
+
+    candidates = []
+    for host in get_builder_hosts():
+        if connection.exists(__unhealthy_key(host['url'])):
+            continue
+        connection.zremrangebyscore(__lease_key(host['url']), '-inf', now)
+        load = connection.zcard(__lease_key(host['url']))
+        if load >= host['max_builds']:
+            continue
+        candidates.append((host['url'] != preferred_host, host['url'] not in recent_hosts, load / host['max_builds'], host['url']))
+
+    if not candidates:
+        return None
+    return min(candidates)[-1]
+
+def __recent_hosts(connection, image_name):
+    """
+    Returns the URLs of the daemons which built an image name within BUILDER_SCHEDULER['affinity_ttl'] seconds.
+    """
+    since = time.time() - settings.BUILDER_SCHEDULER['affinity_ttl']
+    return {host.decode() for host in connection.zrangebyscore(__affinity_key(image_name), since, '+inf')}
+
+def __is_healthy(host):
+    """
+    Pings a daemon, and marks it as unhealthy for BUILDER_SCHEDULER['unhealthy_ttl'] seconds if the ping fails.
+    """
+    try:
+        get_docker_client(host).ping()
+        return True
+    except Exception as e:
+        logger.warning(f"Builder host {host} is unhealthy: {e}")
+        get_redis_connection().set(__unhealthy_key(host), 1, ex=settings.BUILDER_SCHEDULER['unhealthy_ttl'])
+        return False
+
+def __record_affinity(image_name, host):
+    connection = get_redis_connection()
+    key = __affinity_key(image_name)
+    connection.zadd(key, {host: time.time()})
+    connection.expire(key, settings.BUILDER_SCHEDULER['affinity_ttl'])
+
+def __lease_key(host):
+    return f"dockerservice:builder:{host}:builds"
+
+def __unhealthy_key(host):
+    return f"dockerservice:builder:{host}:unhealthy"
+
+def __affinity_key(image_name):
+    return f"dockerservice:builder:affinity:{image_name}"
@@ -0,0 +1,109 @@
+from .errors import BuildError
+from django.conf import settings
+import os
+import re
+import subprocess
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+def buildkit_build(build_log, dockerfile_dir, dockerfile_name, repository_name, image_name, context_archive=None, docker_host='', abort=None):
+    """
+    Builds a Docker image with BuildKit using `docker buildx build`.
+
+    The layer cache is imported from and exported to the cache of the image name configured in
+    DOCKER_BUILD, so later builds of the same image name reuse the layers of earlier builds even after
+    the image itself has been removed. The built image is loaded into the local Docker daemon.
+
+    Parameters:
+    - build_log: File object the build output is written to as it arrives.
+    - dockerfile_dir: Path to the build context containing the Dockerfile.
+    - dockerfile_name: Name of the Dockerfile in the build context.
+    - repository_name: Repository name and tag of the built image.
+    - image_name: Name of the image, used to select the build cache.
+    - context_archive: Path of a tar or tar.gz build context, which is piped to buildx on stdin. The
+      dockerfile_name is then a path inside the archive.
+    - docker_host: URL of the Docker daemon the image is loaded into, empty for the daemon configured in the environment.
+    - abort: Optional StageAbort of the build, which terminates buildx once the build is aborted, so BuildKit stops the build.
+
+    Raises:
+    - BuildError: If the build fails.
+    - StageAbortedError: If the build was aborted.
+    """
+    if context_archive is not None:
+        dockerfile = dockerfile_name
+    else:
+        dockerfile = os.path.join(dockerfile_dir, dockerfile_name)
+
+    command = ["docker", "buildx", "build", "--progress=plain", "--load",
+               "--file", dockerfile,
+               "--tag", repository_name]
+
+    if settings.DOCKER_BUILD.get('buildx_builder'):
+        command += ["--builder", settings.DOCKER_BUILD['buildx_builder']]
+
+    command += build_cache_args(image_name)
+    command.append("-" if context_archive is not None else dockerfile_dir)
+
+    logger.info(f"Running {' '.join(command)}")
+
+    environment = dict(os.environ, DOCKER_BUILDKIT="1")
+    if docker_host:
+        environment['DOCKER_HOST'] = docker_host
+        options = next((entry for entry in settings.DOCKER_HOSTS if entry['url'] == docker_host), dict())
+        if options.get('cert_path'):
+            environment['DOCKER_CERT_PATH'] = options['cert_path']
+            environment['DOCKER_TLS_VERIFY'] = "1" if options.get('tls_verify', True) else ""
+
+    context = open(context_archive, 'rb') if context_archive is not None else subprocess.DEVNULL
+    try:
+        process = subprocess.Popen(command, stdin=context, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   env=environment)
+        if abort is not None:
+            abort.register(process.terminate)
+        last_error = ""
+        for line in process.stdout:
+            build_log.write(line)
+            text = line.decode(errors='replace').strip()
+            if "ERROR" in text:
+                last_error = text
+        process.wait()
+    finally:
+        if context_archive is not None:
+            context.close()
+
+    if abort is not None:
+        abort.check()
+    if process.returncode != 0:
+        raise BuildError(last_error or f"docker buildx build exited with code {process.returncode}")
+
+def build_cache_args(image_name):
+    """
+    Returns the `--cache-from` and `--cache-to` arguments of the build cache of an image name.
+
+    With cache_type "local" the cache is kept in a directory per image name below cache_dir, with
+    cache_type "registry" it is kept in the cache_repository registry under a tag per image name.
+
+    Parameters:
+    - image_name: Name of the image.
+
+    Returns:
+    - list: Arguments for `docker buildx build`, empty if no cache is configured.
+    """
+    cache_key = re.sub(r'[^A-Za-z0-9_.-]', '-', image_name)[:120]
+    cache_type = settings.DOCKER_BUILD.get('cache_type')
+
+    if cache_type == 'local':
+        cache_dir = os.path.join(settings.DOCKER_BUILD['cache_dir'], cache_key)
+        args = []
+        if os.path.isdir(cache_dir):
+            args += ["--cache-from", f"type=local,src={cache_dir}"]
+        return args + ["--cache-to", f"type=local,dest={cache_dir},mode=max"]
+
+    if cache_type == 'registry' and settings.DOCKER_BUILD.get('cache_repository'):
+        cache_ref = f"{settings.DOCKER_BUILD['cache_repository']}:{cache_key}"
+        return ["--cache-from", f"type=registry,ref={cache_ref}",
+                "--cache-to", f"type=registry,ref={cache_ref},mode=max"]
+
+    return []
@@ -0,0 +1,201 @@
+from .redis_service import get_redis_connection
+from .errors import StageAbortedError
+from django.conf import settings
+from contextlib import contextmanager
+import socket
+import threading
+import time
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+def request_cancellation(build_id):
+    """
+    Flags a build as cancelled, so the worker running its build or push aborts it.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    """
+    get_redis_connection().set(__cancel_key(build_id), 1, ex=settings.CANCELLATION['ttl'])
+
+def clear_cancellation(build_id):
+    """
+    Removes the cancellation flag of a build, so a retried build or push is not aborted by an earlier cancellation.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    """
+    get_redis_connection().delete(__cancel_key(build_id))
+
+def is_cancellation_requested(build_id):
+    """
+    Returns True if the build was flagged as cancelled with request_cancellation.
+    """
+    return bool(get_redis_connection().exists(__cancel_key(build_id)))
+
+@contextmanager
+def stage_abort(build_id, stage, timeout):
+    """
+    Context manager which aborts a running build or push once it is cancelled or its timeout expired.
+
+    A background thread checks the cancellation flag of the build every CANCELLATION['poll_interval'] seconds.
+    Once the build is cancelled or the timeout expired, the abort callbacks registered with StageAbort.register
+    are called, which shut down the streaming requests to the Docker daemon or stop the build process, so the
+    daemon aborts the operation and the worker is free within a second instead of waiting for the Django-Q timeout.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    - stage: "build" or "push".
+    - timeout: Seconds after which the stage is aborted.
+
+    Yields:
+    - StageAbort: The abort state of the stage.
+
+    Raises:
+    - StageAbortedError: If the stage was aborted while an operation of the stage failed or was interrupted.
+      A stage which finished normally is not reported as aborted.
+    """
+    abort = StageAbort(build_id, stage, timeout)
+    watcher = threading.Thread(target=abort.watch, name=f"{stage}-abort-{build_id}", daemon=True)
+    watcher.start()
+    try:
+        yield abort
+    except StageAbortedError:
+        raise
+    except Exception as e:
+        if abort.reason is None:
+            raise
+        raise abort.error() from e
+    finally:
+        abort.stop()
+        watcher.join(timeout=settings.CANCELLATION['poll_interval'])
+
+class StageAbort:
+    """
+    Abort state of a running build or push, see stage_abort.
+    """
+
+    def __init__(self, build_id, stage, timeout):
+        self.build_id = build_id
+        self.stage = stage
+        self.timeout = timeout
+        self.reason = None
+        self._deadline = time.monotonic() + timeout
+        self._aborted = threading.Event()
+        self._stopped = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def watch(self):
+        """
+        Checks for a cancellation or an expired timeout until the stage is aborted or stopped.
+        """
+        interval = settings.CANCELLATION['poll_interval']
+        while not self._stopped.wait(min(interval, max(self._deadline - time.monotonic(), 0))):
+            if time.monotonic() >= self._deadline:
+                self.abort("timeout")
+                return
+            try:
+                if is_cancellation_requested(self.build_id):
+                    self.abort("cancelled")
+                    return
+            except Exception as e:
+                logger.debug(f"Failed to check the cancellation of build {self.build_id}: {e}")
+
+    def abort(self, reason):
+        """
+        Aborts the stage and calls the registered abort callbacks.
+        """
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            callbacks = list(self._callbacks)
+        logger.warning(f"Aborting the {self.stage} of build {self.build_id}: {self.error()}")
+        self._aborted.set()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.debug(f"Abort callback of the {self.stage} of build {self.build_id} failed: {e}")
+
+    def register(self, callback):
+        """
+        Registers a function called without arguments when the stage is aborted, at once if it already is.
+        """
+        with self._lock:
+            if self.reason is None:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    @contextmanager
+    def track(self, client):
+        """
+        Context manager which shuts down the connections of the requests of a Docker client made within it when
+        the stage is aborted, so a build or push streamed from the daemon stops at once.
+
+        The client is shared by the threads of the worker, so only the requests of the current thread are tracked.
+
+        Raises:
+        - StageAbortedError: If the stage was aborted, instead of the error of the interrupted request.
+        """
+        responses = []
+        thread_id = threading.get_ident()
+
+        def collect(response, **kwargs):
+            if threading.get_ident() == thread_id:
+                responses.append(response)
+            return response
+
+        hooks = client.api.hooks['response']
+        hooks.append(collect)
+        self.register(lambda: [shutdown_response(response) for response in responses])
+        try:
+            yield
+        except Exception as e:
+            if self.reason is None:
+                raise
+            raise self.error() from e
+        finally:
+            hooks.remove(collect)
+        self.check()
+
+    def check(self):
+        """
+        Raises StageAbortedError if the stage was aborted.
+        """
+        if self.reason is not None:
+            raise self.error()
+
+    def wait(self, delay):
+        """
+        Sleeps for delay seconds, e.g. before a retry, and raises StageAbortedError as soon as the stage is aborted.
+        """
+        self._aborted.wait(delay)
+        self.check()
+
+    def error(self):
+        if self.reason == "timeout":
+            return StageAbortedError(f"{self.stage.capitalize()} timed out after {self.timeout} seconds", self.reason)
+        return StageAbortedError(f"{self.stage.capitalize()} cancelled", self.reason)
+
+    def stop(self):
+        self._stopped.set()
+
+def shutdown_response(response):
+    """
+    Shuts down the connection of a streaming HTTP response, which makes a read blocked on it in another thread return.
+    """
+    connection = getattr(response.raw, '_connection', None)
+    sock = getattr(connection, 'sock', None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+def __cancel_key(build_id):
+    return f"dockerservice:cancel:{build_id}"
@@ -0,0 +1,155 @@
+from ..models import build, push
+from .build_log_service import build_log_path
+from .docker_client_service import get_docker_client
+from .builder_service import get_builder_hosts
+from .status_data_service import invalidate_status_cache
+from .metrics_service import GC_RECLAIMED_BYTES, GC_DELETED_BUILDS
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+import os
+import shutil
+import time
+import uuid
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+def collect_garbage(dry_run=None, batch_size=None):
+    """
+    Removes expired builds and everything left behind by builds.
+
+    This function is run periodically by the Django-Q scheduler and does the following:
+    1. Deletes expired build entries, together with their push entries, status transitions, uploaded files
+       and build logs, in batches of batch_size builds. Builds which are still pending or in progress, or which
+       have a push that is, are kept.
+    2. Removes uploaded_files folders and build logs which do not belong to any build entry.
+    3. Prunes dangling images and the build cache of the Docker daemon.
+
+    In dry-run mode nothing is deleted, and the report contains what would have been deleted.
+
+    Parameters:
+    - dry_run: Only report what would be deleted. Defaults to GARBAGE_COLLECTION['dry_run'].
+    - batch_size: Number of builds deleted per transaction. Defaults to GARBAGE_COLLECTION['batch_size'].
+
+    Returns:
+    - dict: Report with the number of deleted builds and the reclaimed bytes per target.
+    """
+    config = settings.GARBAGE_COLLECTION
+    dry_run = config['dry_run'] if dry_run is None else dry_run
+    batch_size = batch_size or config['batch_size']
+
+    report = {
+        "dry_run": dry_run,
+        "deleted_builds": 0,
+        "reclaimed_bytes": {"files": 0, "images": 0, "build_cache": 0},
+    }
+
+    __delete_expired_builds(report, dry_run, batch_size)
+    __delete_orphaned_files(report, dry_run, config['orphan_grace_period'])
+    __prune_docker(report, dry_run)
+
+    if not dry_run:
+        GC_DELETED_BUILDS.inc(report["deleted_builds"])
+        for target, reclaimed_bytes in report["reclaimed_bytes"].items():
+            GC_RECLAIMED_BYTES.labels(target).inc(reclaimed_bytes)
+
+    logger.info(f"Garbage collection finished: {report}")
+    return report
+
+def __delete_expired_builds(report, dry_run, batch_size):
+    in_flight = [build.ProcessStatus.PENDING, build.ProcessStatus.IN_PROGRESS]
+    pushing = [push.ProcessStatus.PENDING, push.ProcessStatus.IN_PROGRESS]
+    expired = (build.objects
+               .filter(expiration_time__lt=timezone.now().date())
+               .exclude(status__in=in_flight)
+               .exclude(push__status__in=pushing)
+               .order_by('build_id'))
+    last_build_id = None
+
+    while True:
+        batch = expired if last_build_id is None else expired.filter(build_id__gt=last_build_id)
+        rows = list(batch.values_list('build_id', 'file_loc')[:batch_size])
+        if not rows:
+            return
+
+        last_build_id = rows[-1][0]
+        build_ids = [build_id for build_id, file_loc in rows]
+
+        if not dry_run:
+            with transaction.atomic():
+                build.objects.filter(build_id__in=build_ids).delete()
+            invalidate_status_cache(build_ids)
+
+        report["deleted_builds"] += len(rows)
+        for build_id, file_loc in rows:
+            if file_loc:
+                report["reclaimed_bytes"]["files"] += __remove_path(file_loc, dry_run)
+            report["reclaimed_bytes"]["files"] += __remove_path(build_log_path(build_id), dry_run)
+
+def __delete_orphaned_files(report, dry_run, grace_period):
+    """
+    Removes uploaded_files folders and build logs named after a build_id which has no build entry.
+
+    Files modified within the grace period are kept, since the build entry of a new upload is only
+    committed after its files are written.
+    """
+    candidates = dict()
+    for directory, suffix in [(settings.UPLOADED_FILES_DIR, ""), (settings.BUILD_LOG_DIR, ".log")]:
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            name = entry.name[:-len(suffix)] if suffix and entry.name.endswith(suffix) else entry.name
+            try:
+                candidates.setdefault(uuid.UUID(name), []).append(entry.path)
+            except ValueError:
+                continue
+
+    cutoff = time.time() - grace_period
+    existing = set(build.objects.filter(build_id__in=list(candidates)).values_list('build_id', flat=True))
+
+    for build_id, paths in candidates.items():
+        if build_id in existing:
+            continue
+        for path in paths:
+            if os.path.getmtime(path) < cutoff:
+                report["reclaimed_bytes"]["files"] += __remove_path(path, dry_run)
+
+def __prune_docker(report, dry_run):
+    for builder_host in get_builder_hosts():
+        try:
+            client = get_docker_client(builder_host['url'])
+
+            if dry_run:
+                dangling_images = client.images.list(filters={'dangling': True})
+                report["reclaimed_bytes"]["images"] += sum(image.attrs.get('Size', 0) for image in dangling_images)
+                build_cache = client.api.df().get('BuildCache') or []
+                report["reclaimed_bytes"]["build_cache"] += sum(entry.get('Size', 0) for entry in build_cache if not entry.get('InUse'))
+            else:
+                report["reclaimed_bytes"]["images"] += client.images.prune(filters={'dangling': True}).get('SpaceReclaimed') or 0
+                report["reclaimed_bytes"]["build_cache"] += client.api.prune_builds().get('SpaceReclaimed') or 0
+
+        except Exception as e:
+            logger.error(f"Error while pruning the docker daemon {builder_host['url'] or 'from the environment'}: {e}")
+
+def __remove_path(path, dry_run):
+    """
+    Removes a file or folder.
+
+    Returns:
+    - int: Number of bytes which were, or in dry-run mode would be, reclaimed.
+    """
+    if os.path.isdir(path):
+        size = sum(os.path.getsize(os.path.join(root, name)) for root, dirs, files in os.walk(path) for name in files)
+        if not dry_run:
+            shutil.rmtree(path, ignore_errors=True)
+        return size
+
+    if os.path.isfile(path):
+        size = os.path.getsize(path)
+        if not dry_run:
+            os.remove(path)
+        return size
+
+    return 0
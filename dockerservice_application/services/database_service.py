@@ -0,0 +1,16 @@
+from django.conf import settings
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """
+    Receiver of the connection_created signal which sets SQLITE_PRAGMAS on every new SQLite connection.
+
+    Parameters:
+    - sender: Database wrapper class of the connection.
+    - connection: The new database connection.
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', dict()).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,119 @@
+from django.conf import settings
+import docker
+import os
+import threading
+import time
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+__lock = threading.Lock()
+__clients = dict()
+__registry_logins = dict()
+
+def get_docker_client(host=''):
+    """
+    Returns the Docker client of the current worker process for a Docker daemon.
+
+    The client and its keep-alive connection pool are created once per process and daemon and reused by every task.
+    If the client has not been used for DOCKER_CLIENT['health_check_interval'] seconds, the daemon is pinged
+    first and the client is recreated when the ping fails. A client inherited from a parent process through
+    fork is never reused, since its connections would be shared with the parent.
+
+    Parameters:
+    - host: URL of a Docker daemon in DOCKER_HOSTS, or an empty string for the daemon configured in the environment.
+
+    Returns:
+    - docker.DockerClient: Client connected to the Docker daemon.
+    """
+    with __lock:
+        now = time.monotonic()
+        client, client_pid, last_health_check = __clients.get(host, (None, None, 0.0))
+
+        if client is not None and client_pid != os.getpid():
+            client = None
+
+        if client is not None and now - last_health_check >= settings.DOCKER_CLIENT['health_check_interval']:
+            try:
+                client.ping()
+            except Exception as e:
+                logger.warning(f"Docker daemon {host or 'from the environment'} health check failed, reconnecting: {e}")
+                __close_client(client)
+                client = None
+
+        if client is None:
+            client = __create_client(host)
+            __forget_registry_logins(client.api.base_url)
+
+        __clients[host] = (client, os.getpid(), now)
+        return client
+
+def reset_docker_client():
+    """
+    Closes the Docker clients of the current worker process and forgets the cached registry logins.
+
+    The next call to get_docker_client creates a new client. Used after connection errors.
+    """
+    with __lock:
+        for client, client_pid, last_health_check in __clients.values():
+            if client_pid == os.getpid():
+                __close_client(client)
+        __clients.clear()
+        __registry_logins.clear()
+
+def __create_client(host):
+    """
+    Creates a Docker client for a daemon, using the TLS settings of the daemon in DOCKER_HOSTS.
+    """
+    if not host:
+        return docker.from_env(max_pool_size=settings.DOCKER_CLIENT['max_pool_size'])
+
+    options = next((entry for entry in settings.DOCKER_HOSTS if entry['url'] == host), dict())
+    tls = False
+    if options.get('cert_path'):
+        cert_path = options['cert_path']
+        tls = docker.tls.TLSConfig(client_cert=(os.path.join(cert_path, 'cert.pem'), os.path.join(cert_path, 'key.pem')),
+                                   ca_cert=os.path.join(cert_path, 'ca.pem'), verify=options.get('tls_verify', True))
+
+    return docker.DockerClient(base_url=host, tls=tls, max_pool_size=settings.DOCKER_CLIENT['max_pool_size'])
+
+def __forget_registry_logins(base_url):
+    for key in [key for key in __registry_logins if key[0] == base_url]:
+        del __registry_logins[key]
+
+def registry_login(client, username, password, registry):
+    """
+    Logs into a registry, reusing a successful login until it expires.
+
+    Credentials are only validated against the registry once every DOCKER_CLIENT['registry_login_ttl']
+    seconds for every Docker daemon. A failed login is never cached.
+
+    Parameters:
+    - client: Docker client to log in with.
+    - username: Registry username.
+    - password: Registry password.
+    - registry: URL of the registry.
+
+    Returns:
+    - dict: Response of the login request, or of the cached login.
+    """
+    key = (client.api.base_url, username, password, registry)
+
+    with __lock:
+        cached = __registry_logins.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+    credential_map = client.login(username=username, password=password, registry=registry)
+
+    with __lock:
+        __registry_logins[key] = (time.monotonic() + settings.DOCKER_CLIENT['registry_login_ttl'], credential_map)
+
+    return credential_map
+
+def __close_client(client):
+    try:
+        client.close()
+    except Exception as e:
+        logger.warning(f"Error while closing docker client: {e}")
@@ -1,9 +1,31 @@
-from ..models import build, push
+from ..models import build, push, status_transition
+from .build_log_service import open_build_log
+from .status_service import publish_status_change
+from .docker_client_service import get_docker_client, registry_login
+from .buildkit_service import buildkit_build
+from .builder_service import acquire_builder, release_builder, get_prefetch_hosts
+from .redis_service import get_redis_connection, redis_lock
+from .registry_service import get_remote_config_digest
+from .image_retention_service import touch_image, enforce_image_budget
+from .metrics_service import observe_queue_wait, record_outcome, track_stage, PUSHED_BYTES
+from .retry_service import call_with_retries
+from .cancel_service import request_cancellation, stage_abort
+from .logging_service import log_context, RateLimiter
+from .errors import BuildError, PushError, StageAbortedError
+from django.conf import settings
 from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django_q.tasks import async_task
+from contextlib import nullcontext
+from django_q.brokers import get_broker
+from docker.auth import INDEX_NAME, resolve_repository_name
+from docker.utils import parse_repository_tag
+from redis.exceptions import LockError
 import docker
 import os
-import traceback
 import shutil
+import time
 
 if os.environ.get('DOCKERHUB_NAMESPACE') is None:
     namespace = None
@@ -14,54 +36,334 @@ registry_username = str(os.environ.get('DOCKERHUB_USERNAME')).strip()
 registry_password = str(os.environ.get('DOCKERHUB_PASSWORD')).strip()
 
 registry_url = "https://index.docker.io/v2/"
-auth_config = {
-            'username': registry_username,
-            'password': registry_password
-        }    
+registry_api_url = os.environ.get('DOCKERHUB_REGISTRY_API_URL', "https://registry-1.docker.io").strip()
 
 
 import logging
 
 logger = logging.getLogger(__name__)
 
-def docker_build_push(build_id, push_id):
+def docker_build_push(build_id, push_id, enqueued_at=None):
     """
-    Orchestrates the build and push process for a Docker image.
+    Runs the build stage of the build and push process for a Docker image.
 
-    This function initiates the Docker build process, checks the build status, and proceeds with the push if the build is successful.
+    This function initiates the Docker build process, checks the build status, and enqueues the push stage of every
+    target on the push queue if the build is successful, so the build worker is free for the next build while the image is pushed.
+    Pushes which failed because an earlier attempt of the build failed are enqueued again.
     It logs relevant information and updates the status of the build and push in the database.
 
     Parameters:
     - build_id: Unique identifier for the build process.
     - push_id: Unique identifier for the push process.
+    - enqueued_at: Unix time at which the task was enqueued.
     """
-    print(f"Started task {build_id}")
+    with log_context(build_id=build_id):
+        logger.info(f"Started task {build_id}")
+        observe_queue_wait("build", enqueued_at)
 
-    logger.info(f"Started task {build_id}")
+        with track_stage("build"):
+            build_status, docker_image_tag, dockerfile_dir = docker_build(build_id, push_id)
 
-    build_status, docker_image_tag, dockerfile_dir = docker_build(build_id, push_id)
+        if build_status:
+            enqueue_pushes(build_id, [push.ProcessStatus.PENDING, push.ProcessStatus.FAILED])
+        else:
+            logger.error(f"Failed task -- {build_id}")
 
-    if build_status:
-        push_status = docker_push(push_id)
+def docker_push_stage(build_id, *push_ids, enqueued_at=None):
+    """
+    Runs the push stage of the build and push process for a Docker image.
 
-        if push_status:
-            remove_task_metadata(docker_image_tag, dockerfile_dir)
-            print(f"Completed task -- {build_id}")
-            logger.info(f"Completed task -- {build_id}")
-        else:
-            print(f"Failed task -- {build_id}")
+    This function pushes the built image to the given targets one after the other. The targets of a task are
+    in the same registry, so the layers are uploaded with the first push and only the manifest with the others.
+    The uploaded files are removed once every push of the build succeeded or was cancelled.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    - push_ids: Unique identifiers of the push processes.
+    - enqueued_at: Unix time at which the task was enqueued.
+    """
+    with log_context(build_id=build_id):
+        observe_queue_wait("push", enqueued_at)
+
+        push_status = True
+        for push_id in push_ids:
+            with track_stage("push"):
+                push_status = docker_push(push_id) and push_status
+
+        if not push_status:
             logger.error(f"Failed task -- {build_id}")
 
+        finished = [push.ProcessStatus.COMPLETED, push.ProcessStatus.CANCELLED]
+        if not push.objects.filter(build_id=build_id).exclude(status__in=finished).exists():
+            build_obj = build.objects.only('file_loc', 'image_name', 'image_tag', 'builder_host').get(build_id=build_id)
+            remove_task_metadata(get_repository_name(build_obj.image_name, build_obj.image_tag), build_obj.file_loc, build_obj.builder_host)
+            if push_status:
+                logger.info(f"Completed task -- {build_id}")
 
-    else:
-        print(f"Failed task -- {build_id}")
-        logger.error(f"Failed task -- {build_id}")
+def prefetch_base_image(reference, builder_host='', enqueued_at=None):
+    """
+    Runs the prefetch stage, which pulls a base image of a queued build on the Docker daemon it will likely run on.
+
+    Errors are only logged, since the build pulls missing base images itself.
+
+    Parameters:
+    - reference: Base image reference with tag or digest.
+    - builder_host: URL of the Docker daemon, empty for the daemon configured in the environment.
+    - enqueued_at: Unix time at which the task was enqueued.
+    """
+    observe_queue_wait("prefetch", enqueued_at)
+
+    try:
+        with track_stage("prefetch"):
+            pulled = pull_base_image(reference, builder_host)
+    except Exception as e:
+        logger.warning(f"Prefetch of base image {reference} on {builder_host or 'the local daemon'} failed: {e}")
+        record_outcome("prefetch", "error")
+        return
+
+    record_outcome("prefetch", "success" if pulled else "present")
+    logger.info(f"Prefetch of base image {reference} on {builder_host or 'the local daemon'} done, pulled: {pulled}")
+
+def enqueue_prefetch(image_name, base_images):
+    """
+    Enqueues the pull of the base images of a new build on the prefetch queue, so they are pulled while the build
+    waits in the build queue.
+
+    An image is enqueued for a daemon at most once every BASE_IMAGE_PREFETCH['dedupe_ttl'] seconds, however many
+    queued builds use it. Errors are logged and ignored, since the build pulls missing base images itself.
+
+    Parameters:
+    - image_name: Name of the image the build builds, selecting the daemons the build will likely run on.
+    - base_images: Base image references of the Dockerfile, as in its parsed summary.
+
+    Returns:
+    - list: The ids of the enqueued tasks.
+    """
+    if not settings.BASE_IMAGE_PREFETCH['enabled'] or not base_images:
+        return []
+
+    task_ids = []
+    try:
+        connection = get_redis_connection()
+        broker = get_stage_broker('prefetch')
+        for builder_host in get_prefetch_hosts(image_name):
+            for reference in base_images:
+                if connection.set(f"dockerservice:prefetch:{builder_host}:{reference}", 1, nx=True,
+                                  ex=settings.BASE_IMAGE_PREFETCH['dedupe_ttl']):
+                    task_ids.append(async_task(prefetch_base_image, reference, builder_host, enqueued_at=time.time(), broker=broker))
+    except Exception as e:
+        logger.warning(f"Failed to enqueue the prefetch of the base images of {image_name}: {e}")
+    return task_ids
+
+def pull_base_image(reference, builder_host='', abort=None):
+    """
+    Pulls a base image on a Docker daemon unless the daemon already has it.
+
+    The pull holds a Redis lock on the daemon and image, shared by the prefetch and build workers of all hosts,
+    so an image is pulled only once at a time on a daemon and a worker waiting for the lock finds it pulled.
+    Transient errors are retried within the retry budget of the prefetch stage.
+
+    Parameters:
+    - reference: Base image reference with tag or digest.
+    - builder_host: URL of the Docker daemon, empty for the daemon configured in the environment.
+    - abort: Optional StageAbort of the build waiting for the image, which stops the wait for the lock and the pull.
+
+    Returns:
+    - bool: True if the image was pulled, False if the daemon already had it.
+
+    Raises:
+    - BuildError: If the daemon reports an error in the pull output.
+    - redis.exceptions.LockError: If the lock was not acquired within BASE_IMAGE_PREFETCH['pull_timeout'] seconds.
+    - StageAbortedError: If the build was aborted meanwhile.
+    """
+    client = get_docker_client(builder_host)
+    if __has_image(client, reference):
+        return False
+
+    pull_timeout = settings.BASE_IMAGE_PREFETCH['pull_timeout']
+    lock = redis_lock(f"pull:{builder_host}:{reference}", timeout=pull_timeout)
+    deadline = time.monotonic() + pull_timeout
+    # Wait for the lock in steps of a second, so an aborted build stops waiting
+    while not lock.acquire(blocking_timeout=1):
+        if abort is not None:
+            abort.check()
+        if time.monotonic() >= deadline:
+            raise LockError(f"Timed out waiting for the pull of {reference} by another worker")
+
+    try:
+        if __has_image(client, reference):
+            return False
+        if abort is not None:
+            with abort.track(client):
+                call_with_retries("prefetch", lambda: __pull_image(client, reference), abort=abort)
+        else:
+            call_with_retries("prefetch", lambda: __pull_image(client, reference))
+    finally:
+        lock.release()
+    return True
+
+def __has_image(client, reference):
+    try:
+        client.images.get(reference)
+        return True
+    except docker.errors.ImageNotFound:
+        return False
+
+def __pull_image(client, reference):
+    """
+    Pulls an image, with the credentials of its registry if there are any.
+    """
+    repository, tag = parse_repository_tag(reference)
+    registry = get_registry(reference)
+    auth_config = None
+    if registry['username'] and (registry['registry'] != INDEX_NAME or os.environ.get('DOCKERHUB_USERNAME') is not None):
+        auth_config = {'username': registry['username'], 'password': registry['password']}
+
+    for line in client.api.pull(repository, tag=tag or 'latest', stream=True, decode=True, auth_config=auth_config):
+        if 'errorDetail' in line:
+            raise BuildError(line['errorDetail'].get('message', f"Error while pulling {reference}"))
+
+def enqueue_pushes(build_id, statuses):
+    """
+    Enqueues the pushes of a build with the given statuses, with one task for every registry.
+
+    The tasks of different registries run in parallel on the push workers.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    - statuses: Push statuses of the pushes to enqueue.
+
+    Returns:
+    - list: The ids of the enqueued tasks.
+    """
+    pushes_by_registry = dict()
+    for push_obj in push.objects.filter(build_id=build_id, status__in=statuses).order_by('push_time'):
+        registry = get_registry(get_push_repository_name(push_obj))['registry']
+        pushes_by_registry.setdefault(registry, []).append(str(push_obj.push_id))
+
+    task_ids = []
+    broker = get_stage_broker('push')
+    for push_ids in pushes_by_registry.values():
+        push.objects.filter(push_id__in=push_ids).update(enqueued_at=timezone.now())
+        task_ids.append(async_task(docker_push_stage, str(build_id), *push_ids, enqueued_at=time.time(), broker=broker))
+    return task_ids
+
+def cancel_build_and_push(build_id):
+    """
+    Cancels a build and its pushes which have not finished yet.
+
+    Pending and running builds and pushes are moved to Cancelled at once. If any of them was cancelled, the
+    cancellation is also flagged in Redis, so the worker running the build or a push aborts the daemon operation
+    within CANCELLATION['poll_interval'] seconds and removes the upload. Queued tasks skip cancelled builds and
+    pushes when they start. A build which had already finished is not flagged, so a later retry is not aborted.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+
+    Returns:
+    - bool: True if the build or any of its pushes was cancelled, False if all of them had already finished.
+    """
+    if not __cancel_build_and_pushes(build_id):
+        return False
+
+    try:
+        request_cancellation(build_id)
+    except Exception as e:
+        logger.error(f"Failed to flag build {build_id} as cancelled, its running stage is not aborted: {e}")
+    return True
+
+def __cancel_build_and_pushes(build_id):
+    """
+    Moves a build and its pending and running pushes to Cancelled.
+
+    Returns:
+    - bool: True if the status of the build or of any push was changed.
+    """
+    reason = "Cancelled by request"
+    cancelled = update_build_status(build_id, build.ProcessStatus.CANCELLED, reason=reason, fields=('status',)) is not None
+
+    active = [push.ProcessStatus.PENDING, push.ProcessStatus.IN_PROGRESS]
+    for push_id in push.objects.filter(build_id=build_id, status__in=active).values_list('push_id', flat=True):
+        cancelled = update_push_status(push_id, push.ProcessStatus.CANCELLED, reason=reason, fields=('status',)) is not None or cancelled
+    return cancelled
+
+def get_stage_broker(stage):
+    """
+    Returns the Django-Q broker of the queue of a pipeline stage.
+
+    Parameters:
+    - stage: Name of the stage in PIPELINE_STAGES, "prefetch", "build" or "push".
+
+    Returns:
+    - django_q.brokers.Broker: Broker of the stage queue.
+    """
+    return get_broker(settings.PIPELINE_STAGES[stage]['name'])
+
+def get_repository_name(image_name, image_tag):
+    """
+    Returns the repository name and tag of an image, including the Docker Hub namespace if one is configured.
+    """
+    image_name_tag = image_name + ":" + image_tag
+    if namespace is None:
+        return image_name_tag
+    return namespace + "/" + image_name_tag
+
+def get_target_repository_name(target):
+    """
+    Returns the repository name and tag a target reference is pushed to.
+
+    References without a registry host are pushed to Docker Hub, including the namespace if one is configured.
+
+    Parameters:
+    - target: Validated image reference with tag, e.g. my_image:1.4 or registry.example.com/namespace/my_image:1.4
+
+    Returns:
+    - str: Repository name and tag of the target.
+    """
+    repository, tag = parse_repository_tag(target)
+    if resolve_repository_name(repository)[0] != INDEX_NAME:
+        return f"{repository}:{tag}"
+    return get_repository_name(repository, tag)
+
+def get_push_repository_name(push_obj):
+    """
+    Returns the repository name and tag a push entry pushes to.
+    """
+    return push_obj.repository_name or get_repository_name(push_obj.image_name, push_obj.image_tag)
+
+def get_registry(repository_name):
+    """
+    Returns the registry of a repository name with the URLs and credentials to push to it.
+
+    Parameters:
+    - repository_name: Repository name and tag, optionally with a registry host.
+
+    Returns:
+    - dict: registry name, registry URL used to log in, registry API URL, username and password, and
+      the repository name with tag inside the registry
+    """
+    repository, tag = parse_repository_tag(repository_name)
+    index_name, remote_name = resolve_repository_name(repository)
+
+    if index_name == INDEX_NAME:
+        return {'registry': INDEX_NAME, 'url': registry_url, 'api_url': registry_api_url,
+                'username': registry_username, 'password': registry_password, 'remote_name': f"{remote_name}:{tag or 'latest'}"}
+
+    credentials = settings.REGISTRY_CREDENTIALS.get(index_name, dict())
+    return {'registry': index_name, 'url': index_name, 'api_url': f"https://{index_name}",
+            'username': credentials.get('username'), 'password': credentials.get('password'),
+            'remote_name': f"{remote_name}:{tag or 'latest'}"}
 
 def docker_build(build_id, push_id):
     """
     Initiates the Docker build process for a given build_id and push_id.
 
     This function updates the build status in the database, performs the Docker build, and updates the status accordingly.
+    The build output is streamed from the Docker daemon and appended to the build log as it arrives.
+    Missing base images are pulled before the build with pull_base_image, which waits for a running prefetch of the same image.
+    Transient errors are retried within the retry budget of the build stage. The ID of the built image is recorded,
+    so a retry after the image was built, e.g. after tagging failed, reuses the local image instead of rebuilding it.
+    The build is aborted on the daemon once it is cancelled or its timeout expires, see stage_abort.
 
     Parameters:
     - build_id: Unique identifier for the build process.
@@ -70,46 +372,292 @@ def docker_build(build_id, push_id):
     Returns:
     - Tuple: A tuple containing a boolean indicating the build status, the Docker image repository name, and the Dockerfile directory.
     """    
-    print(f"Build started for build_id {build_id} ...")
     logger.info(f"Build started for build_id {build_id} ...")
 
-    build_obj = update_build_status(build_id, build.ProcessStatus.IN_PROGRESS)
+    build_obj = update_build_status(build_id, build.ProcessStatus.IN_PROGRESS, fields=BUILD_FIELDS)
+    if build_obj is None:
+        __discard_cancelled_build(build_id)
+        return False, None, None
 
-    image_name_tag = build_obj.image_name + ":" + build_obj.image_tag
     dockerfile_name = build_obj.file_name
     dockerfile_dir = build_obj.file_loc
-    if namespace is None:
-        repository_name = image_name_tag
+    repository_name = get_repository_name(build_obj.image_name, build_obj.image_tag)
+
+    if build_obj.dockerfile_path:
+        # Uploaded build context archive, sent to the builder as it is without extracting it
+        context_archive = os.path.join(dockerfile_dir, dockerfile_name)
+        dockerfile_name = build_obj.dockerfile_path
     else:
-        repository_name = namespace + "/" + image_name_tag
+        context_archive = None
 
+    timeout = build_obj.timeout or settings.PIPELINE_STAGES['build']['timeout']
     try:
-        client = docker.from_env()
+        with stage_abort(build_id, "build", timeout) as abort:
+            builder_host = __run_build(build_id, push_id, build_obj, repository_name, dockerfile_dir, dockerfile_name,
+                                       context_archive, abort)
+    except StageAbortedError as e:
+        __abort_build(build_id, push_id, dockerfile_dir, e)
+        return False, repository_name, dockerfile_dir
 
-        # Build the Docker image
-        client.images.build(path=dockerfile_dir, dockerfile=dockerfile_name, tag=repository_name)
+    if builder_host is None:
+        return False, repository_name, dockerfile_dir
 
-    except Exception as e:
-        traceback.print_exc()
-        print(f"Build failed for build id {build_id} ...")
-        logger.error(f"Build failed for build id {build_id} ...")
-        print(f"An error occurred: {e}")
-        update_build_status(build_id, build.ProcessStatus.FAILED, reason="Error while building the image")
-        update_push_status(push_id, push.ProcessStatus.FAILED, reason="Error while building the image")
+    if update_build_status(build_id, build.ProcessStatus.COMPLETED, fields=('status',)) is None:
+        # Cancelled just before the build finished
+        __discard_cancelled_build(build_id)
         return False, repository_name, dockerfile_dir
 
-    update_build_status(build_id, build.ProcessStatus.COMPLETED)
-    print(f"Build completed for build id {build_id}")
+    touch_image(repository_name, build_obj.image_name, build_obj.image_tag, builder_host)
+    record_outcome("build", "success")
     logger.info(f"Build completed for build id {build_id}")
 
     return True, repository_name, dockerfile_dir
 
+def __run_build(build_id, push_id, build_obj, repository_name, dockerfile_dir, dockerfile_name, context_archive, abort):
+    """
+    Builds and tags the image of docker_build on a reserved Docker daemon, and marks the build as failed if that fails.
+
+    Returns:
+    - str: URL of the Docker daemon the image was built on, or None if the build failed.
+
+    Raises:
+    - StageAbortedError: If the build was cancelled or timed out.
+    """
+    try:
+        # Prefer the daemon of an earlier attempt, which may still hold the built image
+        builder_host = acquire_builder(build_id, build_obj.image_name, preferred_host=build_obj.builder_host or None, abort=abort)
+    except StageAbortedError:
+        raise
+    except Exception as e:
+        logger.error(f"No builder host available for build id {build_id}: {e}")
+        record_outcome("build", "no_builder")
+        __fail_build(build_id, push_id, "No builder host available")
+        return None
+
+    try:
+        build.objects.filter(build_id=build_id).update(builder_host=builder_host)
+
+        try:
+            with open_build_log(build_id) as build_log:
+                build_log.write(f"==> Build of {repository_name} started at {timezone.now().isoformat()} on {builder_host or 'the local daemon'}\n".encode())
+                __pull_base_images(build_obj, builder_host, build_log, abort)
+
+                def build_image():
+                    if __reuse_built_image(build_id, repository_name, builder_host):
+                        build_log.write(f"==> Reusing the built image {__get_built_image_id(build_id)}\n".encode())
+                        return
+
+                    # Build the Docker image, streaming the output into the build log
+                    if settings.DOCKER_BUILD['builder'] == 'buildkit':
+                        buildkit_build(build_log, dockerfile_dir, dockerfile_name, repository_name, build_obj.image_name, context_archive, builder_host, abort)
+                    else:
+                        __classic_build(build_log, dockerfile_dir, dockerfile_name, repository_name, context_archive, builder_host, abort)
+                    __record_built_image(build_id, repository_name, builder_host)
+
+                def log_retry(attempt, error, delay):
+                    build_log.write(f"==> Attempt {attempt} failed: {error}, retrying in {delay:.1f}s\n".encode())
+
+                try:
+                    call_with_retries("build", build_image, on_attempt=lambda attempt: __count_attempt(build, build_id=build_id),
+                                      on_retry=log_retry, abort=abort)
+                except StageAbortedError as e:
+                    build_log.write(f"==> {e}\n".encode())
+                    raise
+                except Exception as e:
+                    build_log.write(f"==> Build failed: {e}\n".encode())
+                    raise
+
+        except StageAbortedError:
+            raise
+        except Exception as e:
+            logger.exception(f"Build failed for build id {build_id}: {e}")
+            record_outcome("build", "build_error" if isinstance(e, BuildError) else "error")
+            __fail_build(build_id, push_id, str(e)[:500] if isinstance(e, BuildError) else "Error while building the image")
+            return None
+
+        try:
+            call_with_retries("build", lambda: __tag_targets(build_id, repository_name, builder_host), abort=abort)
+        except StageAbortedError:
+            raise
+        except Exception as e:
+            logger.exception(f"Tagging the targets failed for build id {build_id}: {e}")
+            record_outcome("build", "error")
+            __fail_build(build_id, push_id, "Error while tagging the image")
+            return None
+
+    finally:
+        release_builder(build_id, builder_host)
+
+    return builder_host
+
+def __abort_build(build_id, push_id, dockerfile_dir, error):
+    """
+    Marks an aborted build as cancelled, or as failed if its timeout expired.
+
+    The daemon removes the containers of the aborted build. The upload of a cancelled build is removed as well,
+    since it is never built again, while a timed out build keeps it so it can be retried.
+    """
+    logger.warning(f"Build {build_id} aborted: {error}")
+    if error.reason == "cancelled":
+        record_outcome("build", "cancelled")
+        __cancel_build_and_pushes(build_id)
+        __delete_files_in_folder(dockerfile_dir)
+    else:
+        record_outcome("build", "timeout")
+        __fail_build(build_id, push_id, str(error))
+
+def __discard_cancelled_build(build_id):
+    """
+    Removes the upload of a build if it was cancelled.
+    """
+    file_loc = build.objects.filter(build_id=build_id, status=build.ProcessStatus.CANCELLED).values_list('file_loc', flat=True).first()
+    if file_loc:
+        __delete_files_in_folder(file_loc)
+
+def __pull_base_images(build_obj, builder_host, build_log, abort=None):
+    """
+    Pulls the base images of a build which are missing on its daemon. Errors are only logged, the build then
+    pulls the images itself and reports any error.
+    """
+    for reference in build_obj.dockerfile_summary.get('base_images', []):
+        try:
+            if pull_base_image(reference, builder_host, abort):
+                build_log.write(f"==> Pulled base image {reference}\n".encode())
+        except StageAbortedError:
+            raise
+        except Exception as e:
+            logger.warning(f"Pulling base image {reference} for build {build_obj.build_id} failed: {e}")
+            build_log.write(f"==> Pulling base image {reference} failed: {e}\n".encode())
+
+def __fail_build(build_id, push_id, reason):
+    """
+    Marks a build and all of its pushes as failed.
+    """
+    update_build_status(build_id, build.ProcessStatus.FAILED, reason=reason)
+    for failed_push_id in __get_push_ids(build_id, push_id):
+        update_push_status(failed_push_id, push.ProcessStatus.FAILED, reason="Error while building the image")
+
+def __get_push_ids(build_id, push_id):
+    """
+    Returns the ids of all pushes of a build, or only the given push id if the build has no push entries.
+    """
+    push_ids = list(push.objects.filter(build_id=build_id).values_list('push_id', flat=True))
+    return push_ids or [push_id]
+
+def __count_attempt(model, **lookup):
+    """
+    Increments the attempts of a build or push entry.
+    """
+    model.objects.filter(**lookup).update(attempts=F('attempts') + 1)
+
+def __get_built_image_id(build_id):
+    """
+    Returns the ID of the image built for a build, or an empty string if it was not built yet.
+    """
+    return build.objects.filter(build_id=build_id).values_list('image_id', flat=True).first() or ''
+
+def __record_built_image(build_id, repository_name, builder_host):
+    """
+    Records the ID of the image just built for a build.
+    """
+    image_id = get_docker_client(builder_host).images.get(repository_name).id
+    build.objects.filter(build_id=build_id).update(image_id=image_id)
+
+def __reuse_built_image(build_id, repository_name, builder_host):
+    """
+    Checks if the image of an earlier attempt of a build is still present in the Docker daemon, and tags it with the repository name.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    - repository_name: Repository name and tag of the built image.
+    - builder_host: URL of the Docker daemon the build runs on.
+
+    Returns:
+    - bool: True if the image is reused and does not need to be built again.
+    """
+    image_id = __get_built_image_id(build_id)
+    if not image_id:
+        return False
+
+    client = get_docker_client(builder_host)
+    try:
+        image = client.images.get(image_id)
+    except docker.errors.ImageNotFound:
+        return False
+
+    if image.id != image_id:
+        return False
+
+    repository, tag = parse_repository_tag(repository_name)
+    client.api.tag(image_id, repository, tag)
+    return True
+
+def __tag_targets(build_id, repository_name, builder_host):
+    """
+    Tags the built image with the repository name of every push target of the build.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    - repository_name: Repository name and tag of the built image.
+    - builder_host: URL of the Docker daemon the image was built on.
+    """
+    targets = {get_push_repository_name(push_obj) for push_obj in push.objects.filter(build_id=build_id)}
+    targets.discard(repository_name)
+    if not targets:
+        return
+
+    client = get_docker_client(builder_host)
+    for target in sorted(targets):
+        repository, tag = parse_repository_tag(target)
+        client.api.tag(repository_name, repository, tag)
+
+def __classic_build(build_log, dockerfile_dir, dockerfile_name, repository_name, context_archive=None, builder_host='', abort=None):
+    """
+    Builds a Docker image with the classic builder of the Docker daemon.
+
+    Parameters:
+    - build_log: File object the build output is written to as it arrives.
+    - dockerfile_dir: Path to the build context containing the Dockerfile.
+    - dockerfile_name: Name of the Dockerfile in the build context.
+    - repository_name: Repository name and tag of the built image.
+    - context_archive: Path of a tar or tar.gz build context, which is streamed to the daemon as the request body.
+    - builder_host: URL of the Docker daemon to build on, empty for the daemon configured in the environment.
+    - abort: Optional StageAbort of the build, which closes the connection to the daemon once the build is aborted,
+      so the daemon stops the build.
+
+    Raises:
+    - BuildError: If the daemon reports an error in the build output.
+    - StageAbortedError: If the build was aborted.
+    """
+    client = get_docker_client(builder_host)
+
+    # The containers of failed and aborted builds are removed as well
+    with abort.track(client) if abort is not None else nullcontext():
+        if context_archive is not None:
+            with open(context_archive, 'rb') as context:
+                chunks = client.api.build(fileobj=context, custom_context=True, dockerfile=dockerfile_name, tag=repository_name, rm=True,
+                                          forcerm=True, decode=True)
+                __write_build_output(build_log, chunks)
+        else:
+            chunks = client.api.build(path=dockerfile_dir, dockerfile=dockerfile_name, tag=repository_name, rm=True, forcerm=True, decode=True)
+            __write_build_output(build_log, chunks)
+
+def __write_build_output(build_log, chunks):
+    for chunk in chunks:
+        if 'stream' in chunk:
+            build_log.write(chunk['stream'].encode())
+        if 'errorDetail' in chunk:
+            raise BuildError(chunk['errorDetail'].get('message', "Error while building the image"))
+
 
 def docker_push(push_id):
     """
     Initiates the Docker push process for a given push_id.
 
     This function updates the push status in the database, performs the Docker push, and updates the status accordingly.
+    Transient errors of the login and the push are retried within the retry budget of the push stage. The image is
+    pushed from the local image recorded by the build, which is tagged again if the tag was moved or removed meanwhile.
+    The push is aborted when the build is cancelled or the push timeout expires.
 
     Parameters:
     - push_id: Unique identifier for the push process.
@@ -117,104 +665,319 @@ def docker_push(push_id):
     Returns:
     - bool: A boolean indicating the success of the push process.
     """    
-    print(f"Push started for push id {push_id} ...")
-    logger.info(f"Push started for push id {push_id} ...")
+    with log_context(push_id=push_id):
+        logger.info(f"Push started for push id {push_id} ...")
+
+        push_obj:push = update_push_status(push_id, push.ProcessStatus.IN_PROGRESS, fields=PUSH_FIELDS)
+        if push_obj is None:
+            return False
+
+        timeout = push_obj.timeout or settings.PIPELINE_STAGES['push']['timeout']
+        try:
+            with stage_abort(push_obj.build_id, "push", timeout) as abort:
+                return __run_push(push_id, push_obj, abort)
+        except StageAbortedError as e:
+            logger.warning(f"Push {push_id} aborted: {e}")
+            if e.reason == "cancelled":
+                update_push_status(push_id, push.ProcessStatus.CANCELLED, reason="Cancelled by request")
+                record_outcome("push", "cancelled")
+            else:
+                update_push_status(push_id, push.ProcessStatus.FAILED, reason=str(e))
+                record_outcome("push", "timeout")
+            return False
+
+def __run_push(push_id, push_obj, abort):
+    """
+    Logs in and pushes the image of docker_push, and marks the push as failed if that fails.
 
-    push_obj:push = update_push_status(push_id, push.ProcessStatus.IN_PROGRESS)
-    
+    Returns:
+    - bool: A boolean indicating the success of the push process.
+
+    Raises:
+    - StageAbortedError: If the push was cancelled or timed out.
+    """
     image_name_tag = push_obj.image_name + ":" + push_obj.image_tag
-    
-    if namespace is None:
-        final_repository_name = image_name_tag
-    else:    
-        final_repository_name = namespace + "/" + image_name_tag
+    final_repository_name = get_push_repository_name(push_obj)
+    registry = get_registry(final_repository_name)
+    push_auth_config = None
 
     try:
-        client = docker.from_env()
-        credential_map = client.login(username=registry_username, password=registry_password, registry=registry_url)
-
+        # The image is pushed from the Docker daemon it was built on
+        client = get_docker_client(push_obj.build.builder_host if push_obj.build is not None else '')
+        if registry['registry'] == INDEX_NAME or registry['username']:
+            credential_map = call_with_retries("push", lambda: registry_login(client, registry['username'], registry['password'], registry['url']),
+                                               abort=abort)
+            push_auth_config = {'username': registry['username'], 'password': registry['password']}
+
+    except StageAbortedError:
+        raise
     except Exception as e:
-        traceback.print_exc()
-        logger.error("Error while logging into docker hub")
-        print(f"An error occurred: {e}")
+        logger.exception(f"Error while logging into {registry['url']}: {e}")
         update_push_status(push_id, push.ProcessStatus.FAILED, reason="Failed to Login")
+        record_outcome("push", "login_failed")
         return False
 
-    try:
-        for line in client.images.push(repository=final_repository_name, stream=True, auth_config=auth_config, decode=True):
-            print(line)
-            if 'errorDetail' in line:
-                raise Exception("Error while pushing the image")
+    if not __ensure_local_image(client, push_obj.build, final_repository_name):
+        logger.error(f"The built image of {final_repository_name} is no longer available")
+        update_push_status(push_id, push.ProcessStatus.FAILED, reason="Built image is no longer available")
+        update_build_status(push_obj.build_id, build.ProcessStatus.FAILED, reason="Built image is no longer available")
+        record_outcome("push", "image_missing")
+        return False
 
-        print(f"Image {image_name_tag} successfully pushed to {registry_url}")
-        logger.info(f"Image {image_name_tag} successfully pushed to {registry_url}")
+    digest = __get_present_image_digest(client, final_repository_name, registry)
+    if digest is not None:
+        push.objects.filter(push_id=push_id).update(already_present=True, image_loc=f"{final_repository_name}@{digest}")
+        update_push_status(push_id, push.ProcessStatus.COMPLETED)
+        record_outcome("push", "already_present")
+        logger.info(f"Image {image_name_tag} already present in {registry['url']}, skipping push")
+        return True
+
+    try:
+        with abort.track(client):
+            call_with_retries("push", lambda: __push_image(client, final_repository_name, push_auth_config),
+                              on_attempt=lambda attempt: __count_attempt(push, push_id=push_id), abort=abort)
+        logger.info(f"Image {image_name_tag} successfully pushed to {registry['url']}")
 
+    except StageAbortedError:
+        raise
     except Exception as e:
-        traceback.print_exc()
-        logger.error("Error occurred while pushing docker image to dockerhub")
-        print(f"An error occurred: {e}")
+        logger.exception(f"Error occurred while pushing {final_repository_name} to {registry['url']}: {e}")
         update_push_status(push_id, push.ProcessStatus.FAILED, reason="Failed to Push the image")
+        record_outcome("push", "push_failed")
         return False
 
     update_push_status(push_id, push.ProcessStatus.COMPLETED)
-    print(f"Push completed for build id {push_id}")
+    record_outcome("push", "success")
     logger.info(f"Push completed for build id {push_id}")
 
     return True
 
+def __push_image(client, repository_name, auth_config):
+    """
+    Pushes an image to its registry.
+
+    The push reports progress events many times per second, so they are only logged every
+    LOG_SAMPLING['push_progress_interval'] seconds, with the number of events since the last logged one.
+
+    Parameters:
+    - client: Docker client.
+    - repository_name: Repository name and tag of the image.
+    - auth_config: Credentials of the registry, or None to push without logging in.
+
+    Raises:
+    - PushError: If the daemon reports an error in the push output.
+    """
+    layer_sizes = dict()
+    progress_log = RateLimiter(settings.LOG_SAMPLING['push_progress_interval'])
+    for line in client.images.push(repository=repository_name, stream=True, auth_config=auth_config, decode=True):
+        if 'errorDetail' in line:
+            raise PushError(line['errorDetail'].get('message', "Error while pushing the image"))
+        __count_pushed_bytes(line, layer_sizes)
+        events = progress_log.sample()
+        if events:
+            logger.info(f"Push progress of {repository_name}: {line}", extra={'progress_events': events})
+
+def __ensure_local_image(client, build_obj, repository_name):
+    """
+    Makes sure the repository name of a push points to the image recorded by the build.
+
+    Builds without a recorded image ID are pushed by their repository name as they are.
+
+    Parameters:
+    - client: Docker client.
+    - build_obj: Build of the push, or None.
+    - repository_name: Repository name and tag the image is pushed as.
+
+    Returns:
+    - bool: False if the built image is no longer present locally.
+    """
+    image_id = build_obj.image_id if build_obj is not None else ''
+    if not image_id:
+        return True
+
+    try:
+        if client.images.get(repository_name).id == image_id:
+            return True
+    except docker.errors.ImageNotFound:
+        pass
+
+    try:
+        client.images.get(image_id)
+    except docker.errors.ImageNotFound:
+        return False
+
+    repository, tag = parse_repository_tag(repository_name)
+    client.api.tag(image_id, repository, tag)
+    return True
+
+def __count_pushed_bytes(line, layer_sizes):
+    """
+    Adds the size of a layer to the pushed bytes metric once the push progress reports it as pushed.
+
+    Parameters:
+    - line: Decoded progress event of the push.
+    - layer_sizes: Dictionary of the largest size seen so far for every layer id of the push.
+    """
+    if not isinstance(line, dict) or line.get('id') is None:
+        return
+
+    layer_id = line['id']
+
+    total = (line.get('progressDetail') or {}).get('total')
+    if total:
+        layer_sizes[layer_id] = max(layer_sizes.get(layer_id, 0), total)
+
+    if line.get('status') == 'Pushed':
+        PUSHED_BYTES.inc(layer_sizes.pop(layer_id, 0))
+
+def __get_present_image_digest(client, repository_name, registry):
+    """
+    Checks if the local image is already present in the registry under the same repository name and tag.
+
+    The ID of the local image is compared with the config digest of the manifest in the registry.
+    Any error during the check is logged and treated as not present, so the image is pushed.
+
+    Parameters:
+    - client: Docker client.
+    - repository_name: Repository name and tag of the image.
+    - registry: Registry of the image, as returned by get_registry.
+
+    Returns:
+    - str: The digest of the image if it is already present, otherwise None.
+    """
+    try:
+        local_image = client.images.get(repository_name)
+        remote_digest = get_remote_config_digest(registry['api_url'], registry['remote_name'], registry['username'], registry['password'])
+    except Exception as e:
+        logger.warning(f"Could not compare {repository_name} with the registry: {e}")
+        return None
+
+    if remote_digest is not None and remote_digest == local_image.id:
+        return remote_digest
+    return None
+
+# Statuses a build or push may move to a status from, in the order they are tried. Any other change is refused,
+# so e.g. a task delivered twice can not move a completed push back to in progress.
+STATUS_TRANSITIONS = {
+    build.ProcessStatus.IN_PROGRESS: [build.ProcessStatus.PENDING, build.ProcessStatus.FAILED, build.ProcessStatus.IN_PROGRESS],
+    build.ProcessStatus.COMPLETED: [build.ProcessStatus.IN_PROGRESS],
+    build.ProcessStatus.FAILED: [build.ProcessStatus.IN_PROGRESS, build.ProcessStatus.PENDING, build.ProcessStatus.FAILED,
+                                 build.ProcessStatus.COMPLETED],
+    build.ProcessStatus.CANCELLED: [build.ProcessStatus.PENDING, build.ProcessStatus.IN_PROGRESS],
+}
+
+BUILD_FIELDS = ('file_name', 'file_loc', 'image_name', 'image_tag', 'dockerfile_path', 'builder_host', 'dockerfile_summary', 'timeout')
+PUSH_FIELDS = ('image_name', 'image_tag', 'repository_name', 'timeout', 'build__builder_host', 'build__image_id')
+
 @transaction.atomic
-def update_build_status(build_id, status, reason=""):
-    build_obj = build.objects.get(build_id=build_id)
-    build_obj.status = status
-    build_obj.failed_reason = reason
-    build_obj.save()
-    return build_obj
+def update_build_status(build_id, status, reason="", fields=()):
+    """
+    Moves a build to a new status and records the transition.
+
+    The status is written with a conditional UPDATE on the previous status instead of reading and saving the whole row,
+    so the write takes the database lock at once and concurrent workers never overwrite each other's status.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    - status: New status of the build.
+    - reason: Reason of a failure.
+    - fields: Fields of the build to load and return after the update.
+
+    Returns:
+    - build: The build with only the given fields loaded, None if no fields were given or the status change was refused.
+    """
+    previous_status = __compare_and_set_status(build, build_id, status, reason)
+    if previous_status is None:
+        logger.warning(f"Build {build_id} can not move to {status}, skipping the status change")
+        return None
+
+    status_transition.objects.create(build_id=build_id, stage=status_transition.Stage.BUILD, from_status=previous_status,
+                                     to_status=status, reason=reason, created_at=timezone.now())
+    transaction.on_commit(lambda: __status_changed(build_id, "build", status, reason))
+    return build.objects.only(*fields).get(build_id=build_id) if fields else None
 
 @transaction.atomic
-def update_push_status(push_id, status, reason=""):
-    push_obj = push.objects.get(push_id=push_id)
-    push_obj.status = status
-    push_obj.failed_reason = reason
-    push_obj.save()
+def update_push_status(push_id, status, reason="", fields=()):
+    """
+    Moves a push to a new status and records the transition, like update_build_status.
+
+    Parameters:
+    - push_id: Unique identifier for the push process.
+    - status: New status of the push.
+    - reason: Reason of a failure.
+    - fields: Fields of the push, or of its build through build__, to load and return after the update.
+
+    Returns:
+    - push: The push with only the given fields and its build_id loaded, None if the status change was refused.
+    """
+    previous_status = __compare_and_set_status(push, push_id, status, reason)
+    if previous_status is None:
+        logger.warning(f"Push {push_id} can not move to {status}, skipping the status change")
+        return None
+
+    queryset = push.objects.only('build_id', *fields)
+    if any(field.startswith('build__') for field in fields):
+        queryset = queryset.select_related('build')
+    push_obj = queryset.get(push_id=push_id)
+
+    status_transition.objects.create(build_id=push_obj.build_id, push_id=push_id, stage=status_transition.Stage.PUSH,
+                                     from_status=previous_status, to_status=status, reason=reason, created_at=timezone.now())
+    transaction.on_commit(lambda: __status_changed(push_obj.build_id, "push", status, reason))
     return push_obj
 
-def remove_task_metadata(docker_image_tag, dockerfile_dir):
+def __status_changed(build_id, stage, status, reason):
+    """
+    Refreshes the cached status of a build and notifies the waiting clients once a status transition is committed.
+    """
+    # Imported here, since the status data of a build depends on the repository names defined in this module
+    from .status_data_service import refresh_status_cache
+
+    refresh_status_cache(build_id)
+    publish_status_change(build_id, stage, status, reason)
+
+def __compare_and_set_status(model, pk, status, reason):
+    """
+    Writes the new status of a build or push with one conditional UPDATE for every status it may move from, until
+    one of them applies. The status is never read first, so the first UPDATE takes the write lock of SQLite and
+    waits for other writers within the busy timeout, and the status which matched is the previous status.
+
+    Returns:
+    - str: The previous status, or None if the entry does not exist or can not move to the new status.
+    """
+    now = timezone.now()
+    values = {'status': status, 'failed_reason': reason}
+    if status == build.ProcessStatus.IN_PROGRESS:
+        values.update(started_at=now, finished_at=None)
+    elif status in (build.ProcessStatus.COMPLETED, build.ProcessStatus.FAILED, build.ProcessStatus.CANCELLED):
+        values['finished_at'] = now
+
+    for previous_status in STATUS_TRANSITIONS.get(status, []):
+        if model.objects.filter(pk=pk, status=previous_status).update(**values):
+            return previous_status
+    return None
+
+def remove_task_metadata(docker_image_tag, dockerfile_dir, builder_host=''):
     """
     Removes metadata related to a completed Docker build and push task.
 
-    This function removes the Docker image with the provided image tag and deletes the folder containing the Dockerfile.
+    This function deletes the folder containing the Dockerfile. The Docker image is kept, so later builds can
+    reuse its layers, and least recently used images are only removed once the images exceed the disk budget.
 
     Parameters:
-    - docker_image_tag: Tag of the Docker image to be removed.
+    - docker_image_tag: Tag of the pushed Docker image.
     - dockerfile_dir: Path to the folder containing the Dockerfile.
+    - builder_host: URL of the Docker daemon the image was built on.
 
     Returns:
     - bool: True if the removal process is successful.
     """    
-    __delete_docker_image(docker_image_tag)
+    try:
+        enforce_image_budget(builder_host)
+    except Exception as e:
+        logger.error(f"Error while enforcing the image disk budget after pushing {docker_image_tag}: {e}")
     __delete_files_in_folder(dockerfile_dir)
     return True
 
-def __delete_docker_image(image_tag):
-    """
-    Deletes a Docker image with the specified image tag.
-
-    This function uses the Docker API to remove a Docker image forcefully.
-
-    Parameters:
-    - image_tag: Tag of the Docker image to be removed.
-    """    
-    client = docker.from_env()
-    
-    try:
-        image = client.images.get(image_tag)
-        image.remove(force=True)
-        print(f"Image {image_tag} successfully removed.")
-    except docker.errors.ImageNotFound:
-        print(f"Image {image_tag} not found.")
-    except docker.errors.APIError as e:
-        print(f"Error: {e}")
-
 def __delete_files_in_folder(folder_path):
     """
     Deletes all files in a specified folder and then removes the folder itself.
@@ -229,8 +992,8 @@ def __delete_files_in_folder(folder_path):
             file_path = os.path.join(folder_path, filename)
             if os.path.isfile(file_path):
                 os.remove(file_path)
-                print(f"File {file_path} successfully deleted.")
+                logger.debug(f"File {file_path} successfully deleted.")
         shutil.rmtree(folder_path)
-        print(f"Folder {folder_path} successfully deleted.")
+        logger.debug(f"Folder {folder_path} successfully deleted.")
     except OSError as e:
-        print(f"Error: {e}")
\ No newline at end of file
+        logger.error(f"Failed to delete the folder {folder_path}: {e}")
\ No newline at end of file
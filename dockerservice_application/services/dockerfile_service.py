@@ -0,0 +1,381 @@
+from .errors import DockerfileError
+import json
+import os
+import re
+import shlex
+import tarfile
+
+# Dockerfiles larger than this are rejected before parsing
+MAX_DOCKERFILE_SIZE = 1024 * 1024
+
+INSTRUCTIONS = {'ADD', 'ARG', 'CMD', 'COPY', 'ENTRYPOINT', 'ENV', 'EXPOSE', 'FROM', 'HEALTHCHECK', 'LABEL',
+                'MAINTAINER', 'ONBUILD', 'RUN', 'SHELL', 'STOPSIGNAL', 'USER', 'VOLUME', 'WORKDIR'}
+
+# Build arguments set by the builder for every build, which may be used in FROM without being declared
+PLATFORM_ARGS = {'BUILDPLATFORM', 'BUILDOS', 'BUILDARCH', 'BUILDVARIANT',
+                 'TARGETPLATFORM', 'TARGETOS', 'TARGETARCH', 'TARGETVARIANT'}
+
+DIRECTIVE_PATTERN = re.compile(r"^#\s*([A-Za-z]+)\s*=\s*(.*?)\s*$")
+INSTRUCTION_PATTERN = re.compile(r"^\s*([A-Za-z]+)(?:\s+(.*))?$", re.DOTALL)
+HEREDOC_PATTERN = re.compile(r"<<(-?)([\"']?)([A-Za-z_][A-Za-z0-9_]*)\2")
+VARIABLE_PATTERN = re.compile(r"\$(?:\{([A-Za-z_][A-Za-z0-9_]*)(?::?([-+])([^}]*))?\}|([A-Za-z_][A-Za-z0-9_]*))")
+STAGE_NAME_PATTERN = re.compile(r"^[A-Za-z][A-Za-z0-9_.-]*$")
+EXPOSE_PATTERN = re.compile(r"^(?:\$.+|[0-9]+(?:-[0-9]+)?(?:/(?:tcp|udp|sctp))?)$", re.IGNORECASE)
+REFERENCE_PATTERN = re.compile(
+    r"^(?:[A-Za-z0-9](?:[A-Za-z0-9.-]*[A-Za-z0-9])?(?::[0-9]+)?/)?"
+    r"[a-z0-9]+(?:(?:[._]|__|-+)[a-z0-9]+)*(?:/[a-z0-9]+(?:(?:[._]|__|-+)[a-z0-9]+)*)*"
+    r"(?::[A-Za-z0-9_][A-Za-z0-9_.-]{0,127})?(?:@[A-Za-z0-9_+.-]+:[A-Fa-f0-9]{32,})?$")
+
+def read_dockerfile(file, dockerfile_path=''):
+    """
+    Reads the Dockerfile of an upload, which is either the Dockerfile itself or a tar build context containing it.
+
+    The upload is rewound afterwards, so it can still be hashed and saved.
+
+    Parameters:
+    - file: Uploaded Dockerfile or build context archive.
+    - dockerfile_path: Path of the Dockerfile inside the build context archive, empty for a plain Dockerfile.
+
+    Returns:
+    - str: Content of the Dockerfile.
+
+    Raises:
+    - DockerfileError: If the archive is invalid, the Dockerfile is missing, too large or not UTF-8 text.
+    """
+    try:
+        if not dockerfile_path:
+            content = file.read(MAX_DOCKERFILE_SIZE + 1)
+        else:
+            content = __read_archive_member(file, dockerfile_path)
+    finally:
+        file.seek(0)
+
+    if len(content) > MAX_DOCKERFILE_SIZE:
+        raise DockerfileError(f"Dockerfile is larger than {MAX_DOCKERFILE_SIZE} bytes")
+
+    try:
+        return content.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise DockerfileError("Dockerfile is not UTF-8 text")
+
+def __read_archive_member(file, dockerfile_path):
+    path = os.path.normpath(dockerfile_path)
+    try:
+        with tarfile.open(fileobj=file, mode='r|*') as archive:
+            for member in archive:
+                if member.isfile() and os.path.normpath(member.name) == path:
+                    return archive.extractfile(member).read(MAX_DOCKERFILE_SIZE + 1)
+    except (tarfile.TarError, EOFError, OSError) as e:
+        raise DockerfileError(f"Build context is not a valid tar archive: {e}")
+
+    raise DockerfileError(f"Dockerfile {dockerfile_path} not found in the build context")
+
+def parse_dockerfile(content):
+    """
+    Parses a Dockerfile and summarizes its stages and base images.
+
+    Unknown instructions, instructions with missing or malformed arguments, invalid stage names and base
+    image references, and references to unknown stages are rejected, like the Docker builder would do.
+    Build arguments declared before the first FROM are substituted with their defaults in the FROM
+    instructions, since the builds are started without build arguments.
+
+    Parameters:
+    - content: Content of the Dockerfile.
+
+    Returns:
+    - dict: Summary with the "syntax" directive, the global "args" with their defaults, the "stages" with their
+      name, base, platform and the indices of the stages they depend on, the "target" stage which is built,
+      the external "base_images" used by FROM and COPY --from, normalized with a tag, and the number of "instructions".
+
+    Raises:
+    - DockerfileError: If the Dockerfile is invalid, with the line number of the error.
+    """
+    directives, instructions = __split_instructions(content)
+
+    global_args = dict()
+    stages = []
+    base_images = []
+
+    for line_number, keyword, arguments in instructions:
+        if keyword == 'FROM':
+            stage = __parse_from(line_number, arguments, global_args, stages)
+            stages.append(stage)
+            if stage['depends_on'] == [] and stage['base'] != 'scratch':
+                base_images.append(__normalize_reference(stage['base']))
+            continue
+
+        if not stages:
+            if keyword != 'ARG':
+                raise DockerfileError(f"line {line_number}: {keyword} instruction before the first FROM")
+            global_args.update(__parse_arg(line_number, arguments))
+            continue
+
+        __validate_instruction(line_number, keyword, arguments)
+
+        for source in __stage_sources(keyword, arguments):
+            index = __find_stage(source, stages)
+            if index is not None:
+                if index not in stages[-1]['depends_on']:
+                    stages[-1]['depends_on'].append(index)
+            elif source.isdigit():
+                raise DockerfileError(f"line {line_number}: stage {source} does not exist yet")
+            else:
+                __validate_reference(line_number, source)
+                base_images.append(__normalize_reference(source))
+
+    if not stages:
+        raise DockerfileError("Dockerfile has no FROM instruction")
+
+    return {
+        "syntax": directives.get('syntax'),
+        "args": global_args,
+        "stages": stages,
+        "target": stages[-1]['name'] or str(len(stages) - 1),
+        "base_images": list(dict.fromkeys(base_images)),
+        "instructions": len(instructions),
+    }
+
+def __split_instructions(content):
+    """
+    Splits a Dockerfile into its parser directives and its instructions.
+
+    Comments and empty lines are removed, lines ending with the escape character are joined with the next
+    line, and the heredocs of RUN, COPY and ADD are skipped.
+
+    Returns:
+    - Tuple: dict of the parser directives, and a list of (line number, upper case keyword, arguments) tuples.
+    """
+    lines = content.splitlines()
+    directives = dict()
+    escape = '\\'
+    index = 0
+
+    # Parser directives are only recognized at the very top of the file
+    while index < len(lines):
+        match = DIRECTIVE_PATTERN.match(lines[index].strip())
+        if match is None or match.group(1).lower() in directives:
+            break
+        directives[match.group(1).lower()] = match.group(2)
+        index += 1
+
+    if 'escape' in directives:
+        if directives['escape'] not in ('\\', '`'):
+            raise DockerfileError(f"invalid escape token '{directives['escape']}', it must be \\ or `")
+        escape = directives['escape']
+
+    instructions = []
+    while index < len(lines):
+        line_number = index + 1
+        line = lines[index]
+        index += 1
+
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+
+        parts = []
+        while True:
+            stripped = line.rstrip()
+            if not stripped.endswith(escape):
+                parts.append(line)
+                break
+            parts.append(stripped[:-1])
+            # Comments and empty lines within a continued instruction are ignored
+            while index < len(lines) and (not lines[index].strip() or lines[index].lstrip().startswith('#')):
+                index += 1
+            if index >= len(lines):
+                break
+            line = lines[index]
+            index += 1
+
+        text = " ".join(part.strip() for part in parts)
+        match = INSTRUCTION_PATTERN.match(text)
+        if match is None:
+            raise DockerfileError(f"line {line_number}: unknown instruction: {text.split()[0]}")
+
+        keyword = match.group(1).upper()
+        arguments = (match.group(2) or "").strip()
+        if keyword not in INSTRUCTIONS:
+            raise DockerfileError(f"line {line_number}: unknown instruction: {match.group(1)}")
+
+        if keyword in ('RUN', 'COPY', 'ADD'):
+            index = __skip_heredocs(lines, index, line_number, arguments)
+
+        instructions.append((line_number, keyword, arguments))
+
+    return directives, instructions
+
+def __skip_heredocs(lines, index, line_number, arguments):
+    """
+    Returns the index of the line after the heredocs started by an instruction.
+    """
+    for strip_tabs, _, delimiter in HEREDOC_PATTERN.findall(arguments):
+        while True:
+            if index >= len(lines):
+                raise DockerfileError(f"line {line_number}: heredoc {delimiter} is not terminated")
+            line = lines[index].lstrip('\t') if strip_tabs else lines[index]
+            index += 1
+            if line.rstrip('\r') == delimiter:
+                break
+    return index
+
+def __parse_from(line_number, arguments, global_args, stages):
+    """
+    Parses a FROM instruction into a stage.
+    """
+    tokens = arguments.split()
+    platform = None
+    while tokens and tokens[0].startswith('--'):
+        flag = tokens.pop(0)
+        if not flag.startswith('--platform='):
+            raise DockerfileError(f"line {line_number}: unknown flag {flag.split('=')[0]} in FROM")
+        platform = __substitute(flag[len('--platform='):], global_args, PLATFORM_ARGS) or None
+
+    if len(tokens) == 3 and tokens[1].upper() == 'AS':
+        name = tokens[2]
+        if not STAGE_NAME_PATTERN.match(name):
+            raise DockerfileError(f"line {line_number}: invalid stage name {name}")
+        if __find_stage(name, stages) is not None:
+            raise DockerfileError(f"line {line_number}: duplicate stage name {name}")
+    elif len(tokens) == 1:
+        name = None
+    else:
+        raise DockerfileError(f"line {line_number}: FROM requires an image and an optional AS <name>")
+
+    base = __substitute(tokens[0], global_args)
+    if not base:
+        raise DockerfileError(f"line {line_number}: base image name {tokens[0]} is empty")
+
+    index = __find_stage(base, stages)
+    if index is None and base.lower() != 'scratch':
+        __validate_reference(line_number, base)
+
+    return {"name": name, "base": base, "platform": platform, "depends_on": [] if index is None else [index]}
+
+def __parse_arg(line_number, arguments):
+    """
+    Parses an ARG instruction into a dict of the declared build arguments and their default values. Quoted
+    default values may contain whitespace, e.g. ARG NAME="a b".
+    """
+    try:
+        tokens = shlex.split(arguments)
+    except ValueError as e:
+        raise DockerfileError(f"line {line_number}: invalid ARG instruction: {e}")
+
+    declared = dict()
+    for token in tokens:
+        name, separator, default = token.partition('=')
+        if not re.match(r"^[A-Za-z_][A-Za-z0-9_]*$", name):
+            raise DockerfileError(f"line {line_number}: invalid build argument name {name}")
+        declared[name] = default if separator else None
+
+    if not declared:
+        raise DockerfileError(f"line {line_number}: ARG requires at least one argument")
+    return declared
+
+def __validate_instruction(line_number, keyword, arguments):
+    """
+    Validates the arguments of an instruction of a stage.
+    """
+    if not arguments:
+        raise DockerfileError(f"line {line_number}: {keyword} requires at least one argument")
+
+    if keyword == 'ARG':
+        __parse_arg(line_number, arguments)
+    elif keyword == 'SHELL':
+        if not __is_json_array(arguments):
+            raise DockerfileError(f"line {line_number}: SHELL requires the arguments to be in JSON form")
+    elif keyword in ('COPY', 'ADD'):
+        paths = json.loads(arguments) if __is_json_array(arguments) else [token for token in arguments.split() if not token.startswith('--')]
+        if len(paths) < 2:
+            raise DockerfileError(f"line {line_number}: {keyword} requires at least two arguments, a source and a destination")
+    elif keyword == 'ENV' or keyword == 'LABEL':
+        first = arguments.split()[0]
+        if '=' not in first and len(arguments.split()) < 2:
+            raise DockerfileError(f"line {line_number}: {keyword} requires a value for {first}")
+    elif keyword == 'EXPOSE':
+        for port in arguments.split():
+            if not EXPOSE_PATTERN.match(port):
+                raise DockerfileError(f"line {line_number}: invalid port {port}")
+    elif keyword == 'HEALTHCHECK':
+        tokens = [token for token in arguments.split() if not token.startswith('--')]
+        if not tokens or tokens[0].upper() not in ('NONE', 'CMD'):
+            raise DockerfileError(f"line {line_number}: HEALTHCHECK requires NONE or CMD")
+        if tokens[0].upper() == 'CMD' and len(tokens) < 2:
+            raise DockerfileError(f"line {line_number}: HEALTHCHECK CMD requires a command")
+    elif keyword == 'ONBUILD':
+        trigger, _, trigger_arguments = arguments.partition(' ')
+        trigger = trigger.upper()
+        if trigger not in INSTRUCTIONS:
+            raise DockerfileError(f"line {line_number}: unknown instruction in ONBUILD: {trigger}")
+        if trigger in ('ONBUILD', 'FROM', 'MAINTAINER'):
+            raise DockerfileError(f"line {line_number}: {trigger} is not allowed in ONBUILD")
+        __validate_instruction(line_number, trigger, trigger_arguments.strip())
+
+def __stage_sources(keyword, arguments):
+    """
+    Returns the stages or images an instruction copies from, with COPY --from or RUN --mount=from=.
+    """
+    sources = []
+    for token in arguments.split():
+        if not token.startswith('--'):
+            break
+        if keyword == 'COPY' and token.startswith('--from='):
+            sources.append(token[len('--from='):])
+        elif keyword == 'RUN' and token.startswith('--mount='):
+            options = dict(option.partition('=')[::2] for option in token[len('--mount='):].split(','))
+            if options.get('from'):
+                sources.append(options['from'])
+    return sources
+
+def __find_stage(reference, stages):
+    """
+    Returns the index of the stage a reference names, by name or by index, or None.
+    """
+    if reference.isdigit():
+        index = int(reference)
+        return index if index < len(stages) else None
+
+    for index, stage in enumerate(stages):
+        if stage['name'] is not None and stage['name'].lower() == reference.lower():
+            return index
+    return None
+
+def __substitute(value, variables, allowed=frozenset()):
+    """
+    Substitutes the build arguments in a value with their defaults, supporting ${NAME:-default} and ${NAME:+alternative}.
+
+    Undeclared build arguments and build arguments without default are empty, except the allowed ones, which
+    are kept as they are.
+    """
+    def replace(match):
+        name = match.group(1) or match.group(4)
+        if name in allowed and variables.get(name) is None:
+            return match.group(0)
+        current = variables.get(name) or ''
+        if match.group(2) == '-':
+            return current or match.group(3)
+        if match.group(2) == '+':
+            return match.group(3) if current else ''
+        return current
+
+    return VARIABLE_PATTERN.sub(replace, value)
+
+def __validate_reference(line_number, reference):
+    if not REFERENCE_PATTERN.match(reference):
+        raise DockerfileError(f"line {line_number}: invalid image reference {reference}")
+
+def __normalize_reference(reference):
+    """
+    Adds the latest tag to an image reference without tag or digest.
+    """
+    name = reference.split('@', 1)[0]
+    if '@' in reference or ':' in name.rsplit('/', 1)[-1]:
+        return reference
+    return reference + ':latest'
+
+def __is_json_array(arguments):
+    try:
+        value = json.loads(arguments)
+    except ValueError:
+        return False
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
@@ -0,0 +1,30 @@
+class BuildError(Exception):
+    """
+    Raised when the Docker daemon reports an error in the build output.
+    """
+
+class PushError(Exception):
+    """
+    Raised when the Docker daemon reports an error in the push output.
+    """
+
+class BuilderUnavailableError(Exception):
+    """
+    Raised when no Docker daemon of the builder fleet is available for a build.
+    """
+
+class DockerfileError(Exception):
+    """
+    Raised when an uploaded Dockerfile is invalid.
+    """
+
+class StageAbortedError(Exception):
+    """
+    Raised when a build or push is aborted because it was cancelled or its timeout expired.
+
+    The reason is "cancelled" or "timeout".
+    """
+
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
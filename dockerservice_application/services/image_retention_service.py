@@ -0,0 +1,82 @@
+from ..models import push, retained_image
+from .docker_client_service import get_docker_client
+from .redis_service import redis_lock
+from django.conf import settings
+from django.utils import timezone
+import docker
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+def touch_image(repository_name, image_name, image_tag, builder_host=''):
+    """
+    Marks an image as recently used, so it is evicted after all images used before it.
+
+    Parameters:
+    - repository_name: Repository name and tag of the image in the Docker daemon.
+    - image_name: Name of the image.
+    - image_tag: Tag of the image.
+    - builder_host: URL of the Docker daemon holding the image, empty for the daemon configured in the environment.
+    """
+    retained_image.objects.update_or_create(
+        builder_host=builder_host, repository_name=repository_name,
+        defaults={'image_name': image_name, 'image_tag': image_tag, 'last_used_at': timezone.now()})
+
+def enforce_image_budget(builder_host=''):
+    """
+    Removes least recently used images until the image layers of a Docker daemon fit in the disk budget.
+
+    The disk usage is the size of all image layers reported by the daemon, so layers shared by several
+    images are only counted once. Images whose push is pending, in progress or failed, and can still be
+    retried, are never evicted.
+
+    Parameters:
+    - builder_host: URL of the Docker daemon, empty for the daemon configured in the environment.
+
+    Returns:
+    - list: Repository names of the evicted images.
+    """
+    budget = settings.IMAGE_RETENTION['disk_budget']
+    client = get_docker_client(builder_host)
+    evicted = []
+
+    with redis_lock(f"image-retention:{builder_host}", timeout=600, blocking_timeout=None):
+        used = client.df().get('LayersSize') or 0
+        if used <= budget:
+            return evicted
+
+        protected = __protected_images(builder_host)
+
+        for image in retained_image.objects.filter(builder_host=builder_host).order_by('last_used_at').iterator():
+            if used <= budget:
+                break
+            if (image.image_name, image.image_tag) in protected:
+                continue
+
+            try:
+                # Remove every tag of the image, so images pushed to several targets are deleted too
+                for tag in client.images.get(image.repository_name).tags or [image.repository_name]:
+                    client.images.remove(tag)
+            except docker.errors.ImageNotFound:
+                pass
+            except docker.errors.APIError as e:
+                logger.warning(f"Could not evict image {image.repository_name}: {e}")
+                continue
+
+            image.delete()
+            evicted.append(image.repository_name)
+            used = client.df().get('LayersSize') or 0
+
+    if evicted:
+        logger.info(f"Evicted images {evicted} from {builder_host or 'the local daemon'}, image layers now use {used} bytes")
+    return evicted
+
+def __protected_images(builder_host):
+    """
+    Returns the image name and tag of the build of every image of a Docker daemon a pending, running or retryable push still needs.
+    """
+    statuses = [push.ProcessStatus.PENDING, push.ProcessStatus.IN_PROGRESS, push.ProcessStatus.FAILED]
+    return set(push.objects
+               .filter(status__in=statuses, expiration_time__gte=timezone.now().date(), build__builder_host=builder_host)
+               .values_list('build__image_name', 'build__image_tag'))
@@ -0,0 +1,192 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueListener, RotatingFileHandler
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+# Fields of the current build or push, added to every log record made within log_context
+__context = contextvars.ContextVar('log_context', default=dict())
+
+# Attributes every log record has, all other attributes are extra fields of the record
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+@contextmanager
+def log_context(**fields):
+    """
+    Context manager which tags the log records made within it, e.g. with the build_id and push_id of a task.
+
+    The fields are kept in a context variable, so they apply to the current thread or asyncio task only.
+
+    Parameters:
+    - fields: Fields added to the log records, None values are ignored.
+    """
+    token = __context.set({**__context.get(), **{key: str(value) for key, value in fields.items() if value is not None}})
+    try:
+        yield
+    finally:
+        __context.reset(token)
+
+def get_log_context():
+    """
+    Returns the fields set with log_context in the current context.
+    """
+    return __context.get()
+
+class LogContextFilter(logging.Filter):
+    """
+    Adds the fields of log_context to the log records, unless a record sets them as extra fields already.
+
+    The filter has to run on the handler, in the thread which made the record.
+    """
+
+    def filter(self, record):
+        for key, value in get_log_context().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a log record as one line of JSON with the time, level, logger, process and message, and the extra
+    fields of the record, like the build_id and push_id added by LogContextFilter.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.process,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class BackgroundFileHandler(logging.Handler):
+    """
+    Log handler which writes the records to a rotating log file in a background thread.
+
+    A record is only put on a bounded in-memory queue in the thread which logs it, so a task is never blocked by
+    writing the log file. Records are dropped while the queue is full, and the number of dropped records is added
+    to the next record which is written.
+
+    Django-Q forks its workers, which do not inherit the thread, so the thread is started again on the first
+    record logged by another process. Every process rotates the file on its own.
+
+    Parameters:
+    - filename: Path of the log file.
+    - max_bytes: Size at which the file is rotated, 0 to never rotate it.
+    - backup_count: Number of rotated files which are kept.
+    - queue_size: Maximum number of records waiting to be written.
+    """
+
+    def __init__(self, filename, max_bytes=0, backup_count=0, queue_size=10000):
+        super().__init__()
+        self.queue = queue.Queue(queue_size)
+        self.target = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.listener = None
+        self.listener_pid = None
+        self.listener_lock = threading.Lock()
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def emit(self, record):
+        """
+        Queues a record. The message is rendered with its arguments, which may change before the record is
+        written, and the record is formatted by the file handler in the background thread.
+        """
+        try:
+            if self.listener_pid != os.getpid():
+                self.start()
+            record = copy.copy(record)
+            record.msg = record.getMessage()
+            record.args = None
+            # The number of dropped records is shared by all threads, the reentrant handler lock also guards it
+            # when emit is called without handle
+            with self.lock:
+                if self.dropped:
+                    record.dropped_records, self.dropped = self.dropped, 0
+                try:
+                    self.queue.put_nowait(record)
+                except queue.Full:
+                    self.dropped += 1 + getattr(record, 'dropped_records', 0)
+        except Exception:
+            self.handleError(record)
+
+    def start(self):
+        """
+        Starts the thread which writes the queued records, with a new queue in a forked process.
+        """
+        with self.listener_lock:
+            if self.listener_pid == os.getpid():
+                return
+            if self.listener_pid is not None:
+                self.queue = queue.Queue(self.queue_size)
+            self.listener = FlushingQueueListener(self.queue, self.target)
+            self.listener.start()
+            self.listener_pid = os.getpid()
+
+    def close(self):
+        """
+        Writes the queued records and stops the thread, called by logging.shutdown when the process exits.
+        """
+        with self.listener_lock:
+            if self.listener_pid == os.getpid():
+                try:
+                    self.listener.stop()
+                except queue.Full:
+                    # The writer is stuck, e.g. on a full disk, its records are lost
+                    pass
+            self.listener_pid = None
+        self.target.close()
+        super().close()
+
+class FlushingQueueListener(QueueListener):
+    """
+    Queue listener which waits for room in a full queue when it is stopped, so the queued records are written.
+    """
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel, timeout=5)
+
+class RateLimiter:
+    """
+    Samples a stream of frequent events, like the progress events of a push, so at most one of them is logged
+    every interval seconds.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_time = 0
+        self.events = 0
+
+    def sample(self):
+        """
+        Counts an event.
+
+        Returns:
+        - int: Number of events since the last sampled event, including this one, if this event is sampled, else 0.
+        """
+        self.events += 1
+        now = time.monotonic()
+        if now < self.next_time:
+            return 0
+        self.next_time = now + self.interval
+        events, self.events = self.events, 0
+        return events
@@ -0,0 +1,113 @@
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+from prometheus_client import CONTENT_TYPE_LATEST
+from contextlib import contextmanager
+import asyncio
+import functools
+import os
+import time
+
+QUEUE_WAIT_SECONDS = Histogram(
+    'dockerservice_queue_wait_seconds', 'Time a task waited in the queue of a pipeline stage before it started',
+    ['stage'], buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+
+STAGE_DURATION_SECONDS = Histogram(
+    'dockerservice_stage_duration_seconds', 'Duration of the build or push of an image',
+    ['stage'], buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800))
+
+STAGE_OUTCOMES = Counter(
+    'dockerservice_stage_outcomes', 'Finished builds and pushes by outcome',
+    ['stage', 'outcome'])
+
+STAGE_IN_PROGRESS = Gauge(
+    'dockerservice_stage_in_progress', 'Builds and pushes currently running',
+    ['stage'], multiprocess_mode='livesum')
+
+STAGE_RETRIES = Counter(
+    'dockerservice_stage_retries', 'Builds and pushes retried after a transient error',
+    ['stage'])
+
+PUSHED_BYTES = Counter(
+    'dockerservice_pushed_bytes', 'Bytes of image layers uploaded to the registry')
+
+REQUEST_DURATION_SECONDS = Histogram(
+    'dockerservice_request_duration_seconds', 'Latency of the API views',
+    ['view'], buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+
+GC_RECLAIMED_BYTES = Counter(
+    'dockerservice_gc_reclaimed_bytes', 'Bytes reclaimed by the garbage collector',
+    ['target'])
+
+GC_DELETED_BUILDS = Counter(
+    'dockerservice_gc_deleted_builds', 'Expired builds deleted by the garbage collector')
+
+def observe_queue_wait(stage, enqueued_at):
+    """
+    Records how long a task of a pipeline stage waited in the queue.
+
+    Parameters:
+    - stage: "prefetch", "build" or "push".
+    - enqueued_at: Unix time at which the task was enqueued, nothing is recorded if None.
+    """
+    if enqueued_at is not None:
+        QUEUE_WAIT_SECONDS.labels(stage).observe(max(time.time() - enqueued_at, 0))
+
+def record_outcome(stage, outcome):
+    """
+    Counts a finished build or push.
+
+    Parameters:
+    - stage: "prefetch", "build" or "push".
+    - outcome: "success" or a short failure category. Never a free text failure reason, to keep
+      the number of label values bounded.
+    """
+    STAGE_OUTCOMES.labels(stage, outcome).inc()
+
+@contextmanager
+def track_stage(stage):
+    """
+    Context manager which counts the stage as in progress and records its duration.
+
+    Parameters:
+    - stage: "prefetch", "build" or "push".
+    """
+    with STAGE_DURATION_SECONDS.labels(stage).time(), STAGE_IN_PROGRESS.labels(stage).track_inprogress():
+        yield
+
+def observe_request_duration(view_name):
+    """
+    Decorator recording the latency of a view.
+
+    Parameters:
+    - view_name: Name of the view used as label value.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                with REQUEST_DURATION_SECONDS.labels(view_name).time():
+                    return await view(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with REQUEST_DURATION_SECONDS.labels(view_name).time():
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def generate_metrics():
+    """
+    Renders all metrics in the Prometheus text format.
+
+    When PROMETHEUS_MULTIPROC_DIR is set, the metrics of all web server and Django-Q worker processes
+    sharing that directory are aggregated.
+
+    Returns:
+    - Tuple: The rendered metrics and their content type.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
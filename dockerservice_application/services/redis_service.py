@@ -0,0 +1,38 @@
+from django_q.brokers.redis_broker import Redis
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+__connection = None
+
+def get_redis_connection():
+    """
+    Returns the Redis connection shared with the django-q broker.
+
+    The connection is created lazily on first use and reused for the lifetime of the process.
+
+    Returns:
+    - redis.Redis: Connection to the Redis server configured in Q_CLUSTER.
+    """
+    global __connection
+    if __connection is None:
+        __connection = Redis.get_connection()
+    return __connection
+
+def redis_lock(name, timeout=30, blocking_timeout=10):
+    """
+    Returns a distributed lock backed by Redis.
+
+    The lock is shared by every web and worker process that talks to the same Redis server,
+    so it can be used to serialize work across processes.
+
+    Parameters:
+    - name: Name of the lock.
+    - timeout: Seconds after which the lock is released automatically.
+    - blocking_timeout: Seconds to wait while acquiring the lock.
+
+    Returns:
+    - redis.lock.Lock: Lock object usable as a context manager.
+    """
+    return get_redis_connection().lock("dockerservice:lock:" + name, timeout=timeout, blocking_timeout=blocking_timeout)
@@ -0,0 +1,76 @@
+from docker.utils import parse_repository_tag
+import re
+import requests
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_MEDIA_TYPES = [
+    "application/vnd.docker.distribution.manifest.v2+json",
+    "application/vnd.oci.image.manifest.v1+json",
+]
+
+def get_remote_config_digest(registry_api_url, repository_name, username, password, timeout=10):
+    """
+    Reads the config digest of an image tag from a registry through the Registry HTTP API V2.
+
+    The config digest of an image manifest is the ID of the image, so it equals the ID of the local
+    image exactly when the image in the registry is the same image.
+    Bearer token authentication, as used by Docker Hub, is done when the registry asks for it.
+
+    Parameters:
+    - registry_api_url: Base URL of the registry API, e.g. https://registry-1.docker.io
+    - repository_name: Repository name with tag, e.g. namespace/image:tag
+    - username: Registry username.
+    - password: Registry password.
+    - timeout: Timeout of every HTTP request in seconds.
+
+    Returns:
+    - str: The config digest, or None if the tag does not exist or is a multi-platform image.
+    """
+    repository, tag = parse_repository_tag(repository_name)
+    if "/" not in repository and "docker.io" in registry_api_url:
+        repository = "library/" + repository
+
+    url = f"{registry_api_url.rstrip('/')}/v2/{repository}/manifests/{tag or 'latest'}"
+    headers = {"Accept": ", ".join(MANIFEST_MEDIA_TYPES)}
+
+    response = requests.get(url, headers=headers, timeout=timeout)
+
+    if response.status_code == 401:
+        token = __get_bearer_token(response.headers.get("WWW-Authenticate", ""), username, password, timeout)
+        if token is not None:
+            headers["Authorization"] = f"Bearer {token}"
+        response = requests.get(url, headers=headers, auth=None if token else (username, password), timeout=timeout)
+
+    if response.status_code == 404:
+        return None
+
+    response.raise_for_status()
+    manifest = response.json()
+
+    if manifest.get("mediaType", MANIFEST_MEDIA_TYPES[0]) not in MANIFEST_MEDIA_TYPES or "config" not in manifest:
+        return None
+
+    return manifest["config"]["digest"]
+
+def __get_bearer_token(challenge, username, password, timeout):
+    """
+    Requests a bearer token for the challenge in a WWW-Authenticate header.
+
+    Returns:
+    - str: The token, or None if the registry did not ask for bearer authentication.
+    """
+    if not challenge.lower().startswith("bearer "):
+        return None
+
+    params = dict(re.findall(r'(\w+)="([^"]*)"', challenge))
+    realm = params.pop("realm", None)
+    if realm is None:
+        return None
+
+    response = requests.get(realm, params=params, auth=(username, password), timeout=timeout)
+    response.raise_for_status()
+    body = response.json()
+    return body.get("token") or body.get("access_token")
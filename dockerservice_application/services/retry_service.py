@@ -0,0 +1,93 @@
+from .metrics_service import STAGE_RETRIES
+from .errors import StageAbortedError
+from django.conf import settings
+import docker
+import random
+import re
+import requests
+import time
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Messages of errors which are worth retrying, like registry or network hiccups. Anything else, e.g. a
+# Dockerfile error or denied access, fails the same way again and is not retried.
+TRANSIENT_ERROR_PATTERN = re.compile(
+    r"timeout|timed out|connection reset|connection refused|broken pipe|unexpected EOF|"
+    r"temporarily unavailable|too many requests|toomanyrequests|internal server error|bad gateway|"
+    r"service unavailable|gateway timeout|HTTP status: 5\d\d|no such host|i/o error",
+    re.IGNORECASE)
+
+def is_transient_error(error):
+    """
+    Checks if an error of a build or push is transient, so the stage may succeed when it is retried.
+
+    Parameters:
+    - error: Exception raised by the stage.
+
+    Returns:
+    - bool: True if the stage should be retried.
+    """
+    if isinstance(error, StageAbortedError):
+        return False
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(error, docker.errors.APIError) and error.status_code is not None:
+        return error.status_code == 429 or error.status_code >= 500
+    return bool(TRANSIENT_ERROR_PATTERN.search(str(error)))
+
+def backoff_delay(stage, attempt):
+    """
+    Returns the delay before the next attempt of a stage, using exponential backoff with full jitter.
+
+    Parameters:
+    - stage: "prefetch", "build" or "push".
+    - attempt: Number of the attempt which failed, starting at 1.
+
+    Returns:
+    - float: Delay in seconds.
+    """
+    retries = settings.PIPELINE_STAGES[stage]['retries']
+    return random.uniform(0, min(retries['max_delay'], retries['base_delay'] * 2 ** (attempt - 1)))
+
+def call_with_retries(stage, func, on_attempt=None, on_retry=None, abort=None):
+    """
+    Calls a function until it succeeds, fails with an error which is not transient, or the retry budget of the stage is used up.
+
+    Parameters:
+    - stage: "prefetch", "build" or "push", selecting the retry budget in PIPELINE_STAGES.
+    - func: Function without arguments running one attempt.
+    - on_attempt: Optional function called with the attempt number before every attempt.
+    - on_retry: Optional function called with the attempt number, the error and the delay before every retry.
+    - abort: Optional StageAbort of the stage, which stops the retries and the delay before them once the stage is aborted.
+
+    Returns:
+    - The return value of func.
+
+    Raises:
+    - Exception: The error of the last attempt.
+    """
+    max_attempts = settings.PIPELINE_STAGES[stage]['retries']['max_attempts']
+    attempt = 1
+
+    while True:
+        if abort is not None:
+            abort.check()
+        if on_attempt is not None:
+            on_attempt(attempt)
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= max_attempts or not is_transient_error(e):
+                raise
+            delay = backoff_delay(stage, attempt)
+            logger.warning(f"Attempt {attempt} of the {stage} failed with a transient error, retrying in {delay:.1f}s: {e}")
+            STAGE_RETRIES.labels(stage).inc()
+            if on_retry is not None:
+                on_retry(attempt, e, delay)
+            if abort is not None:
+                abort.wait(delay)
+            else:
+                time.sleep(delay)
+            attempt += 1
@@ -0,0 +1,182 @@
+from ..models import build, push
+from .docker_service import get_push_repository_name
+from django.conf import settings
+from django.core.cache import caches
+import hashlib
+import json
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+def get_status_data(build_id):
+    """
+    Reads the build and push status of a build.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+
+    Returns:
+    - dict: build and push status, with the fail reasons of failed stages. The push status of an image with
+      several targets is the aggregate of their pushes, which are listed under "pushes".
+    """
+    build_obj = build.objects.get(build_id=build_id)
+    pushes = [(push_obj.status, push_obj.failed_reason, get_push_repository_name(push_obj))
+              for push_obj in push.objects.filter(build=build_obj)]
+
+    if not pushes:
+        raise push.DoesNotExist(f"Build {build_id} has no push")
+
+    return format_status_data(build_id, build_obj.status, build_obj.failed_reason, pushes)
+
+def format_status_data(build_id, build_status, build_failed_reason, pushes):
+    """
+    Formats the status of a build and its pushes as returned by the status endpoints.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    - build_status: Status of the build.
+    - build_failed_reason: Fail reason of the build.
+    - pushes: List of (status, failed reason, repository name) tuples of the pushes of the build.
+
+    Returns:
+    - dict: build and push status, with the fail reasons of failed stages.
+    """
+    data = dict()
+    data["build_id"] = str(build_id)
+    data["build_status"] = build_status
+
+    if build_status == build.ProcessStatus.FAILED:
+        data["Build Fail Reason"] = build_failed_reason
+
+    push_status, push_failed_reason = aggregate_push_status(pushes)
+    data["push_status"] = push_status
+
+    if push_status == push.ProcessStatus.FAILED:
+        data["Push Fail Reason"] = push_failed_reason
+
+    if len(pushes) > 1:
+        data["pushes"] = []
+        for target_status, target_failed_reason, repository_name in pushes:
+            target = {"target": repository_name, "push_status": target_status}
+            if target_status == push.ProcessStatus.FAILED:
+                target["Push Fail Reason"] = target_failed_reason
+            data["pushes"].append(target)
+
+    return data
+
+def aggregate_push_status(pushes):
+    """
+    Combines the pushes of the targets of a build into one push status.
+
+    The status is the common status if all pushes have the same status, In Progress while any push has not
+    finished, Failed if all pushes have finished and any of them failed, and Cancelled if the others completed.
+
+    Parameters:
+    - pushes: List of (status, failed reason, repository name) tuples of the pushes of a build.
+
+    Returns:
+    - Tuple: The push status and the fail reason, which names the failed targets if there are several pushes.
+    """
+    statuses = {push_status for push_status, _, _ in pushes}
+
+    if len(statuses) == 1:
+        push_status = statuses.pop()
+    elif statuses & {push.ProcessStatus.PENDING, push.ProcessStatus.IN_PROGRESS}:
+        push_status = push.ProcessStatus.IN_PROGRESS
+    elif push.ProcessStatus.FAILED in statuses:
+        push_status = push.ProcessStatus.FAILED
+    else:
+        push_status = push.ProcessStatus.CANCELLED
+
+    if len(pushes) == 1:
+        return push_status, pushes[0][1]
+
+    failed = [f"{repository_name}: {reason}" for status_, reason, repository_name in pushes
+              if status_ == push.ProcessStatus.FAILED]
+    return push_status, "; ".join(failed)
+
+def is_final_status(data):
+    """
+    Returns True if the status of a build will not change anymore without a retry.
+    """
+    final_statuses = [build.ProcessStatus.COMPLETED, build.ProcessStatus.FAILED, build.ProcessStatus.CANCELLED]
+    return data["build_status"] in [build.ProcessStatus.FAILED, build.ProcessStatus.CANCELLED] or data["push_status"] in final_statuses
+
+def get_cached_status(build_id):
+    """
+    Returns the status of a build with its ETag, from the status cache if possible.
+
+    On a cache miss the status is read from the database and cached, unless a status transition of the
+    build happened meanwhile, so a status read before the transition never replaces a newer one.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+
+    Returns:
+    - dict: "data" with the status as returned by get_status_data, and its "etag".
+    """
+    cache = caches[settings.STATUS_CACHE['alias']]
+    entry = cache.get(__status_key(build_id))
+    if entry is not None:
+        return entry
+
+    version = cache.get(__version_key(build_id))
+    return __store_status(build_id, get_status_data(build_id), version)
+
+def refresh_status_cache(build_id):
+    """
+    Invalidates the cached status of a build after a status transition and caches the new status.
+
+    Called once the transaction of the transition is committed. Errors are logged and ignored, since the
+    status endpoints fall back to the database.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    """
+    cache = caches[settings.STATUS_CACHE['alias']]
+    try:
+        version_key = __version_key(build_id)
+        cache.add(version_key, 0, timeout=settings.STATUS_CACHE['final_ttl'])
+        version = cache.incr(version_key)
+        cache.delete(__status_key(build_id))
+        __store_status(build_id, get_status_data(build_id), version)
+    except (build.DoesNotExist, push.DoesNotExist):
+        pass
+    except Exception as e:
+        logger.error(f"Failed to refresh the cached status of build {build_id}: {e}")
+
+def invalidate_status_cache(build_ids):
+    """
+    Removes the cached status of builds, e.g. once they are deleted.
+
+    Parameters:
+    - build_ids: List of build ids.
+    """
+    caches[settings.STATUS_CACHE['alias']].delete_many([__status_key(build_id) for build_id in build_ids])
+
+def status_etag(data):
+    """
+    Returns the ETag of the status of a build, a hash of its JSON representation.
+    """
+    return '"' + hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest() + '"'
+
+def __store_status(build_id, data, version):
+    """
+    Caches the status of a build if no status transition happened since version was read.
+
+    Final statuses are cached for STATUS_CACHE['final_ttl'] seconds, others for STATUS_CACHE['ttl'] seconds.
+    """
+    cache = caches[settings.STATUS_CACHE['alias']]
+    entry = {"data": data, "etag": status_etag(data)}
+
+    if cache.get(__version_key(build_id)) == version:
+        timeout = settings.STATUS_CACHE['final_ttl'] if is_final_status(data) else settings.STATUS_CACHE['ttl']
+        cache.set(__status_key(build_id), entry, timeout=timeout)
+    return entry
+
+def __status_key(build_id):
+    return f"build-status:{build_id}"
+
+def __version_key(build_id):
+    return f"build-status-version:{build_id}"
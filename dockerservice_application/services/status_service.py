@@ -0,0 +1,225 @@
+from .redis_service import get_redis_connection
+import asyncio
+import json
+import os
+import threading
+import time
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+__watchers = dict()
+__watchers_lock = threading.Lock()
+__listener_pid = None
+
+def status_channel(build_id):
+    """
+    Returns the name of the Redis channel on which status changes of a build are published.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+
+    Returns:
+    - str: Name of the channel.
+    """
+    return f"dockerservice:status:{build_id}"
+
+def publish_status_change(build_id, stage, status, reason=""):
+    """
+    Publishes a status change of the build or push stage of a build to Redis.
+
+    Failures to publish are logged and ignored, since the status is always persisted in the database
+    and waiting clients fall back to their timeout.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    - stage: Either "build" or "push".
+    - status: New status of the stage.
+    - reason: Reason for the failure, if any.
+    """
+    message = json.dumps({"build_id": str(build_id), "stage": stage, "status": status, "reason": reason})
+    try:
+        get_redis_connection().publish(status_channel(build_id), message)
+    except Exception as e:
+        logger.error(f"Failed to publish status change of build {build_id}: {e}")
+
+def subscribe_status_changes(build_id):
+    """
+    Subscribes to the status changes of a build.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+
+    Returns:
+    - redis.client.PubSub: Subscription which has to be closed by the caller.
+    """
+    pubsub = get_redis_connection().pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(status_channel(build_id))
+    return pubsub
+
+def wait_for_status_change(build_id, get_state, is_changed, timeout):
+    """
+    Blocks until the state of a build has changed or the timeout expires.
+
+    The subscription is made before the state is read, so a change published in between is never missed.
+    The state is only read again when a notification arrives.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    - get_state: Callable returning the current state of the build.
+    - is_changed: Callable which takes a state and returns True if it differs from the last seen state.
+    - timeout: Maximum number of seconds to wait.
+
+    Returns:
+    - The latest state of the build.
+    """
+    pubsub = subscribe_status_changes(build_id)
+    try:
+        deadline = time.monotonic() + timeout
+        state = get_state()
+
+        while not is_changed(state):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if pubsub.get_message(timeout=min(remaining, 1.0)) is not None:
+                state = get_state()
+
+        return state
+    finally:
+        pubsub.close()
+
+def stream_status_changes(build_id, get_state, is_final, timeout, heartbeat_interval=15):
+    """
+    Yields the state of a build every time it changes.
+
+    The current state is yielded first. The stream ends when the state is final or the timeout expires.
+    None is yielded when nothing has changed for heartbeat_interval seconds, so the caller can keep the
+    connection alive.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    - get_state: Callable returning the current state of the build.
+    - is_final: Callable which takes a state and returns True if it will not change anymore.
+    - timeout: Maximum number of seconds to stream.
+    - heartbeat_interval: Seconds of inactivity after which None is yielded.
+
+    Yields:
+    - The state of the build, or None as a heartbeat.
+    """
+    pubsub = subscribe_status_changes(build_id)
+    try:
+        deadline = time.monotonic() + timeout
+        state = get_state()
+        yield state
+        last_event = time.monotonic()
+
+        while not is_final(state) and time.monotonic() < deadline:
+            if pubsub.get_message(timeout=1.0) is not None:
+                new_state = get_state()
+                if new_state != state:
+                    state = new_state
+                    yield state
+                    last_event = time.monotonic()
+            elif time.monotonic() - last_event >= heartbeat_interval:
+                yield None
+                last_event = time.monotonic()
+    finally:
+        pubsub.close()
+
+async def async_wait_for_status_change(build_id, get_state, is_changed, timeout):
+    """
+    Waits until the state of a build has changed or the timeout expires, without blocking the event loop.
+
+    All waiting requests of a process share one Redis subscription, so a waiting request holds no thread
+    and no Redis connection. The request is registered before the state is read, so a change published
+    in between is never missed.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    - get_state: Coroutine function returning the current state of the build.
+    - is_changed: Callable which takes a state and returns True if it differs from the last seen state.
+    - timeout: Maximum number of seconds to wait.
+
+    Returns:
+    - The latest state of the build.
+    """
+    loop = asyncio.get_running_loop()
+    watcher = (loop, asyncio.Event())
+    __add_watcher(str(build_id), watcher)
+    try:
+        deadline = loop.time() + timeout
+        state = await get_state()
+
+        while not is_changed(state):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(watcher[1].wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+            watcher[1].clear()
+            state = await get_state()
+
+        return state
+    finally:
+        __remove_watcher(str(build_id), watcher)
+
+def notify_status_watchers(build_id):
+    """
+    Wakes up the requests of this process waiting in async_wait_for_status_change for a build.
+
+    Parameters:
+    - build_id: Unique identifier for the build process.
+    """
+    with __watchers_lock:
+        watchers = list(__watchers.get(str(build_id), ()))
+
+    for loop, event in watchers:
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            # The event loop of the request has been closed
+            pass
+
+def __add_watcher(build_id, watcher):
+    global __listener_pid
+
+    with __watchers_lock:
+        __watchers.setdefault(build_id, set()).add(watcher)
+        start_listener = __listener_pid != os.getpid()
+        __listener_pid = os.getpid()
+
+    if start_listener:
+        threading.Thread(target=__listen_status_changes, name="status-listener", daemon=True).start()
+
+def __remove_watcher(build_id, watcher):
+    with __watchers_lock:
+        watchers = __watchers.get(build_id)
+        if watchers is not None:
+            watchers.discard(watcher)
+            if not watchers:
+                del __watchers[build_id]
+
+def __listen_status_changes():
+    """
+    Subscribes to the status changes of all builds and wakes up the waiting requests of this process.
+
+    Runs in a daemon thread for the lifetime of the process and resubscribes after connection errors.
+    """
+    prefix = status_channel("")
+
+    while True:
+        try:
+            pubsub = get_redis_connection().pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(prefix + "*")
+            for message in pubsub.listen():
+                channel = message['channel']
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+                notify_status_watchers(channel[len(prefix):])
+        except Exception as e:
+            logger.error(f"Status change subscription failed, resubscribing: {e}")
+            time.sleep(1)
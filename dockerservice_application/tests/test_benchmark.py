@@ -0,0 +1,139 @@
+from django.test import TestCase, override_settings
+from unittest.mock import MagicMock, patch
+import os
+import tempfile
+
+from ..benchmark.fakes import FakeDockerEngine, FakeRegistry
+from ..benchmark.harness import percentile, summarize
+from ..management.commands.benchmark import check_thresholds
+from ..services.docker_client_service import reset_docker_client
+from ..services.docker_service import docker_build_push, docker_push_stage, pull_base_image
+from ..models import build, push
+
+
+@override_settings(BUILD_LOG_DIR=tempfile.mkdtemp(), DOCKER_BUILD={'builder': 'classic'})
+@patch('dockerservice_application.services.docker_service.publish_status_change', MagicMock())
+@patch('dockerservice_application.services.image_retention_service.redis_lock', MagicMock())
+@patch('dockerservice_application.services.docker_service.async_task')
+class FakeDockerEngineTest(TestCase):
+    """
+    Runs the real build and push stages against the fake Docker daemon and registry of the benchmark.
+    """
+    def setUp(self):
+        self.registry = FakeRegistry()
+        self.registry.start()
+        self.engine = FakeDockerEngine(self.registry)
+        self.engine.start()
+
+        environment = patch.dict(os.environ, {'DOCKER_HOST': self.engine.url})
+        environment.start()
+        self.addCleanup(environment.stop)
+        registry_api_url = patch('dockerservice_application.services.docker_service.registry_api_url', self.registry.url)
+        registry_api_url.start()
+        self.addCleanup(registry_api_url.stop)
+        reset_docker_client()
+
+    def tearDown(self):
+        reset_docker_client()
+        self.engine.stop()
+        self.registry.stop()
+
+    def create_build(self):
+        file_loc = tempfile.mkdtemp() + "/"
+        with open(os.path.join(file_loc, "Dockerfile"), "w") as dockerfile:
+            dockerfile.write("FROM busybox:latest\n")
+        build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest", file_name="Dockerfile",
+                                         file_loc=file_loc)
+        push_obj = push.objects.create(build=build_obj, image_name="my_busy_box_image", image_tag="latest")
+        return str(build_obj.build_id), str(push_obj.push_id)
+
+    def test_build_and_push(self, mock_async_task):
+        build_id, push_id = self.create_build()
+
+        docker_build_push(build_id, push_id)
+        self.assertEqual(build.objects.get(build_id=build_id).status, build.ProcessStatus.COMPLETED)
+        mock_async_task.assert_called_once()
+
+        docker_push_stage(build_id, push_id)
+        push_obj = push.objects.get(push_id=push_id)
+        self.assertEqual(push_obj.status, push.ProcessStatus.COMPLETED)
+        self.assertFalse(push_obj.already_present)
+        self.assertIsNotNone(self.registry.get_manifest("my_busy_box_image", "latest"))
+
+        # The same image is found in the registry and not pushed again
+        build_id, push_id = self.create_build()
+        docker_build_push(build_id, push_id)
+        docker_push_stage(build_id, push_id)
+        self.assertTrue(push.objects.get(push_id=push_id).already_present)
+
+    @patch('dockerservice_application.services.docker_service.namespace', None)
+    def test_build_and_push_targets(self, mock_async_task):
+        build_id, push_id = self.create_build()
+        push.objects.create(build_id=build_id, image_name="my_busy_box_image", image_tag="1.4",
+                            repository_name="my_busy_box_image:1.4")
+
+        docker_build_push(build_id, push_id)
+        self.assertEqual(self.engine.get_image("my_busy_box_image:1.4"), self.engine.get_image("my_busy_box_image:latest"))
+
+        push_ids = mock_async_task.call_args.args[2:]
+        self.assertEqual(len(push_ids), 2)
+        docker_push_stage(build_id, *push_ids)
+
+        self.assertFalse(push.objects.filter(build_id=build_id).exclude(status=push.ProcessStatus.COMPLETED).exists())
+        self.assertIsNotNone(self.registry.get_manifest("my_busy_box_image", "1.4"))
+        self.assertIsNotNone(self.registry.get_manifest("my_busy_box_image", "latest"))
+        self.assertFalse(os.path.exists(build.objects.get(build_id=build_id).file_loc))
+
+    @patch('dockerservice_application.services.docker_service.redis_lock')
+    def test_pull_base_image(self, mock_redis_lock, mock_async_task):
+        self.assertTrue(pull_base_image("busybox:1.36"))
+        self.assertIsNotNone(self.engine.get_image("busybox:1.36"))
+        self.assertFalse(pull_base_image("busybox:1.36"))
+
+    def test_build_failure(self, mock_async_task):
+        self.engine.build_failure_rate = 1.0
+        build_id, push_id = self.create_build()
+
+        docker_build_push(build_id, push_id)
+
+        build_obj = build.objects.get(build_id=build_id)
+        self.assertEqual(build_obj.status, build.ProcessStatus.FAILED)
+        self.assertEqual(build_obj.failed_reason, "fake build failure")
+        self.assertEqual(push.objects.get(push_id=push_id).status, push.ProcessStatus.FAILED)
+        mock_async_task.assert_not_called()
+
+    def test_push_failure(self, mock_async_task):
+        self.engine.push_failure_rate = 1.0
+        build_id, push_id = self.create_build()
+
+        docker_build_push(build_id, push_id)
+        docker_push_stage(build_id, push_id)
+
+        self.assertEqual(push.objects.get(push_id=push_id).status, push.ProcessStatus.FAILED)
+        self.assertIsNone(self.registry.get_manifest("my_busy_box_image", "latest"))
+
+
+class BenchmarkReportTest(TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile(values, 1.0), 100)
+        self.assertIsNone(percentile([], 0.5))
+        self.assertEqual(summarize([]), {'count': 0, 'p50': None, 'p90': None, 'p99': None, 'max': None})
+
+    def test_check_thresholds(self):
+        report = {
+            'unfinished': 0,
+            'throughput_per_second': 2.0,
+            'queue_wait_seconds': {'build': {'p90': 0.5}, 'push': {'p90': 3.0}},
+            'status_endpoint': {'qps': 400.0},
+        }
+
+        self.assertEqual(check_thresholds(report, {'min_throughput': 1.0, 'max_queue_wait_p90': 5.0,
+                                                   'min_status_qps': 100.0}), [])
+
+        failures = check_thresholds(report, {'min_throughput': 3.0, 'max_queue_wait_p90': 1.0, 'min_status_qps': 500.0})
+        self.assertEqual(len(failures), 3)
+        self.assertIn("push queue wait", failures[1])
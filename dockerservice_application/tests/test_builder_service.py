@@ -0,0 +1,84 @@
+from django.test import TestCase, override_settings
+from unittest.mock import ANY, MagicMock, patch
+
+from ..services.builder_service import acquire_builder, release_builder, get_builder_hosts
+from ..services.errors import BuilderUnavailableError
+
+BUILDER_HOSTS = [
+    {'url': "tcp://builder-1:2375", 'max_builds': 2},
+    {'url': "tcp://builder-2:2375", 'max_builds': 2},
+]
+
+BUILDER_SCHEDULER = {
+    'affinity_ttl': 3600,
+    'lease_timeout': 900,
+    'acquire_timeout': 0,
+    'poll_interval': 0,
+    'unhealthy_ttl': 30,
+}
+
+
+@override_settings(DOCKER_HOSTS=BUILDER_HOSTS, BUILDER_SCHEDULER=BUILDER_SCHEDULER)
+@patch('dockerservice_application.services.builder_service.redis_lock', MagicMock())
+@patch('dockerservice_application.services.builder_service.get_docker_client')
+@patch('dockerservice_application.services.builder_service.get_redis_connection')
+class BuilderSchedulerTest(TestCase):
+
+    def setup_redis(self, mock_get_redis_connection, load, recent_hosts=(), unhealthy_hosts=()):
+        connection = mock_get_redis_connection.return_value
+        connection.zcard.side_effect = lambda key: load[key[len("dockerservice:builder:"):-len(":builds")]]
+        connection.zrangebyscore.return_value = [host.encode() for host in recent_hosts]
+        connection.exists.side_effect = lambda key: any(host in key for host in unhealthy_hosts)
+        return connection
+
+    def test_least_loaded_host(self, mock_get_redis_connection, mock_get_docker_client):
+        connection = self.setup_redis(mock_get_redis_connection, {"tcp://builder-1:2375": 1, "tcp://builder-2:2375": 0})
+
+        self.assertEqual(acquire_builder("build-1", "my_image"), "tcp://builder-2:2375")
+        connection.zadd.assert_any_call("dockerservice:builder:tcp://builder-2:2375:builds", {"build-1": ANY})
+
+    def test_host_which_built_the_image_recently(self, mock_get_redis_connection, mock_get_docker_client):
+        self.setup_redis(mock_get_redis_connection, {"tcp://builder-1:2375": 1, "tcp://builder-2:2375": 0},
+                         recent_hosts=["tcp://builder-1:2375"])
+
+        self.assertEqual(acquire_builder("build-1", "my_image"), "tcp://builder-1:2375")
+
+    def test_preferred_host(self, mock_get_redis_connection, mock_get_docker_client):
+        self.setup_redis(mock_get_redis_connection, {"tcp://builder-1:2375": 1, "tcp://builder-2:2375": 0},
+                         recent_hosts=["tcp://builder-2:2375"])
+
+        self.assertEqual(acquire_builder("build-1", "my_image", preferred_host="tcp://builder-1:2375"), "tcp://builder-1:2375")
+
+    def test_full_and_unhealthy_hosts_are_skipped(self, mock_get_redis_connection, mock_get_docker_client):
+        self.setup_redis(mock_get_redis_connection, {"tcp://builder-1:2375": 2, "tcp://builder-2:2375": 0},
+                         unhealthy_hosts=["tcp://builder-2:2375"])
+
+        with self.assertRaises(BuilderUnavailableError):
+            acquire_builder("build-1", "my_image")
+
+    def test_failed_health_check_marks_host_unhealthy(self, mock_get_redis_connection, mock_get_docker_client):
+        connection = self.setup_redis(mock_get_redis_connection, {"tcp://builder-1:2375": 0, "tcp://builder-2:2375": 1})
+        unhealthy_client = MagicMock()
+        unhealthy_client.ping.side_effect = Exception("Connection refused")
+        mock_get_docker_client.side_effect = lambda host: unhealthy_client if host == "tcp://builder-1:2375" else MagicMock()
+        connection.exists.side_effect = lambda key: any(call.args[0] == key for call in connection.set.call_args_list)
+
+        self.assertEqual(acquire_builder("build-1", "my_image"), "tcp://builder-2:2375")
+        connection.set.assert_called_once_with("dockerservice:builder:tcp://builder-1:2375:unhealthy", 1, ex=30)
+        connection.zrem.assert_called_once_with("dockerservice:builder:tcp://builder-1:2375:builds", "build-1")
+
+    def test_release_builder(self, mock_get_redis_connection, mock_get_docker_client):
+        release_builder("build-1", "tcp://builder-1:2375")
+
+        mock_get_redis_connection.return_value.zrem.assert_called_once_with("dockerservice:builder:tcp://builder-1:2375:builds", "build-1")
+
+
+class DefaultBuilderTest(TestCase):
+
+    @override_settings(DOCKER_HOSTS=[])
+    @patch('dockerservice_application.services.builder_service.get_redis_connection')
+    def test_without_docker_hosts(self, mock_get_redis_connection):
+        self.assertEqual(get_builder_hosts()[0]['url'], '')
+        self.assertEqual(acquire_builder("build-1", "my_image"), '')
+        release_builder("build-1", '')
+        mock_get_redis_connection.assert_not_called()
@@ -0,0 +1,99 @@
+from django.test import SimpleTestCase, override_settings
+from unittest.mock import MagicMock, patch
+
+from ..services.cancel_service import stage_abort, request_cancellation, clear_cancellation
+from ..services.retry_service import call_with_retries
+from ..services.errors import PushError, StageAbortedError
+import socket
+import threading
+import time
+
+RETRY_STAGES = {
+    'push': {'name': 'DjangoQPush', 'workers': 1, 'timeout': 540, 'retries': {'max_attempts': 3, 'base_delay': 30, 'max_delay': 60}},
+}
+
+@override_settings(CANCELLATION={'poll_interval': 0.05, 'ttl': 60}, PIPELINE_STAGES=RETRY_STAGES)
+@patch('dockerservice_application.services.cancel_service.is_cancellation_requested', return_value=False)
+class StageAbortTest(SimpleTestCase):
+
+    def create_response(self):
+        """
+        Returns a streaming response whose connection never sends anything, and the peer socket of the connection.
+        """
+        sock, peer = socket.socketpair()
+        self.addCleanup(sock.close)
+        self.addCleanup(peer.close)
+        response = MagicMock()
+        response.raw._connection.sock = sock
+        return response, peer
+
+    def test_cancellation_shuts_down_tracked_request(self, mock_is_cancellation_requested):
+
+        client = MagicMock()
+        client.api.hooks = {'response': []}
+        response, _ = self.create_response()
+        mock_is_cancellation_requested.return_value = True
+
+        started = time.monotonic()
+        with self.assertRaises(StageAbortedError) as context:
+            with stage_abort("585c7054-2e6a-45e9-80fc-92cd3c153ca1", "build", 60) as abort:
+                with abort.track(client):
+                    client.api.hooks['response'][0](response, timeout=None)
+                    # Blocks like a build streamed from the daemon until the connection is shut down
+                    response.raw._connection.sock.recv(1)
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(context.exception.reason, "cancelled")
+        self.assertEqual(client.api.hooks['response'], [])
+        response.close.assert_called_once()
+
+    def test_timeout_interrupts_backoff(self, mock_is_cancellation_requested):
+
+        func = MagicMock(side_effect=PushError("net/http: TLS handshake timeout"))
+
+        started = time.monotonic()
+        with self.assertRaises(StageAbortedError) as context:
+            with stage_abort("585c7054-2e6a-45e9-80fc-92cd3c153ca1", "push", 0.2) as abort:
+                call_with_retries("push", func, abort=abort)
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(context.exception.reason, "timeout")
+        self.assertEqual(str(context.exception), "Push timed out after 0.2 seconds")
+        func.assert_called_once()
+
+    def test_finished_stage_is_not_aborted(self, mock_is_cancellation_requested):
+
+        with stage_abort("585c7054-2e6a-45e9-80fc-92cd3c153ca1", "build", 60) as abort:
+            pass
+
+        time.sleep(0.1)
+        self.assertIsNone(abort.reason)
+
+    def test_requests_of_other_threads_are_not_tracked(self, mock_is_cancellation_requested):
+
+        client = MagicMock()
+        client.api.hooks = {'response': []}
+        response, _ = self.create_response()
+
+        with stage_abort("585c7054-2e6a-45e9-80fc-92cd3c153ca1", "build", 60) as abort:
+            with abort.track(client):
+                hook = client.api.hooks['response'][0]
+                thread = threading.Thread(target=hook, args=(response,))
+                thread.start()
+                thread.join()
+            abort.abort("cancelled")
+
+        response.close.assert_not_called()
+
+class CancellationFlagTest(SimpleTestCase):
+
+    @patch('dockerservice_application.services.cancel_service.get_redis_connection')
+    def test_clear_cancellation(self, mock_get_redis_connection):
+
+        connection = mock_get_redis_connection.return_value
+        request_cancellation("585c7054-2e6a-45e9-80fc-92cd3c153ca1")
+        clear_cancellation("585c7054-2e6a-45e9-80fc-92cd3c153ca1")
+
+        key = connection.set.call_args.args[0]
+        self.assertEqual(key, "dockerservice:cancel:585c7054-2e6a-45e9-80fc-92cd3c153ca1")
+        connection.delete.assert_called_once_with(key)
@@ -0,0 +1,98 @@
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from unittest.mock import MagicMock, patch
+from datetime import timedelta
+import os
+import tempfile
+import uuid
+
+from ..services.cleanup_service import collect_garbage
+from ..models import build, push
+
+
+@patch('dockerservice_application.services.cleanup_service.get_docker_client')
+class CollectGarbageTest(TestCase):
+
+    def setUp(self):
+        self.uploaded_files_dir = tempfile.mkdtemp()
+        settings_override = override_settings(UPLOADED_FILES_DIR=self.uploaded_files_dir, BUILD_LOG_DIR=tempfile.mkdtemp())
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_build(self, status, expiration_time, push_status=push.ProcessStatus.FAILED):
+        build_obj = build.objects.create(status=status, image_name="my_busy_box_image", image_tag="latest",
+                                         expiration_time=expiration_time)
+        build_obj.file_loc = self.create_folder(build_obj.build_id) + "/"
+        build_obj.save()
+        push.objects.create(build=build_obj, image_name="my_busy_box_image", image_tag="latest", status=push_status)
+        return build_obj
+
+    def create_folder(self, build_id, age=0):
+        folder_path = os.path.join(self.uploaded_files_dir, str(build_id))
+        os.makedirs(folder_path)
+        with open(os.path.join(folder_path, "Dockerfile"), "wb") as dockerfile:
+            dockerfile.write(b"FROM busybox:latest")
+        modified = timezone.now().timestamp() - age
+        os.utime(folder_path, (modified, modified))
+        return folder_path
+
+    def test_collect_garbage(self, mock_get_docker_client):
+
+        mock_get_docker_client.return_value.images.prune.return_value = {'SpaceReclaimed': 1000}
+        mock_get_docker_client.return_value.api.prune_builds.return_value = {'SpaceReclaimed': 2000}
+
+        yesterday = timezone.now().date() - timedelta(days=1)
+        expired_builds = [self.create_build(build.ProcessStatus.FAILED, yesterday) for i in range(3)]
+        running_build = self.create_build(build.ProcessStatus.IN_PROGRESS, yesterday)
+        current_build = self.create_build(build.ProcessStatus.FAILED, timezone.now().date() + timedelta(days=5))
+        old_orphan = self.create_folder(uuid.uuid4(), age=7200)
+        new_orphan = self.create_folder(uuid.uuid4())
+
+        report = collect_garbage(dry_run=False, batch_size=2)
+
+        self.assertEqual(report["deleted_builds"], 3)
+        self.assertEqual(report["reclaimed_bytes"], {"files": 4 * len(b"FROM busybox:latest"), "images": 1000, "build_cache": 2000})
+        self.assertFalse(build.objects.filter(build_id__in=[b.build_id for b in expired_builds]).exists())
+        self.assertFalse(push.objects.filter(build_id__in=[b.build_id for b in expired_builds]).exists())
+        self.assertTrue(build.objects.filter(build_id=running_build.build_id).exists())
+        self.assertTrue(build.objects.filter(build_id=current_build.build_id).exists())
+        self.assertFalse(os.path.exists(expired_builds[0].file_loc))
+        self.assertTrue(os.path.exists(current_build.file_loc))
+        self.assertFalse(os.path.exists(old_orphan))
+        self.assertTrue(os.path.exists(new_orphan))
+
+    def test_collect_garbage_keeps_builds_with_pushes_in_flight(self, mock_get_docker_client):
+
+        mock_get_docker_client.return_value.images.prune.return_value = {}
+        mock_get_docker_client.return_value.api.prune_builds.return_value = {}
+        yesterday = timezone.now().date() - timedelta(days=1)
+        pushing_builds = [self.create_build(build.ProcessStatus.COMPLETED, yesterday, push_status)
+                          for push_status in (push.ProcessStatus.PENDING, push.ProcessStatus.IN_PROGRESS)]
+        pushed_build = self.create_build(build.ProcessStatus.COMPLETED, yesterday, push.ProcessStatus.COMPLETED)
+
+        report = collect_garbage(dry_run=False)
+
+        self.assertEqual(report["deleted_builds"], 1)
+        self.assertFalse(build.objects.filter(build_id=pushed_build.build_id).exists())
+        for pushing_build in pushing_builds:
+            self.assertTrue(build.objects.filter(build_id=pushing_build.build_id).exists())
+            self.assertTrue(os.path.exists(pushing_build.file_loc))
+
+    def test_collect_garbage_dry_run(self, mock_get_docker_client):
+
+        dangling_image = MagicMock()
+        dangling_image.attrs = {'Size': 500}
+        mock_get_docker_client.return_value.images.list.return_value = [dangling_image]
+        mock_get_docker_client.return_value.api.df.return_value = {'BuildCache': [{'Size': 300, 'InUse': False}, {'Size': 200, 'InUse': True}]}
+
+        expired_build = self.create_build(build.ProcessStatus.COMPLETED, timezone.now().date() - timedelta(days=1))
+
+        report = collect_garbage(dry_run=True)
+
+        self.assertTrue(report["dry_run"])
+        self.assertEqual(report["deleted_builds"], 1)
+        self.assertEqual(report["reclaimed_bytes"]["images"], 500)
+        self.assertEqual(report["reclaimed_bytes"]["build_cache"], 300)
+        self.assertTrue(build.objects.filter(build_id=expired_build.build_id).exists())
+        self.assertTrue(os.path.exists(expired_build.file_loc))
+        mock_get_docker_client.return_value.images.prune.assert_not_called()
@@ -0,0 +1,97 @@
+from django.test import SimpleTestCase
+
+from ..services.dockerfile_service import parse_dockerfile, read_dockerfile, MAX_DOCKERFILE_SIZE
+from ..services.errors import DockerfileError
+import io
+
+MULTI_STAGE_DOCKERFILE = """# syntax=docker/dockerfile:1
+ARG GO_VERSION=1.21
+ARG BASE
+FROM --platform=$BUILDPLATFORM golang:${GO_VERSION} AS build
+WORKDIR /src
+# Comments within a continued instruction are ignored
+RUN --mount=type=cache,target=/root/.cache \\
+    # go build
+    go build -o /out/app .
+RUN <<EOF
+FORM is not an instruction inside a heredoc
+EOF
+FROM ${BASE:-alpine:3.19} AS final
+COPY --from=build /out/app /app
+COPY --from=nginx:1.25 /etc/nginx /etc/nginx
+ENTRYPOINT ["/app"]
+"""
+
+class DockerfileServiceTest(SimpleTestCase):
+
+    def test_parse_multi_stage_dockerfile(self):
+
+        summary = parse_dockerfile(MULTI_STAGE_DOCKERFILE)
+
+        self.assertEqual(summary["syntax"], "docker/dockerfile:1")
+        self.assertEqual(summary["args"], {"GO_VERSION": "1.21", "BASE": None})
+        self.assertEqual(summary["stages"], [
+            {"name": "build", "base": "golang:1.21", "platform": "$BUILDPLATFORM", "depends_on": []},
+            {"name": "final", "base": "alpine:3.19", "platform": None, "depends_on": [0]},
+        ])
+        self.assertEqual(summary["target"], "final")
+        self.assertEqual(summary["base_images"], ["golang:1.21", "alpine:3.19", "nginx:1.25"])
+        self.assertEqual(summary["instructions"], 10)
+
+    def test_stage_references_are_not_base_images(self):
+
+        summary = parse_dockerfile("FROM scratch AS base\nFROM base\nFROM busybox\nCOPY --from=0 / /\nRUN --mount=from=1 true\n")
+
+        self.assertEqual(summary["base_images"], ["busybox:latest"])
+        self.assertEqual([stage["depends_on"] for stage in summary["stages"]], [[], [0], [0, 1]])
+        self.assertEqual(summary["target"], "2")
+
+    def test_escape_directive(self):
+
+        summary = parse_dockerfile("# escape=`\nFROM mcr.microsoft.com/windows/servercore:ltsc2022\nRUN dir `\n    C:\\\n")
+
+        self.assertEqual(summary["base_images"], ["mcr.microsoft.com/windows/servercore:ltsc2022"])
+        self.assertEqual(summary["instructions"], 2)
+
+    def test_quoted_build_argument_defaults(self):
+
+        summary = parse_dockerfile("ARG NAME=\"a b\" OTHER='c'\nFROM busybox\nARG GREETING=\"hello world\"\n")
+
+        self.assertEqual(summary["args"], {"NAME": "a b", "OTHER": "c"})
+
+    def test_invalid_dockerfiles_are_rejected(self):
+
+        invalid = {
+            "": "no FROM instruction",
+            "FORM busybox\n": "line 1: unknown instruction: FORM",
+            "RUN echo hello\nFROM busybox\n": "line 1: RUN instruction before the first FROM",
+            "FROM\n": "FROM requires an image",
+            "FROM Busybox\n": "invalid image reference Busybox",
+            "ARG TAG\nFROM busybox:${TAG}\n": "invalid image reference busybox:",
+            "FROM busybox AS 1st\n": "invalid stage name 1st",
+            "FROM busybox AS base\nFROM alpine AS Base\n": "line 2: duplicate stage name Base",
+            "FROM busybox\nCOPY --from=1 /a /b\n": "line 2: stage 1 does not exist yet",
+            "FROM busybox\nCOPY app.py\n": "COPY requires at least two arguments",
+            "FROM busybox\nSHELL /bin/sh -c\n": "SHELL requires the arguments to be in JSON form",
+            "FROM busybox\nEXPOSE http\n": "invalid port http",
+            "FROM busybox\nONBUILD FROM alpine\n": "FROM is not allowed in ONBUILD",
+            "FROM busybox\nRUN <<EOF\necho hello\n": "heredoc EOF is not terminated",
+            "FROM busybox\nWORKDIR\n": "WORKDIR requires at least one argument",
+            "ARG NAME=\"a b\nFROM busybox\n": "line 1: invalid ARG instruction",
+        }
+
+        for content, message in invalid.items():
+            with self.assertRaisesRegex(DockerfileError, message):
+                parse_dockerfile(content)
+
+    def test_read_dockerfile_rewinds_the_upload(self):
+
+        file = io.BytesIO(b"\xef\xbb\xbfFROM busybox\n")
+
+        self.assertEqual(read_dockerfile(file), "FROM busybox\n")
+        self.assertEqual(file.tell(), 0)
+
+        with self.assertRaisesRegex(DockerfileError, "larger than"):
+            read_dockerfile(io.BytesIO(b"#" * (MAX_DOCKERFILE_SIZE + 1)))
+        with self.assertRaisesRegex(DockerfileError, "not UTF-8"):
+            read_dockerfile(io.BytesIO(b"FROM \xff\n"))
@@ -1,15 +1,36 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, MagicMock, patch
 import unittest
+import tempfile
 
 from ..services.docker_service import docker_build
 from ..services.docker_service import docker_push
+from ..services.docker_service import docker_build_push, docker_push_stage, enqueue_pushes
+from ..services.docker_service import enqueue_prefetch, prefetch_base_image, pull_base_image
+from ..services.build_log_service import read_build_log
+from ..services.docker_service import update_build_status, update_push_status
+from ..services.docker_client_service import get_docker_client, reset_docker_client, registry_login
+from ..services.buildkit_service import buildkit_build, build_cache_args
+from ..services.errors import BuildError
+from ..models import build, push, status_transition
+from prometheus_client import REGISTRY
+import docker
+import io
+import os
+import time
 
+@override_settings(BUILD_LOG_DIR=tempfile.mkdtemp())
 class DockerServiceTest(TestCase):
 
+    def setUp(self):
+        reset_docker_client()
+
+    def tearDown(self):
+        reset_docker_client()
+
     @patch('docker.from_env')
     @patch('dockerservice_application.services.docker_service.update_build_status')
     @patch('dockerservice_application.services.docker_service.update_push_status')
@@ -25,6 +46,8 @@ class DockerServiceTest(TestCase):
         mock_build_obj.image_tag = "latest"
         mock_build_obj.file_name = "busybox_dockerfile"
         mock_build_obj.file_loc = "my_dockerfile_dir"
+        mock_build_obj.dockerfile_path = ""
+        mock_build_obj.timeout = None
         mock_build_obj.status = "In Progress"
         mock_build_obj.build_id = build_id
 
@@ -32,6 +55,8 @@ class DockerServiceTest(TestCase):
         mock_push_obj = MagicMock()
         mock_push_obj.image_name = "my_busy_box_image"
         mock_push_obj.image_tag = "latest"
+        mock_push_obj.build.builder_host = ""
+        mock_push_obj.timeout = None
         mock_push_obj.status = "Pending"
         mock_push_obj.push_id = push_id
 
@@ -40,20 +65,88 @@ class DockerServiceTest(TestCase):
         mock_update_push_status_func.return_value = mock_push_obj
 
         mock_client = MagicMock()
-        mock_client.images.build.return_value = ("your_image_id", iter(["image", "logs"]))
+        mock_client.images.get.return_value.id = "sha256:1234"
+        mock_client.api.build.return_value = iter([{"stream": "Step 1/2 : FROM busybox\n"}, {"stream": "Successfully built 1234\n"}])
+        mock_docker.return_value = mock_client
+
+        build_status, repository_name, dockerfile_dir = docker_build(build_id, push_id)
+
+        self.assertTrue(build_status)
+        self.assertIn(b"Successfully built 1234", read_build_log(build_id))
+
+    @patch('docker.from_env')
+    @patch('dockerservice_application.services.docker_service.update_build_status')
+    @patch('dockerservice_application.services.docker_service.update_push_status')
+    def test_docker_build_context_archive(self, mock_update_push_status_func, mock_update_build_status_func, mock_docker):
+
+        build_id = "785c7054-2e6a-45e9-80fc-92cd3c153ca1"
+        push_id = "485c7054-2e6a-45e9-80fc-92cd3c153ca1"
+        context_dir = tempfile.mkdtemp()
+        with open(os.path.join(context_dir, "context.tar.gz"), "wb") as context:
+            context.write(b"archive content")
+
+        mock_build_obj = MagicMock()
+        mock_build_obj.image_name = "my_app"
+        mock_build_obj.image_tag = "latest"
+        mock_build_obj.file_name = "context.tar.gz"
+        mock_build_obj.file_loc = context_dir + "/"
+        mock_build_obj.dockerfile_path = "docker/Dockerfile"
+        mock_build_obj.timeout = None
+        mock_update_build_status_func.return_value = mock_build_obj
+
+        mock_client = MagicMock()
+        mock_client.images.get.return_value.id = "sha256:1234"
+        mock_client.api.build.return_value = iter([{"stream": "Successfully built 1234\n"}])
+        mock_docker.return_value = mock_client
+
+        build_status, repository_name, dockerfile_dir = docker_build(build_id, push_id)
+
+        self.assertTrue(build_status)
+        build_kwargs = mock_client.api.build.call_args.kwargs
+        self.assertTrue(build_kwargs["custom_context"])
+        self.assertEqual(build_kwargs["dockerfile"], "docker/Dockerfile")
+        self.assertEqual(build_kwargs["fileobj"].name, os.path.join(context_dir, "context.tar.gz"))
+
+    @patch('docker.from_env')
+    @patch('dockerservice_application.services.docker_service.update_build_status')
+    @patch('dockerservice_application.services.docker_service.update_push_status')
+    def test_docker_build_failure_reason(self, mock_update_push_status_func, mock_update_build_status_func, mock_docker):
+
+        build_id = "685c7054-2e6a-45e9-80fc-92cd3c153ca1"
+        push_id = "485c7054-2e6a-45e9-80fc-92cd3c153ca1"
+
+        mock_build_obj = MagicMock()
+        mock_build_obj.image_name = "my_busy_box_image"
+        mock_build_obj.image_tag = "latest"
+        mock_build_obj.file_name = "busybox_dockerfile"
+        mock_build_obj.file_loc = "my_dockerfile_dir"
+        mock_build_obj.dockerfile_path = ""
+        mock_build_obj.timeout = None
+        mock_update_build_status_func.return_value = mock_build_obj
+
+        error = "dockerfile parse error line 1: unknown instruction: FORM"
+        mock_client = MagicMock()
+        mock_client.api.build.return_value = iter([{"stream": "Step 1/1 : FORM busybox\n"}, {"errorDetail": {"message": error}}])
         mock_docker.return_value = mock_client
 
-        self.assertTrue(docker_build(build_id, push_id))
+        build_status, repository_name, dockerfile_dir = docker_build(build_id, push_id)
+
+        self.assertFalse(build_status)
+        mock_update_build_status_func.assert_called_with(build_id, "Failed", reason=error)
+        self.assertIn(error.encode(), read_build_log(build_id))
 
 
     @patch('docker.from_env')
     @patch('dockerservice_application.services.docker_service.update_push_status')
-    def test_docker_push(self, mock_update_push_status_func, mock_docker):
+    @patch('dockerservice_application.services.docker_service.get_remote_config_digest', return_value=None)
+    def test_docker_push(self, mock_get_remote_config_digest, mock_update_push_status_func, mock_docker):
 
         push_id = "485c7054-2e6a-45e9-80fc-92cd3c153ca1"
         mock_push_obj = MagicMock()
         mock_push_obj.image_name = "my_busy_box_image"
         mock_push_obj.image_tag = "latest"
+        mock_push_obj.build.builder_host = ""
+        mock_push_obj.timeout = None
         mock_push_obj.status = "Pending"
         mock_push_obj.push_id = push_id
 
@@ -76,6 +169,521 @@ class DockerServiceTest(TestCase):
 
 
 
+    @patch('dockerservice_application.services.docker_service.publish_status_change')
+    def test_status_updates_publish_after_commit(self, mock_publish_status_change):
+
+        build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest", status=build.ProcessStatus.IN_PROGRESS)
+        push_obj = push.objects.create(build=build_obj, image_name="my_busy_box_image", image_tag="latest")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            update_build_status(build_obj.build_id, build.ProcessStatus.COMPLETED)
+            update_push_status(push_obj.push_id, push.ProcessStatus.FAILED, reason="Failed to Push the image")
+
+        mock_publish_status_change.assert_any_call(build_obj.build_id, "build", build.ProcessStatus.COMPLETED, "")
+        mock_publish_status_change.assert_any_call(build_obj.build_id, "push", push.ProcessStatus.FAILED, "Failed to Push the image")
+
+    @patch('dockerservice_application.services.docker_service.async_task')
+    @patch('dockerservice_application.services.docker_service.docker_build')
+    def test_successful_build_enqueues_push_stage(self, mock_docker_build, mock_async_task):
+
+        build_id = "585c7054-2e6a-45e9-80fc-92cd3c153ca1"
+        push_id = "485c7054-2e6a-45e9-80fc-92cd3c153ca1"
+        build_obj = build.objects.create(build_id=build_id, image_name="my_busy_box_image", image_tag="latest")
+        push.objects.create(push_id=push_id, build=build_obj, image_name="my_busy_box_image", image_tag="latest")
+        mock_docker_build.return_value = (True, "my_busy_box_image:latest", "my_dockerfile_dir")
+
+        docker_build_push(build_id, push_id)
+
+        args, kwargs = mock_async_task.call_args
+        self.assertEqual(args, (docker_push_stage, build_id, push_id))
+        self.assertEqual(kwargs['broker'].list_key, "django_q:DjangoQPush:q")
+
+    @patch('dockerservice_application.services.docker_service.namespace', None)
+    @patch('dockerservice_application.services.docker_service.async_task')
+    def test_enqueue_pushes_by_registry(self, mock_async_task):
+
+        build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest")
+        push_ids = [str(push.objects.create(build=build_obj, image_name=name, image_tag=tag, status=push_status,
+                                            repository_name=repository_name).push_id)
+                    for name, tag, repository_name, push_status in [
+                        ("my_busy_box_image", "latest", "my_busy_box_image:latest", push.ProcessStatus.PENDING),
+                        ("my_busy_box_image", "1.4", "", push.ProcessStatus.FAILED),
+                        ("registry.example.com/my_busy_box_image", "1.4", "registry.example.com/my_busy_box_image:1.4",
+                         push.ProcessStatus.PENDING),
+                        ("my_busy_box_image", "1.3", "my_busy_box_image:1.3", push.ProcessStatus.COMPLETED),
+                    ]]
+
+        enqueue_pushes(build_obj.build_id, [push.ProcessStatus.PENDING, push.ProcessStatus.FAILED])
+
+        enqueued = sorted(call.args[2:] for call in mock_async_task.call_args_list)
+        self.assertEqual(enqueued, sorted([(push_ids[0], push_ids[1]), (push_ids[2],)]))
+        self.assertIsNone(push.objects.get(push_id=push_ids[3]).enqueued_at)
+
+    @patch('dockerservice_application.services.docker_service.async_task')
+    @patch('dockerservice_application.services.docker_service.get_prefetch_hosts', return_value=["tcp://builder-1:2375", "tcp://builder-2:2375"])
+    @patch('dockerservice_application.services.docker_service.get_redis_connection')
+    def test_enqueue_prefetch_deduplicates_images(self, mock_get_redis_connection, mock_get_prefetch_hosts, mock_async_task):
+
+        # golang:1.21 is already enqueued for the first host by another queued build
+        mock_get_redis_connection.return_value.set.side_effect = [False, True, True, True]
+
+        enqueue_prefetch("my_busy_box_image", ["golang:1.21", "alpine:latest"])
+
+        mock_get_prefetch_hosts.assert_called_once_with("my_busy_box_image")
+        mock_get_redis_connection.return_value.set.assert_any_call("dockerservice:prefetch:tcp://builder-1:2375:golang:1.21", 1, nx=True, ex=300)
+        self.assertEqual([call.args for call in mock_async_task.call_args_list], [
+            (prefetch_base_image, "alpine:latest", "tcp://builder-1:2375"),
+            (prefetch_base_image, "golang:1.21", "tcp://builder-2:2375"),
+            (prefetch_base_image, "alpine:latest", "tcp://builder-2:2375"),
+        ])
+        self.assertEqual(mock_async_task.call_args.kwargs['broker'].list_key, "django_q:DjangoQPrefetch:q")
+
+    @patch('dockerservice_application.services.docker_service.get_redis_connection', side_effect=ConnectionError("Connection refused"))
+    def test_enqueue_prefetch_ignores_redis_errors(self, mock_get_redis_connection):
+
+        self.assertEqual(enqueue_prefetch("my_busy_box_image", ["golang:1.21"]), [])
+
+    @override_settings(REGISTRY_CREDENTIALS={"registry.example.com": {"username": "robot", "password": "secret"}})
+    @patch('dockerservice_application.services.docker_service.redis_lock')
+    @patch('dockerservice_application.services.docker_service.get_docker_client')
+    def test_pull_base_image_holds_shared_pull_lock(self, mock_get_docker_client, mock_redis_lock):
+
+        mock_client = mock_get_docker_client.return_value
+        mock_client.images.get.side_effect = docker.errors.ImageNotFound("No such image")
+        mock_client.api.pull.return_value = iter([{"status": "Pulling fs layer"}, {"status": "Download complete"}])
+
+        self.assertTrue(pull_base_image("registry.example.com/base:1.0", "tcp://builder-1:2375"))
+
+        mock_get_docker_client.assert_called_once_with("tcp://builder-1:2375")
+        mock_redis_lock.assert_called_once_with("pull:tcp://builder-1:2375:registry.example.com/base:1.0", timeout=600)
+        mock_client.api.pull.assert_called_once_with("registry.example.com/base", tag="1.0", stream=True, decode=True,
+                                                     auth_config={"username": "robot", "password": "secret"})
+
+    @patch('dockerservice_application.services.docker_service.redis_lock')
+    @patch('dockerservice_application.services.docker_service.get_docker_client')
+    def test_pull_base_image_skips_image_pulled_while_waiting(self, mock_get_docker_client, mock_redis_lock):
+
+        mock_client = mock_get_docker_client.return_value
+        # Another worker pulled the image while this one waited for the lock
+        mock_client.images.get.side_effect = [docker.errors.ImageNotFound("No such image"), MagicMock()]
+
+        self.assertFalse(pull_base_image("busybox:latest"))
+
+        mock_redis_lock.assert_called_once()
+        mock_client.api.pull.assert_not_called()
+
+    @patch('dockerservice_application.services.docker_service.redis_lock')
+    @patch('dockerservice_application.services.docker_service.get_docker_client')
+    def test_prefetch_base_image_records_failures(self, mock_get_docker_client, mock_redis_lock):
+
+        mock_client = mock_get_docker_client.return_value
+        mock_client.images.get.side_effect = docker.errors.ImageNotFound("No such image")
+        mock_client.api.pull.return_value = iter([{"errorDetail": {"message": "manifest for busybox:missing not found"}}])
+
+        before = REGISTRY.get_sample_value('dockerservice_stage_outcomes_total', {'stage': 'prefetch', 'outcome': 'error'}) or 0
+        prefetch_base_image("busybox:missing")
+        after = REGISTRY.get_sample_value('dockerservice_stage_outcomes_total', {'stage': 'prefetch', 'outcome': 'error'})
+
+        self.assertEqual(after, before + 1)
+        mock_client.api.pull.assert_called_once()
+
+    @patch('dockerservice_application.services.docker_service.async_task')
+    @patch('dockerservice_application.services.docker_service.docker_build')
+    def test_failed_build_does_not_enqueue_push_stage(self, mock_docker_build, mock_async_task):
+
+        mock_docker_build.return_value = (False, "my_busy_box_image:latest", "my_dockerfile_dir")
+
+        docker_build_push("585c7054-2e6a-45e9-80fc-92cd3c153ca1", "485c7054-2e6a-45e9-80fc-92cd3c153ca1")
+
+        mock_async_task.assert_not_called()
+
+    @patch('dockerservice_application.services.docker_service.remove_task_metadata')
+    @patch('dockerservice_application.services.docker_service.docker_push')
+    def test_push_stage_removes_task_metadata(self, mock_docker_push, mock_remove_task_metadata):
+
+        build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest", file_loc="uploaded_files/build/")
+        mock_docker_push.return_value = True
+
+        with patch('dockerservice_application.services.docker_service.namespace', None):
+            docker_push_stage(str(build_obj.build_id), "485c7054-2e6a-45e9-80fc-92cd3c153ca1")
+
+        mock_remove_task_metadata.assert_called_once_with("my_busy_box_image:latest", "uploaded_files/build/", "")
+
+    @patch('docker.from_env')
+    @patch('dockerservice_application.services.docker_service.update_push_status')
+    @patch('dockerservice_application.services.docker_service.get_remote_config_digest', return_value=None)
+    def test_docker_push_counts_pushed_bytes(self, mock_get_remote_config_digest, mock_update_push_status_func, mock_docker):
+
+        mock_push_obj = MagicMock()
+        mock_push_obj.image_name = "my_busy_box_image"
+        mock_push_obj.image_tag = "latest"
+        mock_push_obj.build.builder_host = ""
+        mock_push_obj.timeout = None
+        mock_update_push_status_func.return_value = mock_push_obj
+
+        mock_client = MagicMock()
+        mock_client.images.push.return_value = iter([
+            {"status": "Preparing", "id": "layer1"},
+            {"status": "Pushing", "id": "layer1", "progressDetail": {"current": 512, "total": 2048}},
+            {"status": "Pushing", "id": "layer1", "progressDetail": {"current": 2048, "total": 2048}},
+            {"status": "Pushed", "id": "layer1"},
+            {"status": "Layer already exists", "id": "layer2"},
+        ])
+        mock_docker.return_value = mock_client
+
+        pushed_bytes = REGISTRY.get_sample_value('dockerservice_pushed_bytes_total')
+        successful_pushes = REGISTRY.get_sample_value('dockerservice_stage_outcomes_total', {'stage': 'push', 'outcome': 'success'}) or 0
+
+        self.assertTrue(docker_push("485c7054-2e6a-45e9-80fc-92cd3c153ca1"))
+
+        self.assertEqual(REGISTRY.get_sample_value('dockerservice_pushed_bytes_total') - pushed_bytes, 2048)
+        self.assertEqual(REGISTRY.get_sample_value('dockerservice_stage_outcomes_total', {'stage': 'push', 'outcome': 'success'}), successful_pushes + 1)
+
+    @patch('dockerservice_application.services.docker_service.publish_status_change')
+    @patch('dockerservice_application.services.docker_service.get_remote_config_digest', return_value=None)
+    @patch('docker.from_env')
+    def test_docker_push_samples_progress_logs(self, mock_docker, mock_get_remote_config_digest, mock_publish_status_change):
+
+        build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest")
+        push_obj = push.objects.create(build=build_obj, image_name="my_busy_box_image", image_tag="latest")
+
+        mock_client = MagicMock()
+        mock_client.images.push.return_value = iter([{"status": "Pushing", "id": "layer1", "progressDetail": {"current": size, "total": 1000}}
+                                                     for size in range(1000)])
+        mock_docker.return_value = mock_client
+
+        with self.assertLogs('dockerservice_application.services.docker_service', level='INFO') as logs:
+            self.assertTrue(docker_push(push_obj.push_id))
+
+        progress = [record for record in logs.records if record.getMessage().startswith("Push progress")]
+        self.assertEqual(len(progress), 1)
+        self.assertEqual(progress[0].progress_events, 1)
+
+    @patch('dockerservice_application.services.cancel_service.StageAbort.wait')
+    @patch('dockerservice_application.services.docker_service.publish_status_change')
+    @patch('dockerservice_application.services.docker_service.get_remote_config_digest', return_value=None)
+    @patch('docker.from_env')
+    def test_docker_push_retries_transient_errors(self, mock_docker, mock_get_remote_config_digest, mock_publish_status_change, mock_wait):
+
+        build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest", image_id="sha256:built")
+        push_obj = push.objects.create(build=build_obj, image_name="my_busy_box_image", image_tag="latest")
+
+        mock_client = MagicMock()
+        mock_client.images.get.return_value.id = "sha256:built"
+        mock_client.images.push.side_effect = [
+            iter([{"errorDetail": {"message": "received unexpected HTTP status: 503 Service Unavailable"}}]),
+            iter([{"status": "Pushed", "id": "layer1"}]),
+        ]
+        mock_docker.return_value = mock_client
+
+        self.assertTrue(docker_push(push_obj.push_id))
+
+        push_obj.refresh_from_db()
+        self.assertEqual(push_obj.status, push.ProcessStatus.COMPLETED)
+        self.assertEqual(push_obj.attempts, 2)
+        mock_wait.assert_called_once()
+
+    @patch('dockerservice_application.services.retry_service.time.sleep')
+    @patch('dockerservice_application.services.docker_service.publish_status_change')
+    @patch('dockerservice_application.services.docker_service.get_remote_config_digest', return_value=None)
+    @patch('docker.from_env')
+    def test_docker_push_does_not_retry_denied_access(self, mock_docker, mock_get_remote_config_digest, mock_publish_status_change, mock_sleep):
+
+        build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest")
+        push_obj = push.objects.create(build=build_obj, image_name="my_busy_box_image", image_tag="latest")
+
+        mock_client = MagicMock()
+        mock_client.images.push.return_value = iter([{"errorDetail": {"message": "denied: requested access to the resource is denied"}}])
+        mock_docker.return_value = mock_client
+
+        self.assertFalse(docker_push(push_obj.push_id))
+
+        push_obj.refresh_from_db()
+        self.assertEqual(push_obj.status, push.ProcessStatus.FAILED)
+        self.assertEqual(push_obj.attempts, 1)
+        mock_sleep.assert_not_called()
+
+    @patch('dockerservice_application.services.docker_service.publish_status_change')
+    @patch('dockerservice_application.services.docker_service.get_remote_config_digest', return_value=None)
+    @patch('docker.from_env')
+    def test_docker_push_retags_built_image(self, mock_docker, mock_get_remote_config_digest, mock_publish_status_change):
+
+        build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest", image_id="sha256:built")
+        push_obj = push.objects.create(build=build_obj, image_name="my_busy_box_image", image_tag="latest",
+                                       repository_name="my_busy_box_image:latest")
+
+        mock_client = MagicMock()
+        mock_client.images.get.side_effect = [MagicMock(id="sha256:other"), MagicMock(id="sha256:built")]
+        mock_client.images.push.return_value = iter([])
+        mock_docker.return_value = mock_client
+
+        self.assertTrue(docker_push(push_obj.push_id))
+
+        mock_client.api.tag.assert_called_once_with("sha256:built", "my_busy_box_image", "latest")
+
+    @patch('dockerservice_application.services.docker_service.publish_status_change')
+    @patch('docker.from_env')
+    def test_docker_push_fails_when_built_image_is_gone(self, mock_docker, mock_publish_status_change):
+
+        build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest", image_id="sha256:built",
+                                         status=build.ProcessStatus.COMPLETED)
+        push_obj = push.objects.create(build=build_obj, image_name="my_busy_box_image", image_tag="latest")
+
+        mock_client = MagicMock()
+        mock_client.images.get.side_effect = docker.errors.ImageNotFound("No such image")
+        mock_docker.return_value = mock_client
+
+        self.assertFalse(docker_push(push_obj.push_id))
+
+        mock_client.images.push.assert_not_called()
+        build_obj.refresh_from_db()
+        self.assertEqual(build_obj.status, build.ProcessStatus.FAILED)
+
+    @patch('dockerservice_application.services.docker_service.publish_status_change')
+    @patch('dockerservice_application.services.docker_service.touch_image')
+    @patch('docker.from_env')
+    def test_docker_build_reuses_built_image(self, mock_docker, mock_touch_image, mock_publish_status_change):
+
+        build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest", file_name="Dockerfile",
+                                         file_loc="my_dockerfile_dir", image_id="sha256:built", status=build.ProcessStatus.FAILED)
+        push_obj = push.objects.create(build=build_obj, image_name="my_busy_box_image", image_tag="latest")
+
+        mock_client = MagicMock()
+        mock_client.images.get.return_value.id = "sha256:built"
+        mock_docker.return_value = mock_client
+
+        with patch('dockerservice_application.services.docker_service.namespace', None):
+            build_status, repository_name, dockerfile_dir = docker_build(build_obj.build_id, push_obj.push_id)
+
+        self.assertTrue(build_status)
+        mock_client.api.build.assert_not_called()
+        mock_client.api.tag.assert_called_once_with("sha256:built", "my_busy_box_image", "latest")
+        build_obj.refresh_from_db()
+        self.assertEqual(build_obj.status, build.ProcessStatus.COMPLETED)
+        self.assertEqual(build_obj.attempts, 1)
+
+    @patch('dockerservice_application.services.docker_service.publish_status_change')
+    @patch('dockerservice_application.services.docker_service.pull_base_image', return_value=True)
+    @patch('dockerservice_application.services.docker_service.touch_image')
+    @patch('dockerservice_application.services.docker_service.release_builder')
+    @patch('dockerservice_application.services.docker_service.acquire_builder', return_value="tcp://builder-1:2375")
+    @patch('dockerservice_application.services.docker_service.get_docker_client')
+    def test_docker_build_runs_on_scheduled_host(self, mock_get_docker_client, mock_acquire_builder, mock_release_builder,
+                                                 mock_touch_image, mock_pull_base_image, mock_publish_status_change):
+
+        build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest", file_name="Dockerfile", file_loc="my_dockerfile_dir",
+                                         dockerfile_summary={"base_images": ["busybox:latest"]})
+        push_obj = push.objects.create(build=build_obj, image_name="my_busy_box_image", image_tag="latest")
+
+        mock_client = mock_get_docker_client.return_value
+        mock_client.api.build.return_value = iter([{"stream": "Successfully built 1234\n"}])
+        mock_client.images.get.return_value.id = "sha256:1234"
+
+        with patch('dockerservice_application.services.docker_service.namespace', None):
+            build_status, repository_name, dockerfile_dir = docker_build(build_obj.build_id, push_obj.push_id)
+
+        self.assertTrue(build_status)
+        mock_get_docker_client.assert_called_with("tcp://builder-1:2375")
+        mock_release_builder.assert_called_once_with(build_obj.build_id, "tcp://builder-1:2375")
+        mock_touch_image.assert_called_once_with("my_busy_box_image:latest", "my_busy_box_image", "latest", "tcp://builder-1:2375")
+        mock_pull_base_image.assert_called_once_with("busybox:latest", "tcp://builder-1:2375", ANY)
+        build_obj.refresh_from_db()
+        self.assertEqual(build_obj.builder_host, "tcp://builder-1:2375")
+        self.assertEqual(build_obj.image_id, "sha256:1234")
+
+    @patch('dockerservice_application.services.docker_service.publish_status_change')
+    @patch('dockerservice_application.services.docker_service.get_docker_client')
+    def test_cancelled_build_is_not_started(self, mock_get_docker_client, mock_publish_status_change):
+
+        file_loc = tempfile.mkdtemp() + "/"
+        with open(os.path.join(file_loc, "Dockerfile"), "w") as dockerfile:
+            dockerfile.write("FROM busybox:latest\n")
+        build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest", file_name="Dockerfile",
+                                         file_loc=file_loc, status=build.ProcessStatus.CANCELLED)
+        push_obj = push.objects.create(build=build_obj, image_name="my_busy_box_image", image_tag="latest",
+                                       status=push.ProcessStatus.CANCELLED)
+
+        self.assertEqual(docker_build(build_obj.build_id, push_obj.push_id), (False, None, None))
+
+        mock_get_docker_client.assert_not_called()
+        self.assertFalse(os.path.exists(file_loc))
+
+    @override_settings(CANCELLATION={'poll_interval': 0.05, 'ttl': 60})
+    @patch('dockerservice_application.services.cancel_service.is_cancellation_requested', return_value=False)
+    @patch('dockerservice_application.services.docker_service.publish_status_change')
+    @patch('dockerservice_application.services.docker_service.pull_base_image', return_value=True)
+    @patch('dockerservice_application.services.docker_service.release_builder')
+    @patch('dockerservice_application.services.docker_service.acquire_builder', return_value="")
+    @patch('dockerservice_application.services.docker_service.get_docker_client')
+    def test_docker_build_timeout(self, mock_get_docker_client, mock_acquire_builder, mock_release_builder,
+                                  mock_pull_base_image, mock_publish_status_change, mock_is_cancellation_requested):
+
+        build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest", file_name="Dockerfile",
+                                         file_loc="my_dockerfile_dir", timeout=1)
+        push_obj = push.objects.create(build=build_obj, image_name="my_busy_box_image", image_tag="latest")
+
+        def interrupted_build(**kwargs):
+            # The connection of a build streamed from the daemon breaks once it is shut down by the abort
+            time.sleep(1.2)
+            raise ConnectionError("Connection aborted")
+
+        mock_client = mock_get_docker_client.return_value
+        mock_client.images.get.side_effect = docker.errors.ImageNotFound("No such image")
+        mock_client.api.build.side_effect = interrupted_build
+
+        build_status, repository_name, dockerfile_dir = docker_build(build_obj.build_id, push_obj.push_id)
+
+        self.assertFalse(build_status)
+        mock_client.api.build.assert_called_once()
+        mock_release_builder.assert_called_once_with(build_obj.build_id, "")
+        build_obj.refresh_from_db()
+        push_obj.refresh_from_db()
+        self.assertEqual(build_obj.status, build.ProcessStatus.FAILED)
+        self.assertEqual(build_obj.failed_reason, "Build timed out after 1 seconds")
+        self.assertEqual(push_obj.status, push.ProcessStatus.FAILED)
+
+    @patch('dockerservice_application.services.docker_service.publish_status_change')
+    def test_status_updates_record_timestamps_and_transitions(self, mock_publish_status_change):
+
+        build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest")
+        push_obj = push.objects.create(build=build_obj, image_name="my_busy_box_image", image_tag="latest")
+
+        update_build_status(build_obj.build_id, build.ProcessStatus.IN_PROGRESS)
+        update_build_status(build_obj.build_id, build.ProcessStatus.COMPLETED)
+        update_push_status(push_obj.push_id, push.ProcessStatus.IN_PROGRESS)
+
+        build_obj.refresh_from_db()
+        push_obj.refresh_from_db()
+        self.assertLessEqual(build_obj.started_at, build_obj.finished_at)
+        self.assertIsNotNone(push_obj.started_at)
+        self.assertIsNone(push_obj.finished_at)
+
+        transitions = list(status_transition.objects.filter(build=build_obj).order_by('id').values_list('stage', 'from_status', 'to_status'))
+        self.assertEqual(transitions, [
+            ('build', 'Pending', 'In Progress'),
+            ('build', 'In Progress', 'Completed'),
+            ('push', 'Pending', 'In Progress'),
+        ])
+
+    @patch('dockerservice_application.services.docker_service.publish_status_change')
+    def test_status_updates_compare_and_set_previous_status(self, mock_publish_status_change):
+
+        build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest")
+        push_obj = push.objects.create(build=build_obj, image_name="my_busy_box_image", image_tag="latest",
+                                       status=push.ProcessStatus.COMPLETED)
+
+        self.assertIsNone(update_build_status(build_obj.build_id, build.ProcessStatus.COMPLETED))
+        self.assertIsNone(update_push_status(push_obj.push_id, push.ProcessStatus.IN_PROGRESS))
+
+        build_obj.refresh_from_db()
+        push_obj.refresh_from_db()
+        self.assertEqual(build_obj.status, build.ProcessStatus.PENDING)
+        self.assertEqual(push_obj.status, push.ProcessStatus.COMPLETED)
+        self.assertFalse(status_transition.objects.exists())
+
+        loaded_build = update_build_status(build_obj.build_id, build.ProcessStatus.IN_PROGRESS, fields=('image_name',))
+        self.assertEqual(loaded_build.image_name, "my_busy_box_image")
+        self.assertEqual(loaded_build.get_deferred_fields() & {'image_name', 'status'}, {'status'})
+
+    def test_sqlite_pragmas(self):
+
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+class DockerClientServiceTest(TestCase):
+
+    def setUp(self):
+        reset_docker_client()
+
+    def tearDown(self):
+        reset_docker_client()
+
+    @patch('docker.from_env')
+    def test_client_is_reused(self, mock_docker):
+
+        self.assertIs(get_docker_client(), get_docker_client())
+        mock_docker.assert_called_once()
+
+    @patch('docker.from_env')
+    def test_client_is_recreated_after_failed_health_check(self, mock_docker):
+
+        broken_client = MagicMock()
+        broken_client.ping.side_effect = Exception("Connection refused")
+        mock_docker.side_effect = [broken_client, MagicMock()]
+
+        with override_settings(DOCKER_CLIENT={'max_pool_size': 10, 'health_check_interval': 0, 'registry_login_ttl': 3600}):
+            first_client = get_docker_client()
+            second_client = get_docker_client()
+
+        self.assertIsNot(first_client, second_client)
+        broken_client.close.assert_called_once()
+
+    def test_registry_login_is_cached(self):
+
+        mock_client = MagicMock()
+        mock_client.login.return_value = {'Status': 'Login Succeeded'}
+
+        registry_login(mock_client, "username", "password", "https://index.docker.io/v2/")
+        registry_login(mock_client, "username", "password", "https://index.docker.io/v2/")
+
+        mock_client.login.assert_called_once()
+
+    def test_failed_registry_login_is_not_cached(self):
+
+        mock_client = MagicMock()
+        mock_client.login.side_effect = [Exception("unauthorized"), {'Status': 'Login Succeeded'}]
+
+        with self.assertRaises(Exception):
+            registry_login(mock_client, "username", "password", "https://index.docker.io/v2/")
+        registry_login(mock_client, "username", "password", "https://index.docker.io/v2/")
+
+        self.assertEqual(mock_client.login.call_count, 2)
+
+
+class BuildkitServiceTest(TestCase):
+
+    @override_settings(DOCKER_BUILD={'builder': 'buildkit', 'cache_type': 'registry', 'cache_repository': 'namespace/build-cache'})
+    @patch('dockerservice_application.services.buildkit_service.subprocess.Popen')
+    def test_buildkit_build_uses_registry_cache(self, mock_popen):
+
+        mock_popen.return_value.stdout = iter([b"#1 [internal] load build definition from Dockerfile\n", b"#5 DONE 0.1s\n"])
+        mock_popen.return_value.returncode = 0
+        build_log = io.BytesIO()
+
+        buildkit_build(build_log, "uploaded_files/build/", "Dockerfile", "namespace/my_image:latest", "namespace/my_image")
+
+        command = mock_popen.call_args[0][0]
+        self.assertEqual(command[:3], ["docker", "buildx", "build"])
+        self.assertIn("type=registry,ref=namespace/build-cache:namespace-my_image", command)
+        self.assertIn("type=registry,ref=namespace/build-cache:namespace-my_image,mode=max", command)
+        self.assertIn(b"#5 DONE", build_log.getvalue())
+
+    @patch('dockerservice_application.services.buildkit_service.subprocess.Popen')
+    def test_buildkit_build_failure(self, mock_popen):
+
+        mock_popen.return_value.stdout = iter([b"ERROR: failed to solve: busybox:missing: not found\n"])
+        mock_popen.return_value.returncode = 1
+
+        with override_settings(DOCKER_BUILD={'builder': 'buildkit', 'cache_type': 'local', 'cache_dir': tempfile.mkdtemp()}):
+            with self.assertRaisesMessage(BuildError, "failed to solve"):
+                buildkit_build(io.BytesIO(), "uploaded_files/build/", "Dockerfile", "my_image:latest", "my_image")
+
+    def test_local_cache_is_imported_once_exported(self):
+
+        cache_dir = tempfile.mkdtemp()
+
+        with override_settings(DOCKER_BUILD={'builder': 'buildkit', 'cache_type': 'local', 'cache_dir': cache_dir}):
+            first_build_args = build_cache_args("my_image")
+            os.makedirs(os.path.join(cache_dir, "my_image"))
+            second_build_args = build_cache_args("my_image")
+
+        self.assertNotIn("--cache-from", first_build_args)
+        self.assertIn("--cache-to", first_build_args)
+        self.assertIn("--cache-from", second_build_args)
+
 
 # if __name__ == '__main__':
 #     unittest.main()
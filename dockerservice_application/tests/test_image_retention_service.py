@@ -0,0 +1,78 @@
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from unittest.mock import MagicMock, patch
+from datetime import timedelta
+import docker
+
+from ..services.image_retention_service import touch_image, enforce_image_budget
+from ..models import build, push, retained_image
+
+
+@override_settings(IMAGE_RETENTION={'disk_budget': 100})
+@patch('dockerservice_application.services.image_retention_service.redis_lock', MagicMock())
+@patch('dockerservice_application.services.image_retention_service.get_docker_client')
+class ImageRetentionTest(TestCase):
+
+    def create_image(self, image_name, age, push_status=push.ProcessStatus.COMPLETED):
+        build_obj = build.objects.create(image_name=image_name, image_tag="latest")
+        push.objects.create(build=build_obj, image_name=image_name, image_tag="latest", status=push_status)
+        touch_image(f"namespace/{image_name}:latest", image_name, "latest")
+        retained_image.objects.filter(image_name=image_name).update(last_used_at=timezone.now() - timedelta(hours=age))
+
+    def test_touch_image(self, mock_get_docker_client):
+        touch_image("namespace/my_busy_box_image:latest", "my_busy_box_image", "latest")
+        first_use = retained_image.objects.get().last_used_at
+        touch_image("namespace/my_busy_box_image:latest", "my_busy_box_image", "latest")
+
+        self.assertEqual(retained_image.objects.count(), 1)
+        self.assertGreater(retained_image.objects.get().last_used_at, first_use)
+
+    def test_enforce_image_budget_within_budget(self, mock_get_docker_client):
+        self.create_image("old_image", age=3)
+        mock_client = mock_get_docker_client.return_value
+        mock_client.df.return_value = {'LayersSize': 100}
+
+        self.assertEqual(enforce_image_budget(), [])
+        mock_client.images.remove.assert_not_called()
+        self.assertEqual(retained_image.objects.count(), 1)
+
+    def test_enforce_image_budget_evicts_least_recently_used(self, mock_get_docker_client):
+        self.create_image("new_image", age=1)
+        self.create_image("old_image", age=3)
+        self.create_image("older_image", age=5)
+        mock_client = mock_get_docker_client.return_value
+        mock_client.df.side_effect = [{'LayersSize': 300}, {'LayersSize': 200}, {'LayersSize': 100}]
+        tags = {"namespace/older_image:latest": ["namespace/older_image:latest", "namespace/older_image:1.4"]}
+        mock_client.images.get.side_effect = lambda name: MagicMock(tags=tags.get(name, [name]))
+
+        evicted = enforce_image_budget()
+
+        self.assertEqual(evicted, ["namespace/older_image:latest", "namespace/old_image:latest"])
+        mock_client.images.remove.assert_any_call("namespace/older_image:latest")
+        mock_client.images.remove.assert_any_call("namespace/older_image:1.4")
+        self.assertEqual(list(retained_image.objects.values_list('image_name', flat=True)), ["new_image"])
+
+    def test_enforce_image_budget_keeps_images_needed_by_pushes(self, mock_get_docker_client):
+        self.create_image("failed_image", age=5, push_status=push.ProcessStatus.FAILED)
+        self.create_image("pushing_image", age=4, push_status=push.ProcessStatus.IN_PROGRESS)
+        self.create_image("old_image", age=3)
+        mock_client = mock_get_docker_client.return_value
+        mock_client.df.side_effect = [{'LayersSize': 300}, {'LayersSize': 200}]
+
+        evicted = enforce_image_budget()
+
+        self.assertEqual(evicted, ["namespace/old_image:latest"])
+        self.assertEqual(retained_image.objects.count(), 2)
+
+    def test_enforce_image_budget_skips_images_in_use(self, mock_get_docker_client):
+        self.create_image("used_image", age=5)
+        self.create_image("old_image", age=3)
+        mock_client = mock_get_docker_client.return_value
+        mock_client.df.side_effect = [{'LayersSize': 300}, {'LayersSize': 100}]
+        mock_client.images.get.side_effect = lambda name: MagicMock(tags=[name])
+        mock_client.images.remove.side_effect = [docker.errors.APIError("image is being used by a container"), None]
+
+        evicted = enforce_image_budget()
+
+        self.assertEqual(evicted, ["namespace/old_image:latest"])
+        self.assertTrue(retained_image.objects.filter(image_name="used_image").exists())
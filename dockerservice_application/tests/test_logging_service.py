@@ -0,0 +1,90 @@
+from django.test import SimpleTestCase
+from unittest.mock import patch
+
+from ..services.logging_service import BackgroundFileHandler, JsonFormatter, LogContextFilter, RateLimiter, log_context
+import json
+import logging
+import os
+import tempfile
+
+class LoggingServiceTest(SimpleTestCase):
+
+    def create_handler(self, **kwargs):
+        filename = os.path.join(tempfile.mkdtemp(), "debug.log")
+        handler = BackgroundFileHandler(filename, **kwargs)
+        handler.setFormatter(JsonFormatter())
+        handler.addFilter(LogContextFilter())
+        self.addCleanup(handler.close)
+        return handler, filename
+
+    def read_records(self, filename):
+        with open(filename) as log_file:
+            return [json.loads(line) for line in log_file]
+
+    def test_records_are_tagged_with_build_and_push(self):
+
+        handler, filename = self.create_handler()
+        logger = logging.getLogger("dockerservice_application.tests.logging")
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+
+        with log_context(build_id="585c7054-2e6a-45e9-80fc-92cd3c153ca1"):
+            with log_context(push_id="485c7054-2e6a-45e9-80fc-92cd3c153ca1", image=None):
+                logger.warning("Pushing %s", "my_image:latest", extra={'progress_events': 3})
+            try:
+                raise ValueError("broken")
+            except ValueError:
+                logger.exception("Build failed")
+        logger.warning("No build")
+        handler.close()
+
+        pushing, failed, other = self.read_records(filename)
+        self.assertEqual(pushing["message"], "Pushing my_image:latest")
+        self.assertEqual(pushing["level"], "WARNING")
+        self.assertEqual(pushing["build_id"], "585c7054-2e6a-45e9-80fc-92cd3c153ca1")
+        self.assertEqual(pushing["push_id"], "485c7054-2e6a-45e9-80fc-92cd3c153ca1")
+        self.assertEqual(pushing["progress_events"], 3)
+        self.assertNotIn("image", pushing)
+        self.assertNotIn("push_id", failed)
+        self.assertIn("ValueError: broken", failed["exc_info"])
+        self.assertNotIn("build_id", other)
+
+    def test_records_are_dropped_while_queue_is_full(self):
+
+        handler, filename = self.create_handler(queue_size=1)
+        # Nothing is written while the writer thread is not running
+        handler.listener_pid = os.getpid()
+        for index in range(3):
+            handler.handle(logging.makeLogRecord({'msg': f"record {index}"}))
+
+        handler.listener_pid = None
+        handler.start()
+        handler.queue.join()
+        handler.handle(logging.makeLogRecord({'msg': "record 3"}))
+        handler.close()
+
+        records = self.read_records(filename)
+        self.assertEqual([record["message"] for record in records], ["record 0", "record 3"])
+        self.assertEqual(records[1]["dropped_records"], 2)
+
+    def test_writer_is_restarted_after_fork(self):
+
+        handler, filename = self.create_handler()
+        handler.handle(logging.makeLogRecord({'msg': "parent"}))
+        parent_listener = handler.listener
+
+        with patch('dockerservice_application.services.logging_service.os.getpid', return_value=-1):
+            handler.handle(logging.makeLogRecord({'msg': "child"}))
+            self.assertIsNot(handler.listener, parent_listener)
+            handler.close()
+        parent_listener.stop()
+
+        self.assertCountEqual([record["message"] for record in self.read_records(filename)], ["parent", "child"])
+
+    @patch('dockerservice_application.services.logging_service.time.monotonic')
+    def test_rate_limiter(self, mock_monotonic):
+
+        limiter = RateLimiter(5)
+        mock_monotonic.side_effect = [100, 101, 104, 105, 106]
+
+        self.assertEqual([limiter.sample() for _ in range(5)], [1, 0, 0, 3, 0])
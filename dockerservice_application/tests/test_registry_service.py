@@ -0,0 +1,129 @@
+from django.test import TestCase
+from unittest.mock import MagicMock, patch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import base64
+import json
+import threading
+
+from ..services.registry_service import get_remote_config_digest
+from ..services.docker_client_service import reset_docker_client
+from ..services.docker_service import docker_push
+from ..models import build, push
+
+CONFIG_DIGEST = "sha256:3f57d9401f8d42f986df300f0c69192fc41da28ccc8d797829467780db3dd741"
+
+
+class FakeRegistryHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in for a registry using bearer token authentication like Docker Hub.
+    """
+    manifests = {
+        ("namespace/my_busy_box_image", "latest"): {
+            "schemaVersion": 2,
+            "mediaType": "application/vnd.docker.distribution.manifest.v2+json",
+            "config": {"mediaType": "application/vnd.docker.container.image.v1+json", "digest": CONFIG_DIGEST},
+            "layers": [],
+        },
+    }
+
+    def do_GET(self):
+        if self.path.startswith("/token"):
+            expected = "Basic " + base64.b64encode(b"username:password").decode()
+            if self.headers.get("Authorization") != expected:
+                return self.send_json(401, {"errors": []})
+            return self.send_json(200, {"token": "fake-token"})
+
+        if self.headers.get("Authorization") != "Bearer fake-token":
+            self.send_response(401)
+            self.send_header("WWW-Authenticate", f'Bearer realm="http://{self.headers["Host"]}/token",service="fake-registry",scope="repository:pull"')
+            self.end_headers()
+            return
+
+        repository, tag = self.path[len("/v2/"):].split("/manifests/")
+        manifest = self.manifests.get((repository, tag))
+        if manifest is None:
+            return self.send_json(404, {"errors": [{"code": "MANIFEST_UNKNOWN"}]})
+        return self.send_json(200, manifest)
+
+    def send_json(self, code, body):
+        content = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RegistryServiceTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRegistryHandler)
+        cls.registry_api_url = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def tearDown(self):
+        reset_docker_client()
+
+    def test_get_remote_config_digest(self):
+
+        digest = get_remote_config_digest(self.registry_api_url, "namespace/my_busy_box_image:latest", "username", "password")
+
+        self.assertEqual(digest, CONFIG_DIGEST)
+
+    def test_get_remote_config_digest_of_missing_tag(self):
+
+        digest = get_remote_config_digest(self.registry_api_url, "namespace/my_busy_box_image:v2", "username", "password")
+
+        self.assertIsNone(digest)
+
+    @patch('docker.from_env')
+    def test_docker_push_skips_image_already_present(self, mock_docker):
+
+        build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest")
+        push_obj = push.objects.create(build=build_obj, image_name="my_busy_box_image", image_tag="latest")
+
+        mock_client = MagicMock()
+        mock_client.images.get.return_value.id = CONFIG_DIGEST
+        mock_docker.return_value = mock_client
+
+        with patch.multiple('dockerservice_application.services.docker_service', namespace="namespace",
+                            registry_api_url=self.registry_api_url, registry_username="username", registry_password="password"), \
+             patch('dockerservice_application.services.docker_service.publish_status_change'):
+            self.assertTrue(docker_push(push_obj.push_id))
+
+        push_obj.refresh_from_db()
+        mock_client.images.push.assert_not_called()
+        self.assertTrue(push_obj.already_present)
+        self.assertEqual(push_obj.status, push.ProcessStatus.COMPLETED)
+        self.assertEqual(push_obj.image_loc, f"namespace/my_busy_box_image:latest@{CONFIG_DIGEST}")
+
+    @patch('docker.from_env')
+    def test_docker_push_uploads_changed_image(self, mock_docker):
+
+        build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest")
+        push_obj = push.objects.create(build=build_obj, image_name="my_busy_box_image", image_tag="latest")
+
+        mock_client = MagicMock()
+        mock_client.images.get.return_value.id = "sha256:0000000000000000000000000000000000000000000000000000000000000000"
+        mock_client.images.push.return_value = iter([{"status": "Pushed"}])
+        mock_docker.return_value = mock_client
+
+        with patch.multiple('dockerservice_application.services.docker_service', namespace="namespace",
+                            registry_api_url=self.registry_api_url, registry_username="username", registry_password="password"), \
+             patch('dockerservice_application.services.docker_service.publish_status_change'):
+            self.assertTrue(docker_push(push_obj.push_id))
+
+        push_obj.refresh_from_db()
+        mock_client.images.push.assert_called_once()
+        self.assertFalse(push_obj.already_present)
@@ -0,0 +1,63 @@
+from django.test import TestCase, override_settings
+from unittest.mock import MagicMock, patch
+from requests.exceptions import ConnectionError
+
+from ..services.retry_service import backoff_delay, call_with_retries, is_transient_error
+from ..services.errors import BuildError, PushError
+import docker
+
+RETRY_STAGES = {
+    'build': {'name': 'DjangoQ', 'workers': 1, 'retries': {'max_attempts': 2, 'base_delay': 5, 'max_delay': 60}},
+    'push': {'name': 'DjangoQPush', 'workers': 1, 'retries': {'max_attempts': 3, 'base_delay': 2, 'max_delay': 5}},
+}
+
+@override_settings(PIPELINE_STAGES=RETRY_STAGES)
+class RetryServiceTest(TestCase):
+
+    def test_transient_errors(self):
+
+        self.assertTrue(is_transient_error(ConnectionError("Connection aborted")))
+        self.assertTrue(is_transient_error(PushError("received unexpected HTTP status: 503 Service Unavailable")))
+        self.assertTrue(is_transient_error(docker.errors.APIError("Server error", response=MagicMock(status_code=502))))
+        self.assertFalse(is_transient_error(docker.errors.APIError("Unauthorized", response=MagicMock(status_code=401))))
+        self.assertFalse(is_transient_error(PushError("denied: requested access to the resource is denied")))
+        self.assertFalse(is_transient_error(BuildError("dockerfile parse error line 1: unknown instruction: FORM")))
+
+    def test_backoff_delay_is_capped(self):
+
+        for attempt in range(1, 10):
+            delay = backoff_delay("push", attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(5, 2 * 2 ** (attempt - 1)))
+
+    @patch('dockerservice_application.services.retry_service.time.sleep')
+    def test_retries_transient_errors_within_budget(self, mock_sleep):
+
+        func = MagicMock(side_effect=[PushError("net/http: TLS handshake timeout"), PushError("i/o timeout"), "pushed"])
+        attempts = []
+
+        self.assertEqual(call_with_retries("push", func, on_attempt=attempts.append), "pushed")
+
+        self.assertEqual(attempts, [1, 2, 3])
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    @patch('dockerservice_application.services.retry_service.time.sleep')
+    def test_gives_up_after_budget(self, mock_sleep):
+
+        func = MagicMock(side_effect=PushError("i/o timeout"))
+
+        with self.assertRaises(PushError):
+            call_with_retries("build", func)
+
+        self.assertEqual(func.call_count, 2)
+
+    @patch('dockerservice_application.services.retry_service.time.sleep')
+    def test_does_not_retry_permanent_errors(self, mock_sleep):
+
+        func = MagicMock(side_effect=PushError("denied: requested access to the resource is denied"))
+
+        with self.assertRaises(PushError):
+            call_with_retries("push", func)
+
+        func.assert_called_once()
+        mock_sleep.assert_not_called()
@@ -1,11 +1,40 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
 from unittest.mock import patch, MagicMock, ANY
 from rest_framework import status
 from rest_framework.test import APIRequestFactory
-from ..views import build_and_push_docker, get_build_push_status, retry_build
+from ..views import build_and_push_docker, get_build_push_status, retry_build, cancel_build, build_and_push_service, get_build_logs
+from ..views import wait_build_push_status, stream_build_push_status, get_batch_build_push_status, get_pipeline_status, metrics
+from ..views import async_build_and_push_docker, async_get_build_push_status, async_wait_build_push_status
+from ..views import bulk_build_and_push_docker, get_build_push_group_status, get_batch_status_data
+from ..services.status_service import notify_status_watchers
+from ..services.status_data_service import get_cached_status, get_status_data, refresh_status_cache
+from ..services.docker_service import update_build_status
+from django.core.cache import caches
+from asgiref.sync import async_to_sync
+from ..services.build_log_service import open_build_log
+from ..models import build, push
 from django.core.files.uploadedfile import InMemoryUploadedFile, SimpleUploadedFile
 
+import asyncio
+import hashlib
 import io
+import json
+import os
+import tarfile
+import tempfile
+import threading
+
+def create_context_archive(files, name='context.tar.gz'):
+    """
+    Returns an uploaded gzipped tar build context with the given {path: content} files.
+    """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for path, content in files.items():
+            info = tarfile.TarInfo(path)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return SimpleUploadedFile(name, buffer.getvalue())
 
 class BuildAndPushDockerViewTest(TestCase):
 
@@ -14,7 +43,7 @@ class BuildAndPushDockerViewTest(TestCase):
         
         # Create a mock build_id to be returned by the mock service
         mock_build_id = '585c7054-2e6a-45e9-80fc-92cd3c153ca1'
-        mock_build_and_push_service.return_value = mock_build_id
+        mock_build_and_push_service.return_value = (mock_build_id, False)
 
         # Create a mock file for testing
         # mock_file = io.BytesIO(b'This is content of DockerFile')
@@ -22,7 +51,7 @@ class BuildAndPushDockerViewTest(TestCase):
         # mock_file.name = 'MyDockerFile'
         # mock_file.seek(0)
 
-        file_content = b"Mock Dockerfile Content"
+        file_content = b"FROM busybox:latest"
         mock_file = InMemoryUploadedFile(io.BytesIO(file_content), None, 'MyDockerFile', 'text/plain', len(file_content), None)
 
         # Create a request with the necessary data
@@ -38,7 +67,8 @@ class BuildAndPushDockerViewTest(TestCase):
         response = build_and_push_docker(request)
 
         # Check that the build_and_push_service was called with the correct arguments
-        mock_build_and_push_service.assert_called_once_with(ANY, 'test_image', 'latest')
+        mock_build_and_push_service.assert_called_once_with(ANY, 'test_image', 'latest', '', [], dockerfile_summary=ANY, timeouts=ANY)
+        self.assertEqual(mock_build_and_push_service.call_args.kwargs['dockerfile_summary']['base_images'], ['busybox:latest'])
 
         # Check the response status code and content
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -47,9 +77,94 @@ class BuildAndPushDockerViewTest(TestCase):
         self.assertEqual(response.data['build_id'], mock_build_id)
 
 
-    @patch("dockerservice_application.models.push.objects.get")
+    @patch('dockerservice_application.views.build_and_push_service')
+    def test_build_and_push_docker_context_archive(self, mock_build_and_push_service):
+
+        mock_build_and_push_service.return_value = ('585c7054-2e6a-45e9-80fc-92cd3c153ca1', False)
+        mock_file = create_context_archive({'docker/Dockerfile': b"FROM python:3.11 AS build\nFROM alpine\nCOPY --from=build /app /app\n",
+                                            'app.py': b"print('hello')\n"})
+
+        factory = APIRequestFactory()
+        request_data = {'file': mock_file, 'image_name': 'test_image', 'image_tag': 'latest', 'dockerfile': 'docker/Dockerfile'}
+        request = factory.post('/build-push/', data=request_data, format='multipart')
+
+        response = build_and_push_docker(request)
+
+        mock_build_and_push_service.assert_called_once_with(ANY, 'test_image', 'latest', 'docker/Dockerfile', [], dockerfile_summary=ANY, timeouts=ANY)
+        summary = mock_build_and_push_service.call_args.kwargs['dockerfile_summary']
+        self.assertEqual(summary['base_images'], ['python:3.11', 'alpine:latest'])
+        self.assertEqual(summary['target'], '1')
+        self.assertEqual(response.data['message'], 'Build started')
+
+    @patch('dockerservice_application.views.build_and_push_service')
+    def test_build_and_push_docker_rejects_invalid_dockerfile(self, mock_build_and_push_service):
+
+        uploads = [
+            (SimpleUploadedFile('MyDockerFile', b"FROM busybox\nRUNN echo hello\n"), 'line 2: unknown instruction: RUNN'),
+            (SimpleUploadedFile('context.tar.gz', b"archive content"), 'not a valid tar archive'),
+            (create_context_archive({'app.py': b""}), 'Dockerfile Dockerfile not found in the build context'),
+        ]
+
+        factory = APIRequestFactory()
+        for mock_file, message in uploads:
+            request = factory.post('/build-push/', data={'file': mock_file, 'image_name': 'test_image', 'image_tag': 'latest'},
+                                   format='multipart')
+
+            response = build_and_push_docker(request)
+
+            self.assertEqual(response.data['status'], status.HTTP_400_BAD_REQUEST)
+            self.assertIn(message, str(response.data['message']))
+
+        mock_build_and_push_service.assert_not_called()
+
+    @override_settings(BUILD_CONTEXT_MAX_SIZE=10)
+    @patch('dockerservice_application.views.build_and_push_service')
+    def test_build_and_push_docker_rejects_large_upload(self, mock_build_and_push_service):
+
+        mock_file = SimpleUploadedFile('context.tar', b"x" * 100)
+
+        factory = APIRequestFactory()
+        request_data = {'file': mock_file, 'image_name': 'test_image', 'image_tag': 'latest'}
+        request = factory.post('/build-push/', data=request_data, format='multipart')
+
+        response = build_and_push_docker(request)
+
+        mock_build_and_push_service.assert_not_called()
+        self.assertEqual(response.data['status'], status.HTTP_400_BAD_REQUEST)
+        self.assertIn('larger than 10 bytes', response.data['message'])
+
+    @patch('dockerservice_application.views.build_and_push_service')
+    def test_build_and_push_docker_service_error(self, mock_build_and_push_service):
+
+        mock_build_and_push_service.side_effect = OSError("No space left on device")
+        mock_file = SimpleUploadedFile('Dockerfile', b"FROM busybox")
+
+        factory = APIRequestFactory()
+        request_data = {'file': mock_file, 'image_name': 'test_image', 'image_tag': 'latest'}
+        request = factory.post('/build-push/', data=request_data, format='multipart')
+
+        response = build_and_push_docker(request)
+
+        self.assertEqual(response.data['status'], status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(response.data['message'], "Error while starting the build")
+
+    @patch('dockerservice_application.views.build_and_push_service')
+    def test_build_and_push_docker_rejects_dockerfile_outside_context(self, mock_build_and_push_service):
+
+        mock_file = SimpleUploadedFile('context.tar', b"archive content")
+
+        factory = APIRequestFactory()
+        request_data = {'file': mock_file, 'image_name': 'test_image', 'image_tag': 'latest', 'dockerfile': '../Dockerfile'}
+        request = factory.post('/build-push/', data=request_data, format='multipart')
+
+        response = build_and_push_docker(request)
+
+        mock_build_and_push_service.assert_not_called()
+        self.assertEqual(response.data['status'], status.HTTP_400_BAD_REQUEST)
+
+    @patch("dockerservice_application.models.push.objects.filter")
     @patch("dockerservice_application.models.build.objects.get")
-    def test_get_build_push_status(self, mock_build_objects_get, mock_push_objects_get):
+    def test_get_build_push_status(self, mock_build_objects_get, mock_push_objects_filter):
         
         factory = APIRequestFactory()
 
@@ -73,7 +188,7 @@ class BuildAndPushDockerViewTest(TestCase):
         mock_push_obj.push_id = push_id
         mock_push_obj.failed_reason = reason
 
-        mock_push_objects_get.return_value = mock_push_obj
+        mock_push_objects_filter.return_value = [mock_push_obj]
 
         request = factory.get("/build-push-status/?build_id=585c7054-2e6a-45e9-80fc-92cd3c153ca1")
         response = get_build_push_status(request)
@@ -89,10 +204,11 @@ class BuildAndPushDockerViewTest(TestCase):
         self.assertEqual(response_body['Push Fail Reason'], mock_push_obj.failed_reason)
         
 
+    @patch("dockerservice_application.views.clear_cancellation")
     @patch("dockerservice_application.views.async_task")
-    @patch("dockerservice_application.models.push.objects.get")
+    @patch("dockerservice_application.models.push.objects.filter")
     @patch("dockerservice_application.models.build.objects.get")    
-    def test_retry_failed_build(self, mock_build_objects_get, mock_push_objects_get, mock_async_methods):
+    def test_retry_failed_build(self, mock_build_objects_get, mock_push_objects_filter, mock_async_methods, mock_clear_cancellation):
 
         factory = APIRequestFactory()
 
@@ -116,7 +232,7 @@ class BuildAndPushDockerViewTest(TestCase):
         mock_push_obj.push_id = push_id
         mock_push_obj.failed_reason = reason
 
-        mock_push_objects_get.return_value = mock_push_obj
+        mock_push_objects_filter.return_value = [mock_push_obj]
 
 
         mock_async_methods.return_value = 'task_id'
@@ -129,10 +245,40 @@ class BuildAndPushDockerViewTest(TestCase):
         self.assertEquals(response.data['message'], 'Rebuild started')
         self.assertEquals(response.data['build_id'], build_id)
 
+    @patch("dockerservice_application.views.clear_cancellation")
+    @patch("dockerservice_application.views.enqueue_pushes")
     @patch("dockerservice_application.views.async_task")
-    @patch("dockerservice_application.models.push.objects.get")
+    @patch("dockerservice_application.models.push.objects.filter")
     @patch("dockerservice_application.models.build.objects.get")    
-    def test_retry_completed_build(self, mock_build_objects_get, mock_push_objects_get, mock_async_methods):
+    def test_retry_failed_push(self, mock_build_objects_get, mock_push_objects_filter, mock_async_methods, mock_enqueue_pushes,
+                               mock_clear_cancellation):
+
+        factory = APIRequestFactory()
+
+        build_id = "585c7054-2e6a-45e9-80fc-92cd3c153ca1"
+        push_id = "485c7054-2e6a-45e9-80fc-92cd3c153ca1"
+
+        mock_build_obj = MagicMock()
+        mock_build_obj.status = "Completed"
+        mock_build_obj.build_id = build_id
+        mock_build_objects_get.return_value = mock_build_obj
+
+        mock_push_obj = MagicMock()
+        mock_push_obj.status = "Failed"
+        mock_push_obj.push_id = push_id
+        mock_push_objects_filter.return_value = [mock_push_obj]
+
+        request = factory.get("/retry-build/?build_id=585c7054-2e6a-45e9-80fc-92cd3c153ca1")
+        response = retry_build(request)
+
+        self.assertEqual(response.data['message'], 'Rebuild started')
+        mock_enqueue_pushes.assert_called_once_with(build_id, [push.ProcessStatus.FAILED])
+        mock_async_methods.assert_not_called()
+
+    @patch("dockerservice_application.views.async_task")
+    @patch("dockerservice_application.models.push.objects.filter")
+    @patch("dockerservice_application.models.build.objects.get")    
+    def test_retry_completed_build(self, mock_build_objects_get, mock_push_objects_filter, mock_async_methods):
 
         factory = APIRequestFactory()
 
@@ -156,7 +302,7 @@ class BuildAndPushDockerViewTest(TestCase):
         mock_push_obj.push_id = push_id
         mock_push_obj.failed_reason = reason
 
-        mock_push_objects_get.return_value = mock_push_obj
+        mock_push_objects_filter.return_value = [mock_push_obj]
 
         mock_async_methods.return_value = 'task_id'
 
@@ -169,15 +315,673 @@ class BuildAndPushDockerViewTest(TestCase):
         self.assertEquals(response.data['build_id'], build_id)
 
 
+class BuildAndPushServiceTest(TestCase):
+
+    def create_dockerfile(self):
+        file_content = b"FROM busybox:latest"
+        return InMemoryUploadedFile(io.BytesIO(file_content), None, 'MyDockerFile', 'text/plain', len(file_content), None)
+
+    @patch("dockerservice_application.views.__save_file")
+    @patch("dockerservice_application.views.redis_lock")
+    @patch("dockerservice_application.views.async_task")
+    def test_duplicate_build_is_coalesced(self, mock_async_task, mock_redis_lock, mock_save_file):
+
+        mock_save_file.return_value = ("uploaded_files/build/", "MyDockerFile")
+
+        build_id, reused = build_and_push_service(self.create_dockerfile(), 'test_image', 'latest')
+        duplicate_build_id, duplicate_reused = build_and_push_service(self.create_dockerfile(), 'test_image', 'latest')
+
+        self.assertFalse(reused)
+        self.assertTrue(duplicate_reused)
+        self.assertEqual(duplicate_build_id, build_id)
+        self.assertEqual(build.objects.count(), 1)
+        mock_async_task.assert_called_once()
+
+    @patch("dockerservice_application.views.enqueue_prefetch")
+    @patch("dockerservice_application.views.__save_file")
+    @patch("dockerservice_application.views.redis_lock")
+    @patch("dockerservice_application.views.async_task")
+    def test_dockerfile_summary_is_stored(self, mock_async_task, mock_redis_lock, mock_save_file, mock_enqueue_prefetch):
+
+        mock_save_file.return_value = ("uploaded_files/build/", "MyDockerFile")
+        summary = {"stages": [{"name": None, "base": "busybox:latest", "platform": None, "depends_on": []}],
+                   "base_images": ["busybox:latest"]}
+
+        build_id, reused = build_and_push_service(self.create_dockerfile(), 'test_image', 'latest', dockerfile_summary=summary)
+        other_build_id, other_reused = build_and_push_service(self.create_dockerfile(), 'test_image', 'v2')
+
+        self.assertEqual(build.objects.get(build_id=build_id).dockerfile_summary, summary)
+        self.assertEqual(build.objects.get(build_id=other_build_id).dockerfile_summary, {})
+        mock_enqueue_prefetch.assert_any_call('test_image', ['busybox:latest'])
+
+    @patch("dockerservice_application.views.__save_file")
+    @patch("dockerservice_application.views.redis_lock")
+    @patch("dockerservice_application.views.async_task")
+    def test_failed_build_is_not_reused(self, mock_async_task, mock_redis_lock, mock_save_file):
+
+        mock_save_file.return_value = ("uploaded_files/build/", "MyDockerFile")
+
+        build_id, reused = build_and_push_service(self.create_dockerfile(), 'test_image', 'latest')
+        build.objects.filter(build_id=build_id).update(status=build.ProcessStatus.FAILED)
+
+        new_build_id, new_reused = build_and_push_service(self.create_dockerfile(), 'test_image', 'latest')
+        other_tag_build_id, other_tag_reused = build_and_push_service(self.create_dockerfile(), 'test_image', 'v2')
+
+        self.assertFalse(new_reused)
+        self.assertFalse(other_tag_reused)
+        self.assertNotEqual(new_build_id, build_id)
+        self.assertEqual(mock_async_task.call_count, 3)
+
+    @patch("dockerservice_application.views.__save_file")
+    @patch("dockerservice_application.views.redis_lock")
+    @patch("dockerservice_application.views.async_task")
+    def test_build_which_can_not_be_enqueued_is_failed(self, mock_async_task, mock_redis_lock, mock_save_file):
+
+        mock_save_file.return_value = ("uploaded_files/build/", "MyDockerFile")
+        mock_async_task.side_effect = ConnectionError("Redis is unavailable")
+
+        with self.assertRaises(ConnectionError):
+            build_and_push_service(self.create_dockerfile(), 'test_image', 'latest')
+
+        failed_build = build.objects.get()
+        self.assertEqual(failed_build.status, build.ProcessStatus.FAILED)
+        self.assertEqual(list(push.objects.values_list('status', flat=True)), [push.ProcessStatus.FAILED])
+
+        # The task is enqueued while the lock is held, and the failed build is not reused
+        mock_redis_lock.reset_mock()
+        mock_async_task.side_effect = lambda *args, **kwargs: mock_redis_lock.return_value.__exit__.assert_not_called()
+        new_build_id, new_reused = build_and_push_service(self.create_dockerfile(), 'test_image', 'latest')
+
+        self.assertFalse(new_reused)
+        self.assertNotEqual(new_build_id, str(failed_build.build_id))
+
+
+class MultipleTargetsTest(TestCase):
+
+    def create_dockerfile(self):
+        return SimpleUploadedFile('MyDockerFile', b"FROM busybox:latest")
+
+    @patch("dockerservice_application.services.docker_service.namespace", None)
+    @patch("dockerservice_application.views.__save_file")
+    @patch("dockerservice_application.views.redis_lock")
+    @patch("dockerservice_application.views.async_task")
+    def test_targets_get_own_pushes(self, mock_async_task, mock_redis_lock, mock_save_file):
+        mock_save_file.return_value = ("uploaded_files/build/", "MyDockerFile")
+        targets = ['test_image:1.4', 'registry.example.com/team/test_image:1.4', 'test_image:latest']
+
+        build_id, reused = build_and_push_service(self.create_dockerfile(), 'test_image', 'latest', '', targets)
+        other_build_id, other_reused = build_and_push_service(self.create_dockerfile(), 'test_image', 'latest')
+
+        self.assertFalse(other_reused)
+        self.assertEqual(set(push.objects.filter(build_id=build_id).values_list('repository_name', flat=True)),
+                         {'test_image:latest', 'test_image:1.4', 'registry.example.com/team/test_image:1.4'})
+
+        push.objects.filter(build_id=build_id, repository_name='test_image:latest').update(status=push.ProcessStatus.COMPLETED)
+        push.objects.filter(build_id=build_id, repository_name='test_image:1.4').update(status=push.ProcessStatus.FAILED,
+                                                                                       failed_reason="Failed to Push the image")
+        request = APIRequestFactory().get('/build-push-status', {'build_id': build_id})
+        data = get_build_push_status(request).data['build_status']
+
+        self.assertEqual(data['push_status'], push.ProcessStatus.IN_PROGRESS)
+        self.assertEqual(len(data['pushes']), 3)
+
+        push.objects.filter(build_id=build_id, status=push.ProcessStatus.PENDING).update(status=push.ProcessStatus.COMPLETED)
+        data = get_build_push_status(request).data['build_status']
+
+        self.assertEqual(data['push_status'], push.ProcessStatus.FAILED)
+        self.assertEqual(data['Push Fail Reason'], "test_image:1.4: Failed to Push the image")
+        self.assertEqual(get_batch_status_data([build_id])[0], data)
+
+    @patch('dockerservice_application.views.build_and_push_service')
+    def test_invalid_target_is_rejected(self, mock_build_and_push_service):
+        for target in ('Invalid Image', 'test_image@sha256:abc', 'test_image:bad/tag'):
+            request = APIRequestFactory().post('/build-push/', format='multipart', data={
+                'file': self.create_dockerfile(), 'image_name': 'test_image', 'image_tag': 'latest', 'targets': [target]})
+            self.assertEqual(build_and_push_docker(request).data['status'], status.HTTP_400_BAD_REQUEST)
+
+        mock_build_and_push_service.assert_not_called()
+
+
+@patch('dockerservice_application.services.docker_service.publish_status_change')
+@patch('dockerservice_application.services.docker_service.request_cancellation')
+class CancelBuildViewTest(TestCase):
+
+    def test_cancel_build(self, mock_request_cancellation, mock_publish_status_change):
+        build_obj = build.objects.create(image_name="test_image", image_tag="latest", status=build.ProcessStatus.COMPLETED)
+        completed_push = push.objects.create(build=build_obj, image_name="test_image", image_tag="latest",
+                                             status=push.ProcessStatus.COMPLETED)
+        running_push = push.objects.create(build=build_obj, image_name="test_image", image_tag="1.4",
+                                           status=push.ProcessStatus.IN_PROGRESS)
+        request = APIRequestFactory().post(f"/cancel-build/?build_id={build_obj.build_id}")
+
+        response = cancel_build(request)
+
+        self.assertEqual(response.data['status'], status.HTTP_200_OK)
+        self.assertEqual(response.data['message'], "Build cancelled")
+        mock_request_cancellation.assert_called_once_with(str(build_obj.build_id))
+        completed_push.refresh_from_db()
+        running_push.refresh_from_db()
+        self.assertEqual(completed_push.status, push.ProcessStatus.COMPLETED)
+        self.assertEqual(running_push.status, push.ProcessStatus.CANCELLED)
+        self.assertEqual(get_status_data(build_obj.build_id)['push_status'], push.ProcessStatus.CANCELLED)
+
+        response = cancel_build(request)
+
+        self.assertEqual(response.data['status'], status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], "Build and Push already finished")
+
+    def test_cancel_pending_build(self, mock_request_cancellation, mock_publish_status_change):
+        build_obj = build.objects.create(image_name="test_image", image_tag="latest")
+        push_obj = push.objects.create(build=build_obj, image_name="test_image", image_tag="latest")
+
+        response = cancel_build(APIRequestFactory().post(f"/cancel-build/?build_id={build_obj.build_id}"))
+
+        self.assertEqual(response.data['status'], status.HTTP_200_OK)
+        data = get_status_data(build_obj.build_id)
+        self.assertEqual(data['build_status'], build.ProcessStatus.CANCELLED)
+        self.assertEqual(data['push_status'], push.ProcessStatus.CANCELLED)
+        self.assertEqual(build.objects.get(build_id=build_obj.build_id).failed_reason, "Cancelled by request")
+
+    @patch("dockerservice_application.views.clear_cancellation")
+    @patch("dockerservice_application.views.async_task")
+    def test_cancel_finished_build_does_not_abort_retry(self, mock_async_task, mock_clear_cancellation,
+                                                        mock_request_cancellation, mock_publish_status_change):
+        build_obj = build.objects.create(image_name="test_image", image_tag="latest", status=build.ProcessStatus.FAILED)
+        push.objects.create(build=build_obj, image_name="test_image", image_tag="latest", status=push.ProcessStatus.FAILED)
+
+        response = cancel_build(APIRequestFactory().post(f"/cancel-build/?build_id={build_obj.build_id}"))
+
+        self.assertEqual(response.data['status'], status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], "Build and Push already finished")
+        mock_request_cancellation.assert_not_called()
+
+        response = retry_build(APIRequestFactory().get(f"/retry-build/?build_id={build_obj.build_id}"))
+
+        self.assertEqual(response.data['message'], "Rebuild started")
+        mock_clear_cancellation.assert_called_once_with(str(build_obj.build_id))
+        mock_async_task.assert_called_once()
+
+    def test_cancel_unknown_build(self, mock_request_cancellation, mock_publish_status_change):
+        for url in ("/cancel-build/", "/cancel-build/?build_id=invalid",
+                    "/cancel-build/?build_id=585c7054-2e6a-45e9-80fc-92cd3c153ca1"):
+            response = cancel_build(APIRequestFactory().post(url))
+            self.assertEqual(response.data['status'], status.HTTP_400_BAD_REQUEST)
+
+        mock_request_cancellation.assert_not_called()
+
+
+class BuildTimeoutTest(TestCase):
+
+    def create_dockerfile(self):
+        return SimpleUploadedFile('MyDockerFile', b"FROM busybox:latest")
+
+    @patch('dockerservice_application.views.build_and_push_service', return_value=('585c7054-2e6a-45e9-80fc-92cd3c153ca1', False))
+    def test_timeouts_are_validated(self, mock_build_and_push_service):
+        request = APIRequestFactory().post('/build-push/', format='multipart', data={
+            'file': self.create_dockerfile(), 'image_name': 'test_image', 'image_tag': 'latest', 'build_timeout': 60})
+
+        self.assertEqual(build_and_push_docker(request).data['status'], status.HTTP_200_OK)
+        mock_build_and_push_service.assert_called_once_with(ANY, 'test_image', 'latest', '', [], dockerfile_summary=ANY,
+                                                            timeouts={'build': 60, 'push': None})
+
+        for timeouts in ({'build_timeout': 0}, {'push_timeout': 100000}):
+            request = APIRequestFactory().post('/build-push/', format='multipart', data={
+                'file': self.create_dockerfile(), 'image_name': 'test_image', 'image_tag': 'latest', **timeouts})
+            self.assertEqual(build_and_push_docker(request).data['status'], status.HTTP_400_BAD_REQUEST)
+
+    @patch("dockerservice_application.views.enqueue_prefetch")
+    @patch("dockerservice_application.views.__save_file", return_value=("uploaded_files/build/", "MyDockerFile"))
+    @patch("dockerservice_application.views.redis_lock")
+    @patch("dockerservice_application.views.async_task")
+    def test_timeouts_are_stored(self, mock_async_task, mock_redis_lock, mock_save_file, mock_enqueue_prefetch):
+        build_id, reused = build_and_push_service(self.create_dockerfile(), 'test_image', 'latest', '', ['test_image:1.4'],
+                                                  timeouts={'build': 60, 'push': 30})
+
+        self.assertEqual(build.objects.get(build_id=build_id).timeout, 60)
+        self.assertEqual(list(push.objects.filter(build_id=build_id).values_list('timeout', flat=True)), [30, 30])
+
+
+@override_settings(UPLOADED_FILES_DIR=tempfile.mkdtemp())
+@patch("dockerservice_application.views.enqueue_prefetch")
+@patch("dockerservice_application.views.async_task")
+class BulkBuildAndPushViewTest(TestCase):
+
+    def setUp(self):
+        redis_lock_patcher = patch("dockerservice_application.views.redis_lock")
+        self.mock_redis_lock = redis_lock_patcher.start()
+        self.addCleanup(redis_lock_patcher.stop)
+
+    def post(self, files, image_names, image_tags, **fields):
+        request = APIRequestFactory().post('/build-push/bulk', format='multipart',
+                                           data={'file': files, 'image_name': image_names, 'image_tag': image_tags, **fields})
+        return bulk_build_and_push_docker(request)
+
+    def test_bulk_build_and_push_docker(self, mock_async_task, mock_enqueue_prefetch):
+        existing_build = build.objects.create(status=build.ProcessStatus.IN_PROGRESS, image_name='test_image', image_tag='v0',
+                                              content_hash=hashlib.sha256(b"FROM busybox:0").hexdigest())
+        push.objects.create(build=existing_build, image_name='test_image', image_tag='v0')
+
+        files = [SimpleUploadedFile('Dockerfile', content) for content in
+                 (b"FROM busybox:0", b"FROM busybox:1", b"FROM busybox:1", b"FROM busybox:2")]
+        response = self.post(files, ['test_image'] * 4, ['v0', 'v1', 'v1', 'v2'])
+
+        self.assertEqual(response.data['status'], status.HTTP_200_OK)
+        builds = response.data['builds']
+        self.assertEqual([entry['reused'] for entry in builds], [True, False, True, False])
+        self.assertEqual(builds[0]['build_id'], str(existing_build.build_id))
+        self.assertEqual(builds[1]['build_id'], builds[2]['build_id'])
+        self.assertEqual(build.objects.count(), 3)
+        self.assertEqual(push.objects.count(), 3)
+
+        self.assertEqual(mock_async_task.call_count, 2)
+        self.assertEqual({call.kwargs['group'] for call in mock_async_task.call_args_list}, {response.data['group_id']})
+        self.assertEqual([call.args for call in mock_enqueue_prefetch.call_args_list],
+                         [('test_image', ['busybox:1']), ('test_image', ['busybox:2'])])
+
+        request = APIRequestFactory().get('/build-push-status/group', {'group_id': response.data['group_id']})
+        group_status = get_build_push_group_status(request).data['group_status']
+
+        self.assertEqual(group_status['total'], 3)
+        self.assertEqual(group_status['finished'], 0)
+        self.assertEqual(group_status['build_statuses'], {"In Progress": 1, "Pending": 2})
+        self.assertEqual(group_status['push_statuses'], {"Pending": 3})
+
+    def test_bulk_build_and_push_docker_rejects_invalid_entries(self, mock_async_task, mock_enqueue_prefetch):
+        response = self.post([SimpleUploadedFile('Dockerfile', b"FROM busybox")], ['test_image', 'other_image'], ['latest'])
+        self.assertEqual(response.data['status'], status.HTTP_400_BAD_REQUEST)
+
+        files = [SimpleUploadedFile('Dockerfile', b"FROM busybox"), SimpleUploadedFile('Dockerfile.txt', b"FROM busybox")]
+        response = self.post(files, ['test_image', 'test_image'], ['latest', 'latest'])
+        self.assertEqual(response.data['status'], status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'][0]['index'], 1)
+
+        self.assertEqual(build.objects.count(), 0)
+        mock_async_task.assert_not_called()
+
+    def test_bulk_build_and_push_docker_locks_content_keys(self, mock_async_task, mock_enqueue_prefetch):
+        files = [SimpleUploadedFile('Dockerfile', content) for content in (b"FROM busybox:1", b"FROM busybox:0", b"FROM busybox:1")]
+        response = self.post(files, ['test_image'] * 3, ['v1', 'v0', 'v1'])
+
+        self.assertEqual(response.data['status'], status.HTTP_200_OK)
+        lock_names = [call.args[0] for call in self.mock_redis_lock.call_args_list]
+        self.assertEqual(lock_names, sorted(f"build-push:{hashlib.sha256(content).hexdigest()}:test_image:{tag}"
+                                            for content, tag in ((b"FROM busybox:0", 'v0'), (b"FROM busybox:1", 'v1'))))
+        self.assertEqual(self.mock_redis_lock.return_value.__exit__.call_count, 2)
+
+    def test_bulk_build_and_push_docker_timeouts(self, mock_async_task, mock_enqueue_prefetch):
+        files = [SimpleUploadedFile('Dockerfile', content) for content in (b"FROM busybox:0", b"FROM busybox:1")]
+        response = self.post(files, ['test_image'] * 2, ['v0', 'v1'], build_timeout=['60', ''], push_timeout=['', '30'])
+
+        self.assertEqual(response.data['status'], status.HTTP_200_OK)
+        first_build, second_build = (build.objects.get(build_id=entry['build_id']) for entry in response.data['builds'])
+        self.assertEqual((first_build.timeout, second_build.timeout), (60, None))
+        self.assertEqual(push.objects.get(build=first_build).timeout, None)
+        self.assertEqual(push.objects.get(build=second_build).timeout, 30)
+
+    @override_settings(BUILD_CONTEXT_MAX_SIZE=20, BULK_SUBMISSION_MAX_SIZE=40)
+    def test_bulk_build_and_push_docker_rejects_large_submission(self, mock_async_task, mock_enqueue_prefetch):
+        files = [SimpleUploadedFile('Dockerfile', f"FROM busybox:{index}".encode()) for index in range(3)]
+        response = self.post(files, ['test_image'] * 3, ['v0', 'v1', 'v2'])
+
+        self.assertEqual(response.data['status'], status.HTTP_400_BAD_REQUEST)
+        self.assertIn('larger than 40 bytes', response.data['message'])
+        self.assertEqual(build.objects.count(), 0)
+
+    def test_bulk_build_and_push_docker_enqueue_error(self, mock_async_task, mock_enqueue_prefetch):
+        mock_async_task.side_effect = [None, ConnectionError("Redis is unavailable")]
+        files = [SimpleUploadedFile('Dockerfile', content) for content in (b"FROM busybox:0", b"FROM busybox:1")]
+        response = self.post(files, ['test_image'] * 2, ['v0', 'v1'])
+
+        self.assertEqual(response.data['status'], status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(response.data['message'], "Error while starting the builds")
+        self.assertEqual(mock_async_task.call_count, 2)
+        self.assertEqual(sorted(build.objects.values_list('status', flat=True)), [build.ProcessStatus.FAILED, build.ProcessStatus.PENDING])
+        failed_build = build.objects.get(status=build.ProcessStatus.FAILED)
+        self.assertEqual(failed_build.image_tag, 'v1')
+        self.assertEqual(push.objects.get(build=failed_build).status, push.ProcessStatus.FAILED)
+        self.assertEqual(self.mock_redis_lock.return_value.__exit__.call_count, 2)
+
+    def test_bulk_build_and_push_docker_rejects_targets(self, mock_async_task, mock_enqueue_prefetch):
+        response = self.post([SimpleUploadedFile('Dockerfile', b"FROM busybox")], ['test_image'], ['latest'],
+                             targets=['test_image:1.4'])
+
+        self.assertEqual(response.data['status'], status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(build.objects.count(), 0)
+        mock_async_task.assert_not_called()
+
+    def test_group_status_invalid_group_id(self, mock_async_task, mock_enqueue_prefetch):
+        for group_id in ("not-a-group-id", "585c7054-2e6a-45e9-80fc-92cd3c153ca1"):
+            request = APIRequestFactory().get('/build-push-status/group', {'group_id': group_id})
+            self.assertEqual(get_build_push_group_status(request).data['status'], status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(BUILD_LOG_DIR=tempfile.mkdtemp())
+class BuildLogsViewTest(TestCase):
+
+    def setUp(self):
+        self.build_obj = build.objects.create(status=build.ProcessStatus.COMPLETED, image_name='test_image', image_tag='latest')
+        with open_build_log(self.build_obj.build_id) as build_log:
+            build_log.write(b"Step 1/2 : FROM busybox\nSuccessfully built 1234\n")
+
+    def test_get_build_logs_range(self):
+
+        factory = APIRequestFactory()
+        request = factory.get(f"/build-logs/?build_id={self.build_obj.build_id}&offset=5&length=3")
+        response = get_build_logs(request)
+
+        self.assertEqual(response.data['status'], status.HTTP_200_OK)
+        self.assertEqual(response.data['logs'], '1/2')
+        self.assertEqual(response.data['next_offset'], 8)
+
+    def test_follow_build_logs(self):
+
+        factory = APIRequestFactory()
+        request = factory.get(f"/build-logs/?build_id={self.build_obj.build_id}&follow=true")
+        response = get_build_logs(request)
+
+        self.assertEqual(b"".join(response.streaming_content), b"Step 1/2 : FROM busybox\nSuccessfully built 1234\n")
+
+    def test_get_build_logs_invalid_build_id(self):
+
+        factory = APIRequestFactory()
+        request = factory.get("/build-logs/?build_id=../../etc/passwd")
+        response = get_build_logs(request)
+
+        self.assertEqual(response.data['status'], status.HTTP_400_BAD_REQUEST)
+
+
+@patch("dockerservice_application.services.status_service.get_redis_connection")
+class BuildPushStatusWaitViewTest(TestCase):
+
+    def setUp(self):
+        self.build_obj = build.objects.create(status=build.ProcessStatus.IN_PROGRESS, image_name='test_image', image_tag='latest')
+        self.push_obj = push.objects.create(build=self.build_obj, status=push.ProcessStatus.PENDING, image_name='test_image', image_tag='latest')
+
+    def test_wait_returns_changed_status_immediately(self, mock_redis_connection):
+
+        factory = APIRequestFactory()
+        request = factory.get(f"/build-push-status/wait/?build_id={self.build_obj.build_id}&build_status=Pending&push_status=Pending")
+        response = wait_build_push_status(request)
+
+        self.assertEqual(response.data['status'], status.HTTP_200_OK)
+        self.assertTrue(response.data['changed'])
+        self.assertEqual(response.data['build_status']['build_status'], build.ProcessStatus.IN_PROGRESS)
+        mock_redis_connection.return_value.pubsub.return_value.get_message.assert_not_called()
+
+    def test_wait_returns_on_notification(self, mock_redis_connection):
+
+        def complete_build(timeout):
+            build.objects.filter(build_id=self.build_obj.build_id).update(status=build.ProcessStatus.COMPLETED)
+            return {'type': 'message', 'data': b'{}'}
+
+        mock_redis_connection.return_value.pubsub.return_value.get_message.side_effect = complete_build
+
+        factory = APIRequestFactory()
+        request = factory.get(f"/build-push-status/wait/?build_id={self.build_obj.build_id}&build_status=In Progress&push_status=Pending")
+        response = wait_build_push_status(request)
+
+        self.assertTrue(response.data['changed'])
+        self.assertEqual(response.data['build_status']['build_status'], build.ProcessStatus.COMPLETED)
+
+    def test_wait_times_out_without_change(self, mock_redis_connection):
+
+        mock_redis_connection.return_value.pubsub.return_value.get_message.return_value = None
+
+        factory = APIRequestFactory()
+        request = factory.get(f"/build-push-status/wait/?build_id={self.build_obj.build_id}&build_status=In Progress&push_status=Pending&timeout=0.01")
+        response = wait_build_push_status(request)
+
+        self.assertFalse(response.data['changed'])
+
+    def test_stream_ends_on_final_status(self, mock_redis_connection):
+
+        build.objects.filter(build_id=self.build_obj.build_id).update(status=build.ProcessStatus.COMPLETED)
+        push.objects.filter(push_id=self.push_obj.push_id).update(status=push.ProcessStatus.COMPLETED)
+
+        factory = APIRequestFactory()
+        request = factory.get(f"/build-push-status/stream/?build_id={self.build_obj.build_id}")
+        response = stream_build_push_status(request)
+        events = b"".join(response.streaming_content).decode().strip().split("\n\n")
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(len(events), 1)
+        self.assertIn('"push_status": "Completed"', events[0])
+
+
+class BatchBuildPushStatusViewTest(TestCase):
+
+    def setUp(self):
+        self.completed_build = build.objects.create(status=build.ProcessStatus.COMPLETED, image_name='test_image', image_tag='latest')
+        push.objects.create(build=self.completed_build, status=push.ProcessStatus.COMPLETED, image_name='test_image', image_tag='latest')
+        self.failed_build = build.objects.create(status=build.ProcessStatus.FAILED, failed_reason='Error while building the image', image_name='test_image', image_tag='v2')
+        push.objects.create(build=self.failed_build, status=push.ProcessStatus.FAILED, failed_reason='Error while building the image', image_name='test_image', image_tag='v2')
+
+    def test_batch_status_post(self):
+
+        unknown_build_id = "585c7054-2e6a-45e9-80fc-92cd3c153ca1"
+        build_ids = [str(self.completed_build.build_id), "invalid", unknown_build_id, str(self.failed_build.build_id)]
+
+        factory = APIRequestFactory()
+        request = factory.post("/build-push-status/batch/", data={'build_ids': build_ids}, format='json')
+
+        with self.assertNumQueries(1):
+            response = get_batch_build_push_status(request)
+
+        statuses = response.data['build_statuses']
+        self.assertEqual(response.data['status'], status.HTTP_200_OK)
+        self.assertEqual([item['build_id'] for item in statuses], build_ids)
+        self.assertEqual(statuses[0]['push_status'], push.ProcessStatus.COMPLETED)
+        self.assertEqual(statuses[1]['message'], 'Invalid build id')
+        self.assertEqual(statuses[2]['message'], 'Build not found')
+        self.assertEqual(statuses[3]['Build Fail Reason'], 'Error while building the image')
+
+    def test_batch_status_get(self):
+
+        factory = APIRequestFactory()
+        request = factory.get(f"/build-push-status/batch/?build_id={self.completed_build.build_id}&build_id={self.failed_build.build_id}")
+        response = get_batch_build_push_status(request)
+
+        self.assertEqual(len(response.data['build_statuses']), 2)
+
+    def test_batch_status_without_build_ids(self):
+
+        factory = APIRequestFactory()
+        request = factory.post("/build-push-status/batch/", data={}, format='json')
+        response = get_batch_build_push_status(request)
+
+        self.assertEqual(response.data['status'], status.HTTP_400_BAD_REQUEST)
+
+
+STATUS_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'status': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'status-cache-test'},
+}
+
+@override_settings(CACHES=STATUS_CACHES)
+class StatusCacheTest(TestCase):
+
+    def setUp(self):
+        caches['status'].clear()
+        self.build_obj = build.objects.create(status=build.ProcessStatus.IN_PROGRESS, image_name='test_image', image_tag='latest')
+        self.push_obj = push.objects.create(build=self.build_obj, image_name='test_image', image_tag='latest')
+
+    def get_status(self, **headers):
+        factory = APIRequestFactory()
+        request = factory.get(f"/build-push-status/?build_id={self.build_obj.build_id}", **headers)
+        return get_build_push_status(request)
+
+    def test_not_modified_without_database_query(self):
+
+        response = self.get_status()
+        etag = response['ETag']
+        self.assertEqual(response.data['build_status']['build_status'], build.ProcessStatus.IN_PROGRESS)
+
+        with self.assertNumQueries(0):
+            response = self.get_status(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    @patch('dockerservice_application.services.docker_service.publish_status_change')
+    def test_status_transition_refreshes_cache(self, mock_publish_status_change):
+
+        etag = self.get_status()['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            update_build_status(self.build_obj.build_id, build.ProcessStatus.COMPLETED)
+
+        with self.assertNumQueries(0):
+            response = self.get_status(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['build_status']['build_status'], build.ProcessStatus.COMPLETED)
+
+    def test_stale_read_does_not_replace_newer_status(self):
+
+        with patch('dockerservice_application.services.status_data_service.get_status_data') as mock_get_status_data:
+            def transition_during_read(build_id):
+                stale_data = get_status_data(build_id)
+                build.objects.filter(build_id=build_id).update(status=build.ProcessStatus.COMPLETED)
+                mock_get_status_data.side_effect = get_status_data
+                refresh_status_cache(build_id)
+                return stale_data
+            mock_get_status_data.side_effect = transition_during_read
+
+            self.assertEqual(get_cached_status(self.build_obj.build_id)["data"]["build_status"], build.ProcessStatus.IN_PROGRESS)
+
+        self.assertEqual(self.get_status().data['build_status']['build_status'], build.ProcessStatus.COMPLETED)
+
+
+class PipelineStatusViewTest(TestCase):
+
+    @patch("dockerservice_application.views.get_stage_broker")
+    def test_get_pipeline_status(self, mock_get_stage_broker):
+
+        mock_get_stage_broker.return_value.queue_size.side_effect = [3, 7, 1]
+
+        factory = APIRequestFactory()
+        response = get_pipeline_status(factory.get("/pipeline-status/"))
+
+        stages = response.data['stages']
+        self.assertEqual(stages['build']['queue'], 'DjangoQ')
+        self.assertEqual(stages['build']['queued_tasks'], 3)
+        self.assertEqual(stages['push']['queue'], 'DjangoQPush')
+        self.assertEqual(stages['push']['queued_tasks'], 7)
+        self.assertEqual(stages['prefetch']['queue'], 'DjangoQPrefetch')
+        self.assertEqual(stages['prefetch']['queued_tasks'], 1)
+
+
+class MetricsViewTest(TestCase):
+
+    @patch("dockerservice_application.models.push.objects.filter")
+    @patch("dockerservice_application.models.build.objects.get")
+    def test_metrics_include_request_latency(self, mock_build_objects_get, mock_push_objects_filter):
+
+        factory = APIRequestFactory()
+        get_build_push_status(factory.get("/build-push-status/?build_id=585c7054-2e6a-45e9-80fc-92cd3c153ca1"))
+
+        response = metrics(factory.get("/metrics"))
+        content = response.content.decode()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('dockerservice_request_duration_seconds_count{view="build_push_status"}', content)
+        self.assertIn('dockerservice_queue_wait_seconds', content)
+
+
+class AsyncViewTest(TransactionTestCase):
+
+    def setUp(self):
+        self.build_obj = build.objects.create(image_name="my_busy_box_image", image_tag="latest",
+                                              status=build.ProcessStatus.COMPLETED)
+        self.push_obj = push.objects.create(build=self.build_obj, image_name="my_busy_box_image", image_tag="latest",
+                                            status=push.ProcessStatus.IN_PROGRESS)
+        self.build_id = str(self.build_obj.build_id)
+
+    def call(self, view, request):
+        response = async_to_sync(view)(request)
+        return json.loads(response.content)
+
+    @patch('dockerservice_application.views.build_and_push_service')
+    def test_async_build_and_push_docker(self, mock_build_and_push_service):
+        mock_build_and_push_service.return_value = (self.build_id, True)
+        request = RequestFactory().post('/async/build-push', data={
+            'file': SimpleUploadedFile('MyDockerFile', b"FROM busybox:latest"),
+            'image_name': 'test_image',
+            'image_tag': 'latest',
+        })
+
+        data = self.call(async_build_and_push_docker, request)
+
+        mock_build_and_push_service.assert_called_once_with(ANY, 'test_image', 'latest', '', [], dockerfile_summary=ANY, timeouts=ANY)
+        self.assertEqual(data, {'status': status.HTTP_200_OK, 'message': "Build already exists", 'build_id': self.build_id})
+
+    @patch('dockerservice_application.views.build_and_push_service')
+    def test_async_build_and_push_docker_validates_outside_event_loop(self, mock_build_and_push_service):
+        mock_build_and_push_service.return_value = (self.build_id, True)
+        request = RequestFactory().post('/async/build-push', data={
+            'file': SimpleUploadedFile('MyDockerFile', b"FROM busybox:latest"), 'image_name': 'test_image', 'image_tag': 'latest'})
+        event_loops = []
+
+        def read_dockerfile(*args, **kwargs):
+            try:
+                event_loops.append(asyncio.get_running_loop())
+            except RuntimeError:
+                event_loops.append(None)
+            return "FROM busybox:latest"
+
+        with patch('dockerservice_application.file_serializers.read_dockerfile', side_effect=read_dockerfile):
+            self.assertEqual(self.call(async_build_and_push_docker, request)['status'], status.HTTP_200_OK)
+
+        self.assertEqual(event_loops, [None])
+
+    @override_settings(BUILD_CONTEXT_MAX_SIZE=10)
+    @patch('dockerservice_application.views.build_and_push_service')
+    def test_async_build_and_push_docker_rejects_invalid_upload(self, mock_build_and_push_service):
+        request = RequestFactory().post('/async/build-push', data={
+            'file': SimpleUploadedFile('context.tar', b"x" * 100), 'image_name': 'test_image', 'image_tag': 'latest'})
+        self.assertEqual(self.call(async_build_and_push_docker, request)['status'], status.HTTP_400_BAD_REQUEST)
+
+        request = RequestFactory().post('/async/build-push', data={'image_name': 'test_image', 'image_tag': 'latest'})
+        self.assertEqual(self.call(async_build_and_push_docker, request)['status'], status.HTTP_400_BAD_REQUEST)
 
+        mock_build_and_push_service.assert_not_called()
 
+    def test_async_get_build_push_status(self):
+        request = RequestFactory().get('/async/build-push-status', {'build_id': self.build_id})
 
+        data = self.call(async_get_build_push_status, request)
 
+        self.assertEqual(data['status'], status.HTTP_200_OK)
+        self.assertEqual(data['build_status'], {'build_id': self.build_id, 'build_status': "Completed",
+                                                'push_status': "In Progress"})
 
+        request = RequestFactory().get('/async/build-push-status', {'build_id': "not-a-build-id"})
+        self.assertEqual(self.call(async_get_build_push_status, request)['status'], status.HTTP_400_BAD_REQUEST)
 
+    @patch('dockerservice_application.services.status_service.__listener_pid', os.getpid())
+    def test_async_wait_returns_on_notification(self):
+        def complete_push():
+            push.objects.filter(push_id=self.push_obj.push_id).update(status=push.ProcessStatus.COMPLETED)
+            notify_status_watchers(self.build_id)
 
+        timer = threading.Timer(0.2, complete_push)
+        timer.start()
+        request = RequestFactory().get('/async/build-push-status/wait', {
+            'build_id': self.build_id, 'build_status': "Completed", 'push_status': "In Progress", 'timeout': 10})
 
+        data = self.call(async_wait_build_push_status, request)
+        timer.join()
 
+        self.assertTrue(data['changed'])
+        self.assertEqual(data['build_status']['push_status'], "Completed")
 
+    @patch('dockerservice_application.services.status_service.__listener_pid', os.getpid())
+    def test_async_wait_times_out_without_change(self):
+        request = RequestFactory().get('/async/build-push-status/wait', {
+            'build_id': self.build_id, 'build_status': "Completed", 'push_status': "In Progress", 'timeout': 0.1})
 
+        data = self.call(async_wait_build_push_status, request)
 
+        self.assertFalse(data['changed'])
+        self.assertEqual(data['build_status']['push_status'], "In Progress")
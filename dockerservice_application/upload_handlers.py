@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    """
+    Upload handler which stops an upload as soon as it exceeds BUILD_CONTEXT_MAX_SIZE bytes.
+
+    It is installed in front of Django's default handlers and passes every chunk on to them, so
+    uploads are still spooled to a temporary file and never held in memory as a whole.
+    When the limit is exceeded, `upload_size_exceeded` is set on the request and the rest of the
+    request body is discarded without being stored. The uploads of a request with many files, like a bulk
+    submission, can be limited in total with total_max_size as well.
+    """
+
+    def __init__(self, request=None, total_max_size=None):
+        super().__init__(request)
+        self.total_max_size = total_max_size
+        self.total_size = 0
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        if self.content_length is not None and self.content_length > settings.BUILD_CONTEXT_MAX_SIZE:
+            self.__stop()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.total_size += len(raw_data)
+        if start + len(raw_data) > settings.BUILD_CONTEXT_MAX_SIZE:
+            self.__stop()
+        if self.total_max_size is not None and self.total_size > self.total_max_size:
+            self.__stop()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+    def __stop(self):
+        self.request.upload_size_exceeded = True
+        raise StopUpload(connection_reset=False)
@@ -4,6 +4,18 @@ from rest_framework.authtoken import views as auth_view
 
 urlpatterns = [
     path('build-push', views.build_and_push_docker ,name="build-push-endpoint"),
+    path('build-push/bulk', views.bulk_build_and_push_docker, name="build-push-bulk-endpoint"),
     path('build-push-status', views.get_build_push_status ,name="build-push-status-endpoint"),
-    path('retry-build', views.retry_build, name="retry-build-endpoint")
+    path('build-push-status/group', views.get_build_push_group_status, name="build-push-status-group-endpoint"),
+    path('build-push-status/batch', views.get_batch_build_push_status, name="build-push-status-batch-endpoint"),
+    path('build-push-status/wait', views.wait_build_push_status, name="build-push-status-wait-endpoint"),
+    path('build-push-status/stream', views.stream_build_push_status, name="build-push-status-stream-endpoint"),
+    path('retry-build', views.retry_build, name="retry-build-endpoint"),
+    path('cancel-build', views.cancel_build, name="cancel-build-endpoint"),
+    path('build-logs', views.get_build_logs, name="build-logs-endpoint"),
+    path('pipeline-status', views.get_pipeline_status, name="pipeline-status-endpoint"),
+    path('metrics', views.metrics, name="metrics-endpoint"),
+    path('async/build-push', views.async_build_and_push_docker, name="async-build-push-endpoint"),
+    path('async/build-push-status', views.async_get_build_push_status, name="async-build-push-status-endpoint"),
+    path('async/build-push-status/wait', views.async_wait_build_push_status, name="async-build-push-status-wait-endpoint")
     ]
\ No newline at end of file
@@ -1,62 +1,211 @@
 from rest_framework.decorators import api_view, parser_classes
 from rest_framework.response import Response
 from rest_framework import status
-from .services.docker_service import docker_build_push, docker_push
+from .services.docker_service import docker_build_push, enqueue_pushes, enqueue_prefetch, get_stage_broker, cancel_build_and_push
+from .services.docker_service import update_build_status, update_push_status
+from .services.docker_service import get_repository_name, get_target_repository_name, get_push_repository_name
+from .services.redis_service import redis_lock
+from .services.cancel_service import clear_cancellation
+from .services.build_log_service import read_build_log, follow_build_log
+from .services.status_service import wait_for_status_change, stream_status_changes, async_wait_for_status_change
+from .services.status_data_service import get_status_data, get_cached_status, format_status_data, aggregate_push_status, is_final_status
+from .services.async_service import database_sync_to_async
+from .services.metrics_service import observe_request_duration, generate_metrics
 
 from django_q.tasks import async_task
 
 import uuid
-from .models import build, push
+from .models import build, push, build_group_member
 from datetime import timedelta
+from contextlib import ExitStack
 from django.utils import timezone
 from django.db import transaction
+from django.conf import settings
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseNotAllowed, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
+from django.core.exceptions import ValidationError
 
 from rest_framework.parsers import MultiPartParser, FormParser
 from .file_serializers import FileUploadSerializer
+from .upload_handlers import MaxSizeUploadHandler
 import os
+import hashlib
+import json
+import time
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of seconds a long-poll status request waits for a change
+LONG_POLL_TIMEOUT = 60
+
+# Maximum number of seconds a status event stream stays open
+STATUS_STREAM_TIMEOUT = 900
+
+# Maximum number of build ids in a batch status request
+BATCH_STATUS_LIMIT = 500
+
+# Maximum number of images in a bulk submission
+BULK_SUBMISSION_LIMIT = 250
+
+# Seconds after which a lock on the content key of a submission expires, long enough to save its uploads
+BUILD_PUSH_LOCK_TIMEOUT = 300
+
+# Seconds after which the locks on the content keys of a bulk submission expire, long enough to save
+# BULK_SUBMISSION_MAX_SIZE bytes of uploads
+BULK_BUILD_PUSH_LOCK_TIMEOUT = 900
+
+@observe_request_duration('build_push')
 @api_view(['POST'])
 @parser_classes([MultiPartParser, FormParser])
 def build_and_push_docker(request):
     """
     View function to handle HTTP POST requests to take a dockerfile and build an image and push it to dockerhub.
 
+    The file is either a Dockerfile without extension, or a .tar, .tar.gz or .tgz build context archive
+    together with the path of the Dockerfile inside it. The upload is rejected as soon as it exceeds
+    BUILD_CONTEXT_MAX_SIZE bytes.
+
     Parameters:
-    - request: HttpRequest object containing the HTTP request data with input dockerfile, image name and image tag.
+    - request: HttpRequest object containing the HTTP request data with input dockerfile or build context, image name,
+      image tag and optionally the dockerfile path inside the build context, and repeated "targets" fields with
+      additional references the image is tagged and pushed as, e.g. my_image:1.4 or registry.example.com/my_image:1.4,
+      and optionally build_timeout and push_timeout in seconds after which the build or the push is aborted
 
     Returns:
     - JsonResponse: Acknowledgement about start of image bulid and push process
     """    
-    print("Starting build and push")
     logger.info('Starting build and push')
 
+    request.upload_handlers.insert(0, MaxSizeUploadHandler(request))
     serializer = FileUploadSerializer(data=request.data)
 
+    if getattr(request, 'upload_size_exceeded', False):
+        return Response({'status':status.HTTP_400_BAD_REQUEST,
+                         'message':f'File is larger than {settings.BUILD_CONTEXT_MAX_SIZE} bytes'})
+
     if serializer.is_valid():
         
         file = serializer.validated_data["file"]
         image_name = serializer.validated_data["image_name"]
         image_tag = serializer.validated_data["image_tag"]
+        dockerfile_path = serializer.validated_data["dockerfile"]
+        targets = serializer.validated_data["targets"]
+        dockerfile_summary = serializer.validated_data["dockerfile_summary"]
+        timeouts = serializer.validated_data["timeouts"]
 
         try:
-            build_id = build_and_push_service(file, image_name, image_tag)        
+            build_id, reused = build_and_push_service(file, image_name, image_tag, dockerfile_path, targets,
+                                                      dockerfile_summary=dockerfile_summary, timeouts=timeouts)        
         except Exception as e:
-            print(e)
+            logger.error(f"Error while starting the build of {image_name}:{image_tag}: {e}")
+            return Response({'status':status.HTTP_500_INTERNAL_SERVER_ERROR, 'message':"Error while starting the build"})
+
+        if reused:
+            return Response({'status':status.HTTP_200_OK, 'message':"Build already exists", "build_id": build_id})
 
         return Response({'status':status.HTTP_200_OK, 'message':"Build started", "build_id": build_id})
     else:
         return Response({'status':status.HTTP_400_BAD_REQUEST, 'message':serializer.errors})
 
 
+@observe_request_duration('bulk_build_push')
+@api_view(['POST'])
+@parser_classes([MultiPartParser, FormParser])
+def bulk_build_and_push_docker(request):
+    """
+    View function to handle HTTP POST requests to build and push many images with one request.
+
+    Every image is given by a "file", "image_name" and "image_tag" field, repeated in the same order for
+    every image, and optionally a "dockerfile" field for every image when build context archives are uploaded,
+    and "build_timeout" and "push_timeout" fields for every image, blank for the configured timeouts. Targets
+    can not be mapped to the images of a bulk submission and are rejected. Every file may have up to
+    BUILD_CONTEXT_MAX_SIZE bytes, and all files together up to BULK_SUBMISSION_MAX_SIZE bytes.
+
+    Parameters:
+    - request: HttpRequest object containing the HTTP request data with the repeated fields
+
+    Returns:
+    - JsonResponse: group id of the submission and the build id of every image, in the order of the request
+    """
+    request.upload_handlers.insert(0, MaxSizeUploadHandler(request, total_max_size=settings.BULK_SUBMISSION_MAX_SIZE))
+    files = request.FILES.getlist('file')
+
+    if getattr(request, 'upload_size_exceeded', False):
+        return Response({'status':status.HTTP_400_BAD_REQUEST,
+                         'message':f'A file is larger than {settings.BUILD_CONTEXT_MAX_SIZE} bytes, or all files are larger than '
+                                   f'{settings.BULK_SUBMISSION_MAX_SIZE} bytes'})
+
+    image_names = request.data.getlist('image_name')
+    image_tags = request.data.getlist('image_tag')
+    dockerfiles = request.data.getlist('dockerfile') or [''] * len(files)
+    build_timeouts = [timeout or None for timeout in request.data.getlist('build_timeout')] or [None] * len(files)
+    push_timeouts = [timeout or None for timeout in request.data.getlist('push_timeout')] or [None] * len(files)
+
+    if 'targets' in request.data:
+        return Response({'status':status.HTTP_400_BAD_REQUEST, 'message':'Targets are not supported by bulk submissions'})
+
+    if not files or len(files) > BULK_SUBMISSION_LIMIT or not (len(files) == len(image_names) == len(image_tags) == len(dockerfiles)
+                                                               == len(build_timeouts) == len(push_timeouts)):
+        return Response({'status':status.HTTP_400_BAD_REQUEST,
+                         'message':f'Provide between 1 and {BULK_SUBMISSION_LIMIT} files, each with an image name and image tag'})
+
+    entries, errors = [], []
+    for index, fields in enumerate(zip(files, image_names, image_tags, dockerfiles, build_timeouts, push_timeouts)):
+        serializer = FileUploadSerializer(data=dict(zip(('file', 'image_name', 'image_tag', 'dockerfile', 'build_timeout',
+                                                         'push_timeout'), fields)))
+        if serializer.is_valid():
+            entries.append(serializer.validated_data)
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    if errors:
+        return Response({'status':status.HTTP_400_BAD_REQUEST, 'message':errors})
+
+    try:
+        group_id, results = bulk_build_and_push_service(entries)
+    except Exception as e:
+        logger.error(f"Error while starting the builds of a bulk submission: {e}")
+        return Response({'status':status.HTTP_500_INTERNAL_SERVER_ERROR, 'message':"Error while starting the builds"})
+
+    builds = [{"build_id": build_id, "image_name": entry["image_name"], "image_tag": entry["image_tag"], "reused": reused}
+              for entry, (build_id, reused) in zip(entries, results)]
+    return Response({'status':status.HTTP_200_OK, 'message':"Builds started", "group_id": group_id, "builds": builds})
+
+
+@api_view(['GET'])
+def get_build_push_group_status(request):
+    """
+    View function to handle HTTP GET request to check the progress of a bulk submission given a group_id.
+
+    Parameters:
+    - request: HttpRequest object containing the HTTP request data with query parameter having group_id
+
+    Returns:
+    - JsonResponse: number of builds of the group by build and push status
+    """
+    try:
+        data = get_group_status_data(request.GET.get('group_id'))
+    except ValueError:
+        data = None
+
+    if data is None:
+        return Response({'status':status.HTTP_400_BAD_REQUEST, 'message':'Invalid group id'})
+
+    return Response({'status': status.HTTP_200_OK, "group_status": data})
+
+
+@observe_request_duration('build_push_status')
 @api_view(['GET'])
 def get_build_push_status(request):
     """
     View function to handle HTTP GET request to check the status of build given a build_id.
 
+    The status is served from the status cache with an ETag. A request with a matching If-None-Match header
+    gets 304 Not Modified.
+
     Parameters:
     - request: HttpRequest object containing the HTTP request data with query parameter having build_id
 
@@ -67,27 +216,388 @@ def get_build_push_status(request):
 
     if build_id != None:
         try:
-            build_obj = build.objects.get(build_id=build_id)
-            push_obj = push.objects.get(build=build_obj)
-            data = dict()
-            data["build_id"] = build_id
-            data["build_status"] = build_obj.status
+            entry = get_cached_status(build_id)
+        except:
+            return Response({'status':status.HTTP_400_BAD_REQUEST, 'message':'Invalid build id'} )
+
+        if is_not_modified(request, entry["etag"]):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=status_cache_headers(entry["etag"]))
+        return Response({'status': status.HTTP_200_OK, "build_status": entry["data"]}, headers=status_cache_headers(entry["etag"]))
+    else:
+        return Response({'status':status.HTTP_400_BAD_REQUEST, 'message':'Invalid input'}  )
 
-            if build_obj.status == build.ProcessStatus.FAILED:
-                data["Build Fail Reason"] = build_obj.failed_reason
 
-            data["push_status"] = push_obj.status
+@api_view(['GET', 'POST'])
+def get_batch_build_push_status(request):
+    """
+    View function to handle HTTP GET or POST request to check the status of many builds at once.
 
-            if push_obj.status == push.ProcessStatus.FAILED:
-                data["Push Fail Reason"] = push_obj.failed_reason
+    Parameters:
+    - request: HttpRequest object containing the HTTP request data with the build ids either as repeated
+      build_id query parameters, or as a "build_ids" list in the POST body
 
-            return Response({'status': status.HTTP_200_OK, "build_status": data})
-        except:
-            return Response({'status':status.HTTP_400_BAD_REQUEST, 'message':'Invalid build id'} )
+    Returns:
+    - JsonResponse: status of build and push tasks of every requested build
+    """
+    if request.method == 'POST':
+        build_ids = request.data.get('build_ids')
     else:
-        return Response({'status':status.HTTP_400_BAD_REQUEST, 'message':'Invalid input'}  )
+        build_ids = request.GET.getlist('build_id')
+
+    if not isinstance(build_ids, list) or not build_ids or len(build_ids) > BATCH_STATUS_LIMIT:
+        return Response({'status':status.HTTP_400_BAD_REQUEST,
+                         'message':f'Provide between 1 and {BATCH_STATUS_LIMIT} build ids'})
+
+    build_ids = [str(build_id) for build_id in build_ids]
+
+    return Response({'status': status.HTTP_200_OK, "build_statuses": get_batch_status_data(build_ids)})
+
+
+@api_view(['GET'])
+def wait_build_push_status(request):
+    """
+    View function to handle HTTP GET long-poll request which waits for the status of a build to change.
+
+    The request returns as soon as the build or push status differs from the last seen statuses, or
+    when the timeout expires, in which case the unchanged status is returned.
+
+    Parameters:
+    - request: HttpRequest object containing the HTTP request data with query parameters having build_id,
+      the last seen build_status and push_status, and optionally the timeout in seconds (at most 60)
+
+    Returns:
+    - JsonResponse: status of build and push tasks
+    """
+    build_id = request.GET.get('build_id')
+    last_build_status = request.GET.get('build_status')
+    last_push_status = request.GET.get('push_status')
+
+    try:
+        timeout = min(float(request.GET.get('timeout', LONG_POLL_TIMEOUT)), LONG_POLL_TIMEOUT)
+    except ValueError:
+        return Response({'status':status.HTTP_400_BAD_REQUEST, 'message':'Invalid input'})
+
+    def is_changed(data):
+        return data["build_status"] != last_build_status or data["push_status"] != last_push_status
+
+    try:
+        data = wait_for_status_change(build_id, lambda: get_status_data(build_id), is_changed, timeout)
+    except (build.DoesNotExist, push.DoesNotExist, ValidationError, ValueError):
+        return Response({'status':status.HTTP_400_BAD_REQUEST, 'message':'Invalid build id'})
+
+    return Response({'status': status.HTTP_200_OK, "build_status": data, "changed": is_changed(data)})
+
+
+@api_view(['GET'])
+def stream_build_push_status(request):
+    """
+    View function to handle HTTP GET request which streams the status transitions of a build as Server-Sent Events.
+
+    The current status is sent first, followed by an event for every transition. The stream ends when both
+    the build and the push have completed or failed.
+
+    Parameters:
+    - request: HttpRequest object containing the HTTP request data with query parameter having build_id
+
+    Returns:
+    - StreamingHttpResponse: text/event-stream of status events
+    """
+    build_id = request.GET.get('build_id')
+
+    try:
+        get_status_data(build_id)
+    except:
+        return Response({'status':status.HTTP_400_BAD_REQUEST, 'message':'Invalid build id'})
+
+    def events():
+        for data in stream_status_changes(build_id, lambda: get_status_data(build_id), is_final_status, STATUS_STREAM_TIMEOUT):
+            if data is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: status\ndata: {json.dumps(data)}\n\n"
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@observe_request_duration('async_build_push')
+async def async_build_and_push_docker(request):
+    """
+    Async view function to handle HTTP POST requests to take a dockerfile and build an image and push it to dockerhub.
+
+    Same as build_and_push_docker, but parsing and saving the upload, the database queries and enqueueing the
+    build run in executor threads, so slow uploads do not hold a worker of an ASGI server.
+
+    Parameters:
+    - request: HttpRequest object containing the HTTP request data with input dockerfile or build context, image name,
+      image tag and optionally the dockerfile path inside the build context, and the build and push timeouts.
+
+    Returns:
+    - JsonResponse: Acknowledgement about start of image bulid and push process
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    logger.info('Starting build and push')
+
+    serializer, upload_size_exceeded = await database_sync_to_async(__parse_upload)(request)
+
+    if upload_size_exceeded:
+        return JsonResponse({'status':status.HTTP_400_BAD_REQUEST,
+                             'message':f'File is larger than {settings.BUILD_CONTEXT_MAX_SIZE} bytes'})
+
+    if serializer.errors:
+        return JsonResponse({'status':status.HTTP_400_BAD_REQUEST, 'message':serializer.errors})
+
+    file = serializer.validated_data["file"]
+    image_name = serializer.validated_data["image_name"]
+    image_tag = serializer.validated_data["image_tag"]
+    dockerfile_path = serializer.validated_data["dockerfile"]
+    targets = serializer.validated_data["targets"]
+    dockerfile_summary = serializer.validated_data["dockerfile_summary"]
+    timeouts = serializer.validated_data["timeouts"]
+
+    try:
+        build_id, reused = await database_sync_to_async(build_and_push_service)(file, image_name, image_tag, dockerfile_path, targets,
+                                                                                dockerfile_summary=dockerfile_summary,
+                                                                                timeouts=timeouts)
+    except Exception as e:
+        logger.error(f"Error while starting the build of {image_name}:{image_tag}: {e}")
+        return JsonResponse({'status':status.HTTP_500_INTERNAL_SERVER_ERROR, 'message':"Error while starting the build"})
+
+    if reused:
+        return JsonResponse({'status':status.HTTP_200_OK, 'message':"Build already exists", "build_id": build_id})
+
+    return JsonResponse({'status':status.HTTP_200_OK, 'message':"Build started", "build_id": build_id})
+
+# The upload is posted by API clients without a CSRF token, like the views of Django Rest Framework
+async_build_and_push_docker.csrf_exempt = True
+
+def __parse_upload(request):
+    """
+    Parses the multipart body of an upload request and validates it. Validating reads the Dockerfile from the
+    upload, which may scan a large build context archive, so it has to run outside of the event loop as well.
+
+    Returns:
+    - Tuple: The validated FileUploadSerializer, whose errors are set if the upload is invalid, and a boolean which
+      is True if the upload exceeded BUILD_CONTEXT_MAX_SIZE, in which case the upload is not validated.
+    """
+    request.upload_handlers.insert(0, MaxSizeUploadHandler(request))
+    data = request.POST.copy()
+    data.update(request.FILES)
+    serializer = FileUploadSerializer(data=data)
+    if getattr(request, 'upload_size_exceeded', False):
+        return serializer, True
+
+    serializer.is_valid()
+    return serializer, False
+
+
+@observe_request_duration('async_build_push_status')
+async def async_get_build_push_status(request):
+    """
+    Async view function to handle HTTP GET request to check the status of build given a build_id.
+
+    Same as get_build_push_status, including the ETag and 304 Not Modified responses.
+
+    Parameters:
+    - request: HttpRequest object containing the HTTP request data with query parameter having build_id
+
+    Returns:
+    - JsonResponse: status of build and push tasks
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    build_id = request.GET.get('build_id')
+
+    if build_id is None:
+        return JsonResponse({'status':status.HTTP_400_BAD_REQUEST, 'message':'Invalid input'})
+
+    try:
+        entry = await database_sync_to_async(get_cached_status)(build_id)
+    except (build.DoesNotExist, push.DoesNotExist, ValidationError, ValueError):
+        return JsonResponse({'status':status.HTTP_400_BAD_REQUEST, 'message':'Invalid build id'})
+
+    if is_not_modified(request, entry["etag"]):
+        return HttpResponseNotModified(headers=status_cache_headers(entry["etag"]))
+    return JsonResponse({'status': status.HTTP_200_OK, "build_status": entry["data"]}, headers=status_cache_headers(entry["etag"]))
+
+
+async def async_wait_build_push_status(request):
+    """
+    Async view function to handle HTTP GET long-poll request which waits for the status of a build to change.
+
+    Same as wait_build_push_status, but a waiting request holds neither a thread nor a Redis connection,
+    so a single process can hold many long-poll clients.
+
+    Parameters:
+    - request: HttpRequest object containing the HTTP request data with query parameters having build_id,
+      the last seen build_status and push_status, and optionally the timeout in seconds (at most 60)
+
+    Returns:
+    - JsonResponse: status of build and push tasks
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    build_id = request.GET.get('build_id')
+    last_build_status = request.GET.get('build_status')
+    last_push_status = request.GET.get('push_status')
+
+    try:
+        timeout = min(float(request.GET.get('timeout', LONG_POLL_TIMEOUT)), LONG_POLL_TIMEOUT)
+    except ValueError:
+        return JsonResponse({'status':status.HTTP_400_BAD_REQUEST, 'message':'Invalid input'})
+
+    def is_changed(data):
+        return data["build_status"] != last_build_status or data["push_status"] != last_push_status
+
+    async def get_state():
+        return await database_sync_to_async(get_status_data)(build_id)
+
+    try:
+        data = await async_wait_for_status_change(build_id, get_state, is_changed, timeout)
+    except (build.DoesNotExist, push.DoesNotExist, ValidationError, ValueError):
+        return JsonResponse({'status':status.HTTP_400_BAD_REQUEST, 'message':'Invalid build id'})
+
+    return JsonResponse({'status': status.HTTP_200_OK, "build_status": data, "changed": is_changed(data)})
+
+
+def is_not_modified(request, etag):
+    """
+    Returns True if the If-None-Match header of a request matches the ETag of the current response.
+    """
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag in etags or f"W/{etag}" in etags
+
+def status_cache_headers(etag):
+    """
+    Returns the headers of a status response, which clients have to revalidate with the ETag before reusing it.
+    """
+    return {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+def get_batch_status_data(build_ids):
+    """
+    Reads the build and push status of many builds with a single query joining the build and push tables.
+
+    Parameters:
+    - build_ids: List of build ids.
+
+    Returns:
+    - list: status of every requested build in the requested order. Invalid and unknown build ids get
+      an entry with an error message instead of a status.
+    """
+    valid_ids = dict()
+    for build_id in build_ids:
+        try:
+            valid_ids[build_id] = uuid.UUID(str(build_id))
+        except ValueError:
+            pass
 
+    rows = (build.objects
+            .filter(build_id__in=set(valid_ids.values()))
+            .values_list('build_id', 'status', 'failed_reason', 'push__status', 'push__failed_reason',
+                         'push__repository_name', 'push__image_name', 'push__image_tag'))
 
+    rows_by_id = dict()
+    for row in rows:
+        pushes = rows_by_id.setdefault(row[0], (row[1], row[2], []))[2]
+        if row[3] is not None:
+            pushes.append((row[3], row[4], row[5] or get_repository_name(row[6], row[7])))
+
+    results = []
+    for build_id in build_ids:
+        if build_id not in valid_ids:
+            results.append({"build_id": build_id, "message": "Invalid build id"})
+        elif not rows_by_id.get(valid_ids[build_id], (None, None, None))[2]:
+            results.append({"build_id": build_id, "message": "Build not found"})
+        else:
+            results.append(format_status_data(build_id, *rows_by_id[valid_ids[build_id]]))
+
+    return results
+
+@api_view(['GET'])
+def get_build_logs(request):
+    """
+    View function to handle HTTP GET request to read the build log of a given build_id.
+
+    Parameters:
+    - request: HttpRequest object containing the HTTP request data with query parameters having build_id,
+      and optionally offset and length of the byte range to read, or follow=true to stream the live tail
+      of the log until the build finishes.
+
+    Returns:
+    - JsonResponse: requested range of the build log, or a streaming plain text response when following
+    """
+    build_id = request.GET.get('build_id')
+
+    try:
+        offset = int(request.GET.get('offset', 0))
+        length = request.GET.get('length')
+        length = int(length) if length is not None else None
+        build_obj = build.objects.only('status').get(build_id=build_id)
+    except:
+        return Response({'status':status.HTTP_400_BAD_REQUEST, 'message':'Invalid input'})
+
+    if offset < 0 or (length is not None and length < 0):
+        return Response({'status':status.HTTP_400_BAD_REQUEST, 'message':'Invalid input'})
+
+    if request.GET.get('follow') == 'true':
+        def is_running():
+            return build.objects.filter(build_id=build_id,
+                                        status__in=[build.ProcessStatus.PENDING, build.ProcessStatus.IN_PROGRESS]).exists()
+
+        return StreamingHttpResponse(follow_build_log(build_id, is_running, offset=offset), content_type='text/plain')
+
+    logs = read_build_log(build_id, offset, length)
+
+    return Response({'status': status.HTTP_200_OK, "build_id": build_id, "build_status": build_obj.status,
+                     "offset": offset, "next_offset": offset + len(logs), "logs": logs.decode(errors='replace')})
+
+
+@api_view(['GET'])
+def get_pipeline_status(request):
+    """
+    View function to handle HTTP GET request to check the queues of the build and push stages.
+
+    Parameters:
+    - request: HttpRequest object
+
+    Returns:
+    - JsonResponse: number of configured workers and number of queued tasks of every stage
+    """
+    stages = dict()
+    for stage, stage_config in settings.PIPELINE_STAGES.items():
+        stages[stage] = {
+            "queue": stage_config['name'],
+            "workers": stage_config['workers'],
+            "queued_tasks": get_stage_broker(stage).queue_size(),
+        }
+
+    return Response({'status': status.HTTP_200_OK, "stages": stages})
+
+
+def metrics(request):
+    """
+    View function to handle HTTP GET request from Prometheus to scrape the metrics of the service.
+
+    Parameters:
+    - request: HttpRequest object
+
+    Returns:
+    - HttpResponse: metrics in the Prometheus text format
+    """
+    content, content_type = generate_metrics()
+    return HttpResponse(content, content_type=content_type)
+
+
+@observe_request_duration('retry_build')
 @api_view(["GET"])
 def retry_build(request):
     """
@@ -106,63 +616,359 @@ def retry_build(request):
     if (not build_failed_flag) and (not push_failed_flag):
         return Response({'status': status.HTTP_400_BAD_REQUEST, 'message':reason, "build_id": build_id})
 
+    # An earlier cancellation must not abort the retried build or push
+    try:
+        clear_cancellation(build_id)
+    except Exception as e:
+        logger.error(f"Failed to clear the cancellation of build {build_id}: {e}")
+
     if build_failed_flag:
-        async_task(docker_build_push, str(build_id),  str(push_id))
+        build.objects.filter(build_id=build_id).update(enqueued_at=timezone.now())
+        async_task(docker_build_push, str(build_id),  str(push_id), enqueued_at=time.time(), broker=get_stage_broker('build'))
 
     elif (not build_failed_flag) and (push_failed_flag):
-        async_task(docker_push, push_id)
+        enqueue_pushes(build_id, [push.ProcessStatus.FAILED])
 
     return Response({'status':status.HTTP_200_OK, 'message':"Rebuild started", "build_id": build_id})
 
+@observe_request_duration('cancel_build')
+@api_view(["POST"])
+def cancel_build(request):
+    """
+    View function to handle HTTP POST request to cancel the build and push of a task given a build_id.
+
+    A pending build or push is not started anymore, and a running build or push is aborted on the Docker daemon
+    within a second, which frees its worker. Stages which have already completed are kept.
+
+    Parameters:
+    - request: HttpRequest object containing the HTTP request data with query parameter having build_id
+
+    Returns:
+    - JsonResponse: Acknowledgement about cancellation of image build and push process
+    """
+    build_id = request.GET.get('build_id')
+
+    if build_id == None:
+        return Response({'status': status.HTTP_400_BAD_REQUEST, 'message':"Please provide the build_id"})
+
+    try:
+        exists = build.objects.filter(build_id=build_id).exists()
+    except ValidationError:
+        exists = False
+
+    if not exists:
+        return Response({'status': status.HTTP_400_BAD_REQUEST, 'message':f"Build with id {build_id} does not exist", "build_id": build_id})
+
+    if not cancel_build_and_push(build_id):
+        return Response({'status': status.HTTP_400_BAD_REQUEST, 'message':"Build and Push already finished", "build_id": build_id})
+
+    return Response({'status':status.HTTP_200_OK, 'message':"Build cancelled", "build_id": build_id})
+
 def check_build_and_push_status(build_id):
 
     if build_id == None:
         return None, False, False, "Please provide the build_id"
 
     build_obj = build.objects.get(build_id=build_id)
-    push_obj = push.objects.get(build = build_obj)
+    push_objs = list(push.objects.filter(build = build_obj))
 
-    if build_obj == None:
+    if build_obj == None or not push_objs:
         return None, False, False, f"Build with id {build_id} does not exist"
 
     if build_obj.status != build.ProcessStatus.FAILED:
-        if push_obj.status != push.ProcessStatus.FAILED:
-            return push_obj.push_id, False, False, f"Build and Push not failed"
+        if all(push_obj.status != push.ProcessStatus.FAILED for push_obj in push_objs):
+            return push_objs[0].push_id, False, False, f"Build and Push not failed"
         else:
-            return push_obj.push_id, False, True, ""
+            return push_objs[0].push_id, False, True, ""
 
-    return push_obj.push_id, True, True, ""
+    return push_objs[0].push_id, True, True, ""
 
-# Save the entry in the database within a transaction
-@transaction.atomic
-def build_and_push_service(dockerfile, image_name, image_tag):
+def build_and_push_service(dockerfile, image_name, image_tag, dockerfile_path='', targets=(), dockerfile_summary=None, timeouts=None):
     """
-    Builds and pushes a Docker image with the provided Dockerfile, image name, and image tag.
+    Builds and pushes a Docker image with the provided Dockerfile or build context, image name, and image tag.
 
     This function does the following:
-    1. Generates unique build and push IDs using UUID.
-    2. Saves the provided Dockerfile to a folder and records the file location.
-    3. Creates database entries for build and push processes with initial status as PENDING.
-    4. Initiates an asynchronous task (`docker_build_push`) to perform the actual build and push.
-    5. Returns the build ID as a string.
+    1. Computes the SHA-256 hash of the uploaded Dockerfile or build context.
+    2. Looks for a build with the same content hash, image name and image tag which is either still
+       in flight or has already been pushed, and returns its build ID instead of starting a new build.
+    3. Otherwise saves the upload, creates the build and push entries and initiates an
+       asynchronous task (`docker_build_push`) to perform the actual build and push. The base images
+       of the Dockerfile are prefetched while the build waits in the queue.
+
+    The lookup, creation and enqueueing are done while holding a Redis lock on the content key, so concurrent
+    duplicate requests coalesce onto a single build. A build whose task can not be enqueued is marked as failed,
+    so later requests never coalesce onto it.
+
+    Parameters:
+    - dockerfile: Uploaded Dockerfile or build context archive.
+    - image_name: Name of the Docker image.
+    - image_tag: Tag for the Docker image.
+    - dockerfile_path: Path of the Dockerfile inside the build context archive, empty for a plain Dockerfile.
+    - targets: Additional references the image is tagged and pushed as, each with its own push entry.
+    - dockerfile_summary: Summary of the Dockerfile parsed by the upload serializer, stored with the build.
+    - timeouts: Optional dict with the "build" and "push" timeouts in seconds, None for the configured timeouts.
+
+    Returns:
+    - Tuple: The build ID as a string and a boolean which is True if an existing build was reused.
+    """
+
+    content_hash = __hash_file(dockerfile, dockerfile_path, targets)
+
+    with redis_lock(f"build-push:{content_hash}:{image_name}:{image_tag}", timeout=BUILD_PUSH_LOCK_TIMEOUT):
+        existing_build_id = find_reusable_build(content_hash, image_name, image_tag)
+
+        if existing_build_id is not None:
+            logger.info(f"Reusing build {existing_build_id} for {image_name}:{image_tag}")
+            return str(existing_build_id), True
+
+        build_id, push_id = __create_build_and_push(dockerfile, image_name, image_tag, content_hash, dockerfile_path, targets,
+                                                    dockerfile_summary, timeouts)
+
+        enqueue_prefetch(image_name, (dockerfile_summary or dict()).get('base_images', []))
+
+        # docker_build_push(build_id, push_id)
+        __enqueue_builds([(build_id, push_id)])
+
+    return build_id, False
+
+def find_reusable_build(content_hash, image_name, image_tag):
+    """
+    Finds a build of the same Dockerfile content, image name and image tag that can be reused.
+
+    A build can be reused if it is still pending or in progress, or if its image has been built and
+    the push is pending, in progress or completed. Failed and expired builds are never reused.
 
     Parameters:
-    - dockerfile: Uploaded Dockerfile.
+    - content_hash: SHA-256 hash of the Dockerfile.
     - image_name: Name of the Docker image.
     - image_tag: Tag for the Docker image.
 
     Returns:
-    - str: The build ID of the initiated build process.
+    - UUID: The build ID of the reusable build, or None if there is none.
+    """
+    return (__reusable_builds()
+            .filter(content_hash=content_hash, image_name=image_name, image_tag=image_tag)
+            .values_list('build_id', flat=True)
+            .first())
+
+def find_reusable_builds(keys):
+    """
+    Finds reusable builds for many (content hash, image name, image tag) keys with a single query.
+
+    Parameters:
+    - keys: Set of (content_hash, image_name, image_tag) tuples.
+
+    Returns:
+    - dict: The build ID of a reusable build for every key which has one.
+    """
+    if not keys:
+        return dict()
+
+    rows = (__reusable_builds()
+            .filter(content_hash__in={key[0] for key in keys})
+            .values_list('content_hash', 'image_name', 'image_tag', 'build_id'))
+
+    return {row[:3]: row[3] for row in rows if row[:3] in keys}
+
+def __reusable_builds():
+    in_flight = Q(status__in=[build.ProcessStatus.PENDING, build.ProcessStatus.IN_PROGRESS])
+    built = Q(status=build.ProcessStatus.COMPLETED, push__status__in=[push.ProcessStatus.PENDING,
+                                                                 push.ProcessStatus.IN_PROGRESS,
+                                                                 push.ProcessStatus.COMPLETED])
+
+    return build.objects.filter(expiration_time__gte=timezone.now().date()).filter(in_flight | built)
+
+def bulk_build_and_push_service(entries):
+    """
+    Builds and pushes many Docker images submitted with one request.
+
+    This function does the following:
+    1. Computes the content hash of every upload and looks up reusable builds for all entries with one query.
+       Entries with a reusable build, or with the same content, image name and image tag as an earlier
+       entry of the request, get that build ID instead of a new build.
+    2. Saves the remaining uploads and creates their build and push entries with bulk inserts in a single transaction.
+    3. Enqueues the prefetch of their base images, and the new builds as one Django-Q group.
+
+    All builds of the request, reused or not, are members of a new group whose progress is read with
+    get_group_status_data.
+
+    The lookup, creation and enqueueing are done while holding the same Redis locks on the content keys as
+    build_and_push_service, taken in sorted order so concurrent submissions can not deadlock. Builds whose
+    task can not be enqueued are marked as failed, so they are never reused.
+
+    Parameters:
+    - entries: List of dicts with the validated "file", "image_name", "image_tag", "dockerfile" and optionally
+      "targets", "dockerfile_summary" and "timeouts" of every image.
+
+    Returns:
+    - Tuple: The group ID as a string and a list with the build ID as a string and a reused flag for every entry.
+    """
+    group_id = uuid.uuid4()
+    keys = [(__hash_file(entry["file"], entry["dockerfile"], entry.get("targets", ())), entry["image_name"], entry["image_tag"])
+            for entry in entries]
+
+    with ExitStack() as locks:
+        for lock_name in sorted({f"build-push:{content_hash}:{image_name}:{image_tag}" for content_hash, image_name, image_tag in keys}):
+            locks.enter_context(redis_lock(lock_name, timeout=BULK_BUILD_PUSH_LOCK_TIMEOUT))
+
+        reusable = find_reusable_builds(set(keys))
+
+        results = []
+        new_builds = dict()
+        for key, entry in zip(keys, entries):
+            if key in reusable:
+                results.append((str(reusable[key]), True))
+            elif key in new_builds:
+                results.append((str(new_builds[key][0]), True))
+            else:
+                new_builds[key] = (uuid.uuid4(), uuid.uuid4(), entry)
+                results.append((str(new_builds[key][0]), False))
+
+        __bulk_create_builds_and_pushes(group_id, new_builds, {build_id for build_id, _ in results})
+
+        for _, _, entry in new_builds.values():
+            enqueue_prefetch(entry["image_name"], entry.get("dockerfile_summary", dict()).get('base_images', []))
+
+        __enqueue_builds([(build_id, push_id) for build_id, push_id, _ in new_builds.values()], group=str(group_id))
+
+    logger.info(f"Started {len(new_builds)} builds of group {group_id}, reused {len(entries) - len(new_builds)}")
+    return str(group_id), results
+
+def get_group_status_data(group_id):
+    """
+    Reads the aggregate progress of a bulk submission with a single query.
+
+    Parameters:
+    - group_id: Unique identifier of the group returned by the bulk submission.
+
+    Returns:
+    - dict: number of builds of the group by build status and push status, and how many have finished,
+      or None if the group does not exist
+    """
+    rows = (build.objects
+            .filter(build_group_member__group_id=uuid.UUID(str(group_id)))
+            .values_list('build_id', 'status', 'push__status'))
+
+    builds_by_id = dict()
+    for build_id, build_status, push_status in rows:
+        builds_by_id.setdefault(build_id, (build_status, []))[1].append((push_status, '', ''))
+
+    data = {"group_id": str(group_id), "total": len(builds_by_id), "finished": 0, "build_statuses": dict(), "push_statuses": dict()}
+    for build_status, pushes in builds_by_id.values():
+        push_status, _ = aggregate_push_status(pushes)
+        data["build_statuses"][build_status] = data["build_statuses"].get(build_status, 0) + 1
+        data["push_statuses"][push_status] = data["push_statuses"].get(push_status, 0) + 1
+        if is_final_status({"build_status": build_status, "push_status": push_status}):
+            data["finished"] += 1
+
+    if data["total"] == 0:
+        return None
+    return data
+
+def __enqueue_builds(build_and_push_ids, group=None):
+    """
+    Enqueues the docker_build_push task of new builds whose build and push entries are committed.
+
+    A build whose task can not be enqueued is marked as failed together with its pushes, so it is never reused.
+
+    Parameters:
+    - build_and_push_ids: List of the (build ID, push ID) of every build.
+    - group: Django-Q group of the tasks, None for no group.
+
+    Raises:
+    - Exception: The error of the first build which could not be enqueued, once every build is enqueued or failed.
+    """
+    broker = get_stage_broker('build')
+    group_options = {'group': group} if group is not None else dict()
+    error = None
+
+    for build_id, push_id in build_and_push_ids:
+        try:
+            async_task(docker_build_push, str(build_id), str(push_id), enqueued_at=time.time(), broker=broker, **group_options)
+        except Exception as e:
+            logger.error(f"Error while enqueueing build {build_id}: {e}")
+            error = error or e
+            try:
+                update_build_status(str(build_id), build.ProcessStatus.FAILED, reason="Error while enqueueing the build")
+                for failed_push_id in push.objects.filter(build_id=build_id).values_list('push_id', flat=True):
+                    update_push_status(str(failed_push_id), push.ProcessStatus.FAILED, reason="Error while enqueueing the build")
+            except Exception as e:
+                logger.error(f"Error while failing build {build_id}: {e}")
+
+    if error is not None:
+        raise error
+
+# Save the entry in the database within a transaction
+@transaction.atomic
+def __create_build_and_push(dockerfile, image_name, image_tag, content_hash, dockerfile_path, targets=(), dockerfile_summary=None,
+                            timeouts=None):
     """
+    Saves the Dockerfile or build context and creates the build and push entries with initial status as PENDING.
+
+    Parameters:
+    - dockerfile: Uploaded Dockerfile or build context archive.
+    - image_name: Name of the Docker image.
+    - image_tag: Tag for the Docker image.
+    - content_hash: SHA-256 hash of the upload.
+    - dockerfile_path: Path of the Dockerfile inside the build context archive, empty for a plain Dockerfile.
+    - targets: Additional references the image is pushed as.
+    - dockerfile_summary: Summary of the parsed Dockerfile.
+    - timeouts: Optional dict with the "build" and "push" timeouts in seconds.
 
-    print("Entered build_and_push_service")
+    Returns:
+    - Tuple: The build ID and the push ID of the image name and tag as strings.
+    """
     build_id = uuid.uuid4()
     push_id = uuid.uuid4()
 
     folder_path, file_name = __save_file(dockerfile, str(build_id))
     
-    print("Creating build")
-    new_build_entry = build.objects.create(
+    logger.debug(f"Creating build {build_id}")
+    new_build_entry, new_push_entries = __new_build_and_push(build_id, push_id, folder_path, file_name, image_name, image_tag,
+                                                             content_hash, dockerfile_path, targets, dockerfile_summary, timeouts)
+    new_build_entry.save(force_insert=True)
+
+    for new_push_entry in new_push_entries:
+        new_push_entry.save(force_insert=True)
+
+    return str(new_build_entry.build_id), str(push_id)
+
+@transaction.atomic
+def __bulk_create_builds_and_pushes(group_id, new_builds, member_build_ids):
+    """
+    Saves the uploads and creates the build, push and group member entries of a bulk submission with bulk inserts.
+
+    Parameters:
+    - group_id: Unique identifier of the group.
+    - new_builds: Dict of the (build ID, push ID, validated entry) of every build to create by its
+      (content hash, image name, image tag).
+    - member_build_ids: IDs of all builds of the group, including reused builds.
+    """
+    build_entries, push_entries = [], []
+    for (content_hash, _, _), (build_id, push_id, entry) in new_builds.items():
+        folder_path, file_name = __save_file(entry["file"], str(build_id))
+        build_entry, push_entry_list = __new_build_and_push(build_id, push_id, folder_path, file_name, entry["image_name"],
+                                                            entry["image_tag"], content_hash, entry["dockerfile"],
+                                                            entry.get("targets", ()), entry.get("dockerfile_summary"),
+                                                            entry.get("timeouts"))
+        build_entries.append(build_entry)
+        push_entries.extend(push_entry_list)
+
+    build.objects.bulk_create(build_entries)
+    push.objects.bulk_create(push_entries)
+    build_group_member.objects.bulk_create([build_group_member(group_id=group_id, build_id=build_id)
+                                            for build_id in member_build_ids])
+
+def __new_build_and_push(build_id, push_id, folder_path, file_name, image_name, image_tag, content_hash, dockerfile_path,
+                         targets=(), dockerfile_summary=None, timeouts=None):
+    """
+    Returns a new, unsaved build entry and its push entries with initial status as PENDING.
+
+    The first push entry, with the given push_id, pushes the image name and tag. Every target which is a
+    different repository name gets its own push entry. Stages without a timeout use the configured timeout.
+    """
+    timeouts = timeouts or dict()
+    new_build_entry = build(
         build_id=build_id,
         build_time=timezone.now(),
         expiration_time=timezone.now() + timedelta(days=10),
@@ -171,39 +977,77 @@ def build_and_push_service(dockerfile, image_name, image_tag):
         file_name = file_name,
         image_loc='',  # Assign an appropriate value
         image_name=image_name,
-        image_tag=image_tag
+        image_tag=image_tag,
+        content_hash=content_hash,
+        dockerfile_path=dockerfile_path,
+        dockerfile_summary=dockerfile_summary or dict(),
+        timeout=timeouts.get('build'),
+        enqueued_at=timezone.now()
     )
 
-    print("Completed creating build")
-    new_push_entry = push.objects.create(
-        push_id = push_id,
-        build = new_build_entry,
-        push_time = timezone.now(),
-        expiration_time = timezone.now() + timedelta(days=10),
-        status=build.ProcessStatus.PENDING,
-        image_loc = '',
-        failed_reason = '',
-        image_name=image_name,
-        image_tag=image_tag
-    )
+    repository_names = {get_repository_name(image_name, image_tag): (push_id, image_name, image_tag)}
+    for target in targets:
+        target_name, target_tag = target.rsplit(":", 1)
+        repository_names.setdefault(get_target_repository_name(target), (uuid.uuid4(), target_name, target_tag))
+
+    new_push_entries = []
+    for repository_name, (new_push_id, push_image_name, push_image_tag) in repository_names.items():
+        new_push_entries.append(push(
+            push_id = new_push_id,
+            build = new_build_entry,
+            push_time = timezone.now(),
+            expiration_time = timezone.now() + timedelta(days=10),
+            status=build.ProcessStatus.PENDING,
+            image_loc = '',
+            failed_reason = '',
+            image_name=push_image_name,
+            image_tag=push_image_tag,
+            repository_name=repository_name,
+            timeout=timeouts.get('push')
+        ))
+
+    return new_build_entry, new_push_entries
+
+def __hash_file(dockerfile, dockerfile_path='', targets=()):
+    """
+    Computes the SHA-256 hash of the uploaded Dockerfile or build context.
 
-    # docker_build_push(str(new_build_entry.build_id), str(new_push_entry.push_id))
-    task_id = async_task(docker_build_push, str(new_build_entry.build_id),  str(new_push_entry.push_id))
+    The file is read chunk by chunk and rewound afterwards so it can be saved. The path of the
+    Dockerfile inside a build context is part of the hash, since it selects what is built, and so
+    are the additional targets, since a build is only reused when it pushes the same targets.
 
-    return str(new_build_entry.build_id)
+    Parameters:
+    - dockerfile: Uploaded Dockerfile or build context archive.
+    - dockerfile_path: Path of the Dockerfile inside the build context archive.
+    - targets: Additional references the image is pushed as.
+
+    Returns:
+    - str: Hex digest of the file content.
+    """
+    sha256 = hashlib.sha256()
+    for chunk in dockerfile.chunks():
+        sha256.update(chunk)
+    if dockerfile_path:
+        sha256.update(b"\0" + dockerfile_path.encode())
+    if targets:
+        sha256.update(b"\0targets:" + "\n".join(sorted(targets)).encode())
+    dockerfile.seek(0)
+    return sha256.hexdigest()
 
 def __save_file(dockerfile, build_id):
     """
     Saves the provided Dockerfile to a folder and returns the folder path and file name.
 
+    Build context archives are copied chunk by chunk as they are, without extracting them.
+
     Parameters:
-    - dockerfile: Uploaded Dockerfile.
+    - dockerfile: Uploaded Dockerfile or build context archive.
     - build_id: Unique identifier for the build.
 
     Returns:
     - Tuple: A tuple containing the folder path and file name where the Dockerfile is saved.
     """
-    folder_path = os.path.join('uploaded_files', build_id)
+    folder_path = os.path.join(settings.UPLOADED_FILES_DIR, build_id)
     os.makedirs(folder_path, exist_ok=True)
 
     file_path = os.path.join(folder_path, dockerfile.name)
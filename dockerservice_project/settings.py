@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
 from pathlib import Path
+import json
+import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -76,10 +78,15 @@ WSGI_APPLICATION = 'dockerservice_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+# The web server and the workers of both stages write to the database at the same time. A write waits up to
+# 'timeout' seconds for the lock held by another writer instead of failing with "database is locked".
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 20,
+        },
     }
 }
 
@@ -126,16 +133,140 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# PRAGMAs set on every new SQLite connection. In WAL mode readers never block the writer and the writer never
+# blocks readers, and with synchronous NORMAL a commit only syncs the write-ahead log at checkpoints, which is
+# still safe against corruption but may lose the last commits on a power failure.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'wal_autocheckpoint': 1000,
 }
 
+# Directory holding the uploaded Dockerfiles and build contexts, one folder per build_id
+UPLOADED_FILES_DIR = 'uploaded_files'
+
+# Directory holding the streamed output of every docker build, one file per build_id
+BUILD_LOG_DIR = BASE_DIR / 'build_logs'
+
+# Maximum size in bytes of an uploaded Dockerfile or build context archive
+BUILD_CONTEXT_MAX_SIZE = 500 * 1024 * 1024
+
+# Maximum size in bytes of all uploads of a bulk submission together
+BULK_SUBMISSION_MAX_SIZE = 2 * 1024 * 1024 * 1024
+
+# Periodic removal of expired builds, orphaned files, dangling images and build cache.
+# Files without a build entry are only removed once they are older than orphan_grace_period seconds.
+GARBAGE_COLLECTION = {
+    'dry_run': os.environ.get('GARBAGE_COLLECTION_DRY_RUN') == 'true',
+    'batch_size': 500,
+    'orphan_grace_period': 3600,
+}
+
+# Pushed images are kept in the Docker daemon to reuse their layers. Least recently used images are removed
+# once the image layers use more than disk_budget bytes.
+IMAGE_RETENTION = {
+    'disk_budget': int(os.environ.get('IMAGE_DISK_BUDGET', 20 * 1024 * 1024 * 1024)),
+}
+
+# Credentials of the registries other than Docker Hub that images are pushed to, as a JSON object like
+# {"registry.example.com": {"username": "...", "password": "..."}}. Images are pushed without logging in
+# to registries which are not listed.
+REGISTRY_CREDENTIALS = json.loads(os.environ.get('REGISTRY_CREDENTIALS', '{}'))
+
+# Docker client shared by all tasks of a Django-Q worker process
+DOCKER_CLIENT = {
+    'max_pool_size': 10,
+    'health_check_interval': 30,
+    'registry_login_ttl': 3600,
+}
+
+# Docker daemons the builds are distributed over, as a JSON list like
+# [{"url": "tcp://builder-1.example.com:2376", "max_builds": 4, "cert_path": "/certs/builder-1"}].
+# Every build runs on the least loaded healthy daemon, preferring daemons which recently built the same image name,
+# and is pushed from that daemon. max_builds defaults to the number of build workers. When no daemons are listed,
+# every build runs on the daemon configured in the environment (DOCKER_HOST).
+DOCKER_HOSTS = json.loads(os.environ.get('DOCKER_HOSTS', '[]'))
+
+BUILDER_SCHEDULER = {
+    'affinity_ttl': 6 * 60 * 60,
+    'lease_timeout': 900,
+    'acquire_timeout': 300,
+    'poll_interval': 1,
+    'unhealthy_ttl': 30,
+}
+
+# Builder used for docker builds: 'classic' uses the Docker daemon API, 'buildkit' runs `docker buildx build`.
+# With BuildKit the layer cache of every image name is exported after a build and imported by the next build,
+# either to a local directory (cache_type 'local') or to a registry repository (cache_type 'registry').
+# Cache export needs a buildx builder using the docker-container driver, set with buildx_builder.
+DOCKER_BUILD = {
+    'builder': os.environ.get('DOCKER_BUILDER', 'classic'),
+    'buildx_builder': os.environ.get('DOCKER_BUILDX_BUILDER'),
+    'cache_type': os.environ.get('DOCKER_BUILD_CACHE_TYPE', 'local'),
+    'cache_dir': BASE_DIR / 'build_cache',
+    'cache_repository': os.environ.get('DOCKER_BUILD_CACHE_REPOSITORY'),
+}
+
+# The prefetch of the base images, the build and the push of an image run as separate stages, each with its own
+# Django-Q queue and cluster.
+# Start one qcluster per stage, selecting the stage with the DOCKERSERVICE_STAGE environment variable.
+# Transient errors of a stage are retried inside the worker, with exponential backoff and full jitter between
+# base_delay and max_delay seconds, until max_attempts attempts were made. A build or push, including its retries,
+# is aborted after timeout seconds, which can be lowered per request. Keep it below the Django-Q timeout, which
+# kills the whole worker process instead.
+PIPELINE_STAGES = {
+    'build': {
+        'name': 'DjangoQ',
+        'workers': int(os.environ.get('BUILD_WORKERS', 4)),
+        'timeout': int(os.environ.get('BUILD_TIMEOUT', 540)),
+        'retries': {
+            'max_attempts': int(os.environ.get('BUILD_RETRY_ATTEMPTS', 3)),
+            'base_delay': 5,
+            'max_delay': 60,
+        },
+    },
+    'push': {
+        'name': 'DjangoQPush',
+        'workers': int(os.environ.get('PUSH_WORKERS', 4)),
+        'timeout': int(os.environ.get('PUSH_TIMEOUT', 540)),
+        'retries': {
+            'max_attempts': int(os.environ.get('PUSH_RETRY_ATTEMPTS', 5)),
+            'base_delay': 2,
+            'max_delay': 60,
+        },
+    },
+    'prefetch': {
+        'name': 'DjangoQPrefetch',
+        'workers': int(os.environ.get('PREFETCH_WORKERS', 2)),
+        'retries': {
+            'max_attempts': 3,
+            'base_delay': 2,
+            'max_delay': 30,
+        },
+    },
+}
+
+# Running builds and pushes check every poll_interval seconds if their build was cancelled. The cancellation
+# flag is kept in Redis for ttl seconds.
+CANCELLATION = {
+    'poll_interval': 0.5,
+    'ttl': 3600,
+}
+
+# The base images of a new build are pulled by the prefetch stage while the build waits in the build queue.
+# Every image is enqueued at most once per daemon every dedupe_ttl seconds, and pulls of the same image on
+# the same daemon, by prefetch or build workers, wait for each other for up to pull_timeout seconds.
+BASE_IMAGE_PREFETCH = {
+    'enabled': os.environ.get('PREFETCH_BASE_IMAGES', '1') == '1',
+    'dedupe_ttl': 300,
+    'pull_timeout': 600,
+}
+
+PIPELINE_STAGE = os.environ.get('DOCKERSERVICE_STAGE', 'build')
+
 Q_CLUSTER = {
-    'name': 'DjangoQ',
-    'workers': 4,
+    'name': PIPELINE_STAGES[PIPELINE_STAGE]['name'],
+    'workers': PIPELINE_STAGES[PIPELINE_STAGE]['workers'],
     'recycle': 500,
     'timeout': 600,
     'retry':700,
@@ -152,14 +283,57 @@ Q_CLUSTER = {
     },
 }
 
+# The status of every build is cached in Redis. The cache is refreshed on every status transition, and
+# final statuses, which only change on a retry, are kept much longer than the others. Redis errors are
+# ignored, so the status endpoints read from the database while Redis is unavailable.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'status': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': f"redis://{Q_CLUSTER['redis']['host']}:{Q_CLUSTER['redis']['port']}/1",
+        'KEY_PREFIX': 'dockerservice',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'IGNORE_EXCEPTIONS': True,
+            'SOCKET_CONNECT_TIMEOUT': 1,
+            'SOCKET_TIMEOUT': 1,
+        },
+    },
+}
+
+STATUS_CACHE = {
+    'alias': 'status',
+    'ttl': 60,
+    'final_ttl': 24 * 60 * 60,
+}
+
+# Log records are written as JSON lines, tagged with the build_id and push_id of the task which made them.
+# The file is written and rotated by a background thread, so logging never blocks a build or push.
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'dockerservice_application.services.logging_service.JsonFormatter',
+        },
+    },
+    'filters': {
+        'log_context': {
+            '()': 'dockerservice_application.services.logging_service.LogContextFilter',
+        },
+    },
     'handlers': {
         'file': {
             'level': 'DEBUG',
-            'class': 'logging.FileHandler',
+            'class': 'dockerservice_application.services.logging_service.BackgroundFileHandler',
             'filename': 'logs/debug.log',
+            'max_bytes': int(os.environ.get('LOG_MAX_BYTES', 50 * 1024 * 1024)),
+            'backup_count': int(os.environ.get('LOG_BACKUP_COUNT', 5)),
+            'queue_size': 10000,
+            'formatter': 'json',
+            'filters': ['log_context'],
         },
     },
     'loggers': {
@@ -168,5 +342,15 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': True,
         },
+        'dockerservice_application': {
+            'handlers': ['file'],
+            'level': os.environ.get('LOG_LEVEL', 'INFO'),
+            'propagate': True,
+        },
     },
+}
+
+# Push progress events are logged at most once every 'push_progress_interval' seconds per push
+LOG_SAMPLING = {
+    'push_progress_interval': float(os.environ.get('PUSH_PROGRESS_LOG_INTERVAL', 5)),
 }
\ No newline at end of file